@@ -1,7 +1,7 @@
 from flask import Flask
 from .config import Config
-from .extensions import db, migrate, login_manager,csrf
-from .usuarios.models import Usuario, Role  # modelos del módulo usuarios
+from .extensions import db, migrate, login_manager, csrf, cache, perf, storage, auditoria
+from .usuarios.models import Role  # modelos del módulo usuarios
 from .models_shared import ActividadUsuario  # modelo compartido de actividad
 
 
@@ -11,20 +11,34 @@ def create_app(config_class=None):
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_object(config_class)
 
+    # Ficheros subidos: en streaming al almacén, con límite por vista (ver storage/subidas.py)
+    from .storage.subidas import RequestSubidas
+    app.request_class = RequestSubidas
+
     # Extensiones
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     csrf.init_app(app)
+    cache.init_app(app)
+    perf.init_app(app)
+    storage.init_app(app)
+    auditoria.init_app(app)
+
+    # Autorización: puede()/tiene_rol() en las plantillas (ver autorizacion.py)
+    from .autorizacion import contexto_plantillas
+    app.context_processor(contexto_plantillas)
 
     # 🔹 login_manager debe apuntar al login del blueprint 'usuarios'
     login_manager.login_view = "usuarios.login"  # ✅ Debe ser "usuarios.login"
     login_manager.login_message_category = "info"
 
+    # Identidad del usuario desde la caché (sin consulta en la mayoría de peticiones)
+    from .usuarios.identidad import cargar_usuario
+
     @login_manager.user_loader
     def load_user(user_id):
-        # SQLAlchemy 2.x style
-        return db.session.get(Usuario, int(user_id))
+        return cargar_usuario(user_id)
 
     # Blueprints
     from .core import bp as core_bp
@@ -38,6 +52,7 @@ def create_app(config_class=None):
     from .proyectos import bp as proyectos_bp
     from .estadisticas import bp as estadisticas_bp
     from .perfil import bp as perfil_bp
+    from .trabajos import bp as trabajos_bp
     from .pagos.models import Pago
     from app.estadisticas import bp as estadisticas_bp
 
@@ -54,6 +69,7 @@ def create_app(config_class=None):
     app.register_blueprint(proyectos_bp, url_prefix="/proyectos")
     app.register_blueprint(estadisticas_bp, url_prefix='/estadisticas')
     app.register_blueprint(perfil_bp, url_prefix="/perfil")
+    app.register_blueprint(trabajos_bp, url_prefix="/trabajos")
     app.register_blueprint(matriculas_bp, url_prefix="/admin/matriculas")
 
   
@@ -62,6 +78,34 @@ def create_app(config_class=None):
     from .seed import seed_datos_iniciales
     app.cli.add_command(seed_datos_iniciales)
 
+    # Contadores de estadísticas (importar registra también sus listeners)
+    from .estadisticas.contadores import stats_rebuild
+    app.cli.add_command(stats_rebuild)
+
+    # Saldo de matrículas (importar registra también su listener de sesión)
+    from .pagos.ledger import saldos_check
+    app.cli.add_command(saldos_check)
+
+    # Cola de trabajos en segundo plano (importar registra también su despacho tras commit)
+    from .trabajos.cola import worker, trabajo_encolar
+    app.cli.add_command(worker)
+    app.cli.add_command(trabajo_encolar)
+
+    # Almacén de ficheros (importar registra también la cuenta de referencias)
+    from .storage.referencias import storage_gc, storage_importar
+    app.cli.add_command(storage_gc)
+    app.cli.add_command(storage_importar)
+    from .storage.miniaturas import miniaturas_generar
+    app.cli.add_command(miniaturas_generar)
+
+    # Índice de texto completo del registro de documentos
+    from .documentos.busqueda import documentos_reindexar
+    app.cli.add_command(documentos_reindexar)
+
+    # Archivo de la actividad de usuarios por meses
+    from .auditoria import audit_archive
+    app.cli.add_command(audit_archive)
+
 
     # ===== Manejo personalizado de errores =====
     # En caso de 403 (Forbidden) mostramos un mensaje amigable y redirigimos al dashboard
@@ -71,4 +115,15 @@ def create_app(config_class=None):
         flash("No tienes permisos para acceder a este módulo.", "danger")
         return redirect(url_for("core.dashboard"))
 
+    # En caso de 413 (archivo demasiado grande) volvemos al formulario con el aviso
+    @app.errorhandler(413)
+    def too_large_error(error):
+        from flask import flash, redirect, url_for, request
+        from .storage.subidas import ArchivoDemasiadoGrande
+        if isinstance(error, ArchivoDemasiadoGrande):
+            flash(error.description, "danger")
+        else:
+            flash(f"La petición supera el máximo de {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB.", "danger")
+        return redirect(request.referrer or url_for("core.dashboard"))
+
     return app
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Búsqueda de estudiantes (expedientes) por nombre o documento, tolerante a
+tildes, mayúsculas y faltas de ortografía.
+
+Cada estudiante guarda `clave_busqueda` (nombre + documento normalizados).
+- PostgreSQL: índice GIN pg_trgm sobre la clave; `word_similarity` ordena.
+- SQLite: índice de trigramas en memoria (app/busqueda_difusa.py), en la
+  caché con el tag "matriculas" (los estudiantes cambian al guardar
+  matrículas): se reconstruye tras un commit que las toque.
+
+Sin búsqueda, el listado es una lectura por `ultimo_registro` (indexado).
+"""
+from typing import List, Tuple
+
+from sqlalchemy import func, literal, or_
+
+from app.extensions import db, cache
+from app.busqueda_difusa import normalizar, IndiceTrigramas, UMBRAL
+from app.matriculas.models import Matricula
+from .models import Estudiante
+
+# Máximo de claves candidatas que se piden al índice en memoria
+MAX_CANDIDATOS = 500
+
+
+def _con_matriculas():
+    return Estudiante.query.filter(Estudiante.num_matriculas > 0)
+
+
+def _indice() -> IndiceTrigramas:
+    return cache.get_or_set(
+        "expedientes:indice_trigramas",
+        lambda: IndiceTrigramas(db.session.execute(
+            db.select(Estudiante.clave_busqueda).where(Estudiante.num_matriculas > 0)
+        ).scalars()),
+        ttl=3600,
+        tags=(Matricula.__tablename__,),
+    )
+
+
+def listar(termino: str, pagina: int, por_pagina: int) -> Tuple[List[Estudiante], bool]:
+    """(estudiantes de la página, hay_siguiente). Sin término: por actividad más reciente."""
+    consulta = normalizar(termino)
+    desde = (pagina - 1) * por_pagina
+
+    if not consulta:
+        filas = (
+            _con_matriculas()
+            .order_by(Estudiante.ultimo_registro.desc(), Estudiante.id.desc())
+            .offset(desde).limit(por_pagina + 1).all()
+        )
+        return filas[:por_pagina], len(filas) > por_pagina
+
+    if db.engine.dialect.name == "postgresql":
+        filas = (
+            _con_matriculas()
+            .filter(or_(
+                literal(consulta).op("<%")(Estudiante.clave_busqueda),
+                Estudiante.clave_busqueda.like(f"%{consulta}%"),
+            ))
+            .order_by(func.word_similarity(consulta, Estudiante.clave_busqueda).desc(),
+                      Estudiante.ultimo_registro.desc())
+            .offset(desde).limit(por_pagina + 1).all()
+        )
+        return filas[:por_pagina], len(filas) > por_pagina
+
+    # Resto (SQLite): candidatos del índice en memoria, orden en Python
+    candidatos = dict(_indice().buscar(consulta, limite=MAX_CANDIDATOS, umbral=UMBRAL))
+    if not candidatos:
+        return [], False
+    filas = _con_matriculas().filter(Estudiante.clave_busqueda.in_(list(candidatos))).all()
+    filas.sort(key=lambda e: (candidatos.get(e.clave_busqueda, 0), e.ultimo_registro or e.creado_en), reverse=True)
+    return filas[desde:desde + por_pagina], len(filas) > desde + por_pagina
@@ -0,0 +1,126 @@
+from datetime import datetime
+
+from sqlalchemy import event, inspect, select, func, or_
+
+from app.extensions import db
+from app.busqueda_difusa import normalizar
+from app.matriculas.models import Matricula
+
+
+class Estudiante(db.Model):
+    """
+    Estudiante (expediente): agrupa sus matrículas. Se identifica por el
+    documento normalizado ("X-123 " y "x123" son el mismo); sin documento,
+    por el nombre normalizado.
+
+    Lo mantienen los listeners de abajo: al guardar una matrícula se busca o
+    se crea su estudiante y se recalculan `num_matriculas` y
+    `ultimo_registro` en el mismo flush, así que el listado de expedientes
+    es una lectura indexada y no un GROUP BY sobre todas las matrículas.
+    """
+    __tablename__ = "estudiantes"
+
+    id = db.Column(db.Integer, primary_key=True)
+    clave = db.Column(db.String(230), nullable=False, unique=True)  # "doc:x123" | "nombre:jose garcia"
+    nombre = db.Column(db.String(150), nullable=False)
+    doc_identidad = db.Column(db.String(64), nullable=True)
+    # Nombre + documento normalizados (sin tildes, minúsculas) para la búsqueda aproximada
+    clave_busqueda = db.Column(db.String(220), nullable=True)
+
+    num_matriculas = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    ultimo_registro = db.Column(db.DateTime, nullable=True, index=True)
+    creado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    matriculas = db.relationship("Matricula", back_populates="estudiante", lazy="dynamic")
+
+    def __repr__(self):
+        return f"<Estudiante {self.nombre} ({self.doc_identidad or 's/d'})>"
+
+
+def clave_estudiante(nombre, doc_identidad) -> str:
+    doc = normalizar(doc_identidad).replace(" ", "")
+    return f"doc:{doc}" if doc else f"nombre:{normalizar(nombre)}"
+
+
+def datos_estudiante(nombre, doc_identidad) -> dict:
+    return {
+        "clave": clave_estudiante(nombre, doc_identidad),
+        "nombre": (nombre or "").strip() or "—",
+        "doc_identidad": (doc_identidad or "").strip() or None,
+        "clave_busqueda": normalizar(f"{nombre or ''} {doc_identidad or ''}"),
+    }
+
+
+# ----------------- Listeners -----------------
+def _asignar(connection, target):
+    """Busca o crea (upsert por clave) el estudiante de la matrícula y lo enlaza."""
+    from sqlalchemy.dialects import postgresql, sqlite
+
+    tabla = Estudiante.__table__
+    datos = datos_estudiante(target.estudiante_nombre, target.doc_identidad)
+    nuevo = dict(datos, num_matriculas=0, creado_en=datetime.utcnow())
+    dialecto = {"postgresql": postgresql, "sqlite": sqlite}.get(connection.dialect.name)
+    if dialecto is not None:
+        connection.execute(dialecto.insert(tabla).values(**nuevo).on_conflict_do_nothing(index_elements=["clave"]))
+    elif connection.execute(select(tabla.c.id).where(tabla.c.clave == datos["clave"])).first() is None:
+        connection.execute(tabla.insert().values(**nuevo))
+
+    # Nombre y documento, tal como se escribieron en la matrícula más reciente:
+    # editar una antigua no renombra al estudiante
+    condicion = tabla.c.clave == datos["clave"]
+    if target.created_at is not None:
+        condicion &= or_(tabla.c.ultimo_registro.is_(None), tabla.c.ultimo_registro <= target.created_at)
+    connection.execute(
+        tabla.update().where(condicion)
+        .values(**{k: datos[k] for k in ("nombre", "doc_identidad", "clave_busqueda")})
+    )
+    target.estudiante_id = connection.execute(
+        select(tabla.c.id).where(tabla.c.clave == datos["clave"])
+    ).scalar_one()
+
+
+def _recalcular(connection, estudiante_id):
+    if not estudiante_id:
+        return
+    tabla, mat = Estudiante.__table__, Matricula.__table__
+    connection.execute(
+        tabla.update().where(tabla.c.id == estudiante_id).values(
+            num_matriculas=select(func.count()).where(mat.c.estudiante_id == estudiante_id).scalar_subquery(),
+            ultimo_registro=select(func.max(mat.c.created_at)).where(mat.c.estudiante_id == estudiante_id).scalar_subquery(),
+        )
+    )
+
+
+@event.listens_for(Matricula, "before_insert")
+def _antes_insert(mapper, connection, target):
+    _asignar(connection, target)
+
+
+@event.listens_for(Matricula, "before_update")
+def _antes_update(mapper, connection, target):
+    estado = inspect(target)
+    if (target.estudiante_id is None
+            or estado.attrs.doc_identidad.history.has_changes()
+            or estado.attrs.estudiante_nombre.history.has_changes()):
+        _asignar(connection, target)
+
+
+@event.listens_for(Matricula, "after_insert")
+def _despues_insert(mapper, connection, target):
+    _recalcular(connection, target.estudiante_id)
+
+
+@event.listens_for(Matricula, "after_delete")
+def _despues_delete(mapper, connection, target):
+    _recalcular(connection, target.estudiante_id)
+
+
+@event.listens_for(Matricula, "after_update")
+def _despues_update(mapper, connection, target):
+    hist = inspect(target).attrs.estudiante_id.history
+    if hist.has_changes():
+        _recalcular(connection, hist.deleted[0] if hist.deleted else None)
+        _recalcular(connection, target.estudiante_id)
+
+
+event.listen(Matricula.estudiante_id, "set", lambda *a: None, active_history=True)
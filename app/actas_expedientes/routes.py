@@ -1,57 +1,53 @@
-from flask import render_template, request, abort
+from flask import render_template, request, abort, redirect, url_for
 from flask_login import login_required
 from app.extensions import db
-from app.matriculas.models import Matricula, MatriculaAsignatura, ESTADO_MAT_VALIDADA
-from . import bp
+from app.matriculas.models import Matricula
+from app.matriculas.perfiles import opciones
+from app.paginacion import limitar_por_pagina
+from . import bp, busqueda
+from .models import Estudiante, clave_estudiante
 
 @bp.route("/")
 @login_required
 def index():
     """
-    Listado de 'Expedientes' (Estudiantes únicos).
-    Dado que no hay tabla de Estudiantes, agrupamos por doc_identidad.
+    Listado de 'Expedientes' (tabla estudiantes, un registro por alumno).
     """
     search = request.args.get("search", "").strip()
+    pagina = max(1, request.args.get("pagina", 1, type=int))
+    por_pagina = limitar_por_pagina(request.args.get("por_pagina"))
 
-    # Consulta base: solo matrículas validadas (o todas, según criterio)
-    # Para expedientes, tiene sentido ver a cualquiera que haya estado matriculado alguna vez.
-    query = db.session.query(
-        Matricula.doc_identidad,
-        Matricula.estudiante_nombre,
-        db.func.count(Matricula.id).label("num_matriculas"),
-        db.func.max(Matricula.created_at).label("ultimo_registro")
-    ).group_by(Matricula.doc_identidad, Matricula.estudiante_nombre)
+    # Búsqueda aproximada (tildes, mayúsculas, erratas) ordenada por parecido;
+    # sin búsqueda, por el registro más reciente
+    estudiantes, hay_siguiente = busqueda.listar(search, pagina, por_pagina)
 
-    if search:
-        query = query.filter(
-            db.or_(
-                Matricula.estudiante_nombre.ilike(f"%{search}%"),
-                Matricula.doc_identidad.ilike(f"%{search}%")
-            )
-        )
-    
-    # Ordenar por el registro más reciente
-    estudiantes = query.order_by(db.desc("ultimo_registro")).all()
+    return render_template(
+        "actas_expedientes/index.html", estudiantes=estudiantes, search=search,
+        pagina=pagina, por_pagina=por_pagina, hay_siguiente=hay_siguiente,
+    )
 
-    return render_template("actas_expedientes/index.html", estudiantes=estudiantes, search=search)
 
-
-@bp.route("/expediente/<path:doc_identidad>")
+@bp.route("/estudiante/<int:estudiante_id>")
 @login_required
-def detalle(doc_identidad):
+def detalle(estudiante_id):
     """
-    Ver el historial académico completo de un estudiante (agrupado por DNI).
+    Ver el historial académico completo de un estudiante.
     """
-    # Obtener todas las matrículas de este documento
-    matriculas = Matricula.query.filter_by(doc_identidad=doc_identidad).order_by(Matricula.created_at.desc()).all()
+    est = db.session.get(Estudiante, estudiante_id) or abort(404)
+    matriculas = (
+        Matricula.query.options(*opciones("expediente"))
+        .filter_by(estudiante_id=est.id)
+        .order_by(Matricula.created_at.desc())
+        .all()
+    )
 
     if not matriculas:
         abort(404)
 
-    # Datos personales tomados de la matrícula más reciente
+    # Datos de contacto tomados de la matrícula más reciente
     estudiante = {
-        "nombre": matriculas[0].estudiante_nombre,
-        "doc_identidad": matriculas[0].doc_identidad,
+        "nombre": est.nombre,
+        "doc_identidad": est.doc_identidad,
         "email": matriculas[0].email,
         "telefono": matriculas[0].telefono,
         "direccion": matriculas[0].direccion,
@@ -60,7 +56,7 @@ def detalle(doc_identidad):
     # Estructurar historial académico
     historial = []
     for m in matriculas:
-        asignaturas = MatriculaAsignatura.query.filter_by(matricula_id=m.id).all()
+        asignaturas = m.asignaturas
         
         # Calcular promedio si hay notas
         notas = [a.nota for a in asignaturas if a.nota is not None]
@@ -75,3 +71,10 @@ def detalle(doc_identidad):
 
     return render_template("actas_expedientes/detalle.html", estudiante=estudiante, historial=historial)
 
+
+@bp.route("/expediente/<path:doc_identidad>")
+@login_required
+def detalle_por_documento(doc_identidad):
+    """Enlaces antiguos (agrupados por documento): redirigen al estudiante."""
+    est = Estudiante.query.filter_by(clave=clave_estudiante(None, doc_identidad)).first_or_404()
+    return redirect(url_for("actas_expedientes.detalle", estudiante_id=est.id))
@@ -0,0 +1,358 @@
+"""
+Registro de actividad de usuarios (auditoría) en segundo plano.
+
+`registrar_actividad` ya no hace `add` + `commit` en la sesión de la
+petición: deja la fila en una cola en memoria y un hilo del proceso la
+escribe, junto con las demás pendientes, en un único INSERT por lotes.
+Así el login, el logout o crear un curso no pagan una transacción más, y
+un fallo al auditar no rompe la transacción del usuario.
+
+- Lotes: hasta `AUDITORIA_LOTE` filas, o lo acumulado cada
+  `AUDITORIA_INTERVALO` segundos.
+- Contrapresión: la cola admite `AUDITORIA_COLA_MAX` filas. Si está llena,
+  quien registra espera hasta `AUDITORIA_ESPERA` segundos. Si sigue llena,
+  la fila va al fichero de reserva.
+- Fichero de reserva (`AUDITORIA_SPOOL_DIR/pendientes-<pid>.jsonl`):
+  recibe también los lotes que no se pudieron insertar. El hilo lo vuelve a
+  intentar cuando la cola está vacía. Al arrancar, cada proceso recoge los
+  ficheros de procesos que ya no existen.
+- Al terminar el proceso (atexit) se escribe lo que quede en la cola.
+
+`AUDITORIA_MODO = "sincrono"` escribe cada fila al momento, en su propia
+transacción (tests, scripts).
+
+Retención: la tabla guarda los últimos `AUDITORIA_RETENCION_MESES` meses.
+`flask audit-archive` pasa cada mes anterior a su propio fichero
+(`AUDITORIA_ARCHIVO_DIR/actividades-AAAA-MM.jsonl.gz`) y lo borra de la
+tabla. La actividad de un usuario se consulta por el índice
+(usuario_id, fecha_hora).
+"""
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert, select
+
+MODO_HILO = "hilo"
+MODO_SINCRONO = "sincrono"
+
+
+class Auditoria:
+    def __init__(self, app=None):
+        self.app = None
+        self._cola: Optional[queue.Queue] = None
+        self._hilo: Optional[threading.Thread] = None
+        self._pid = None
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self._lock_spool = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["auditoria"] = self
+        self.modo = app.config.get("AUDITORIA_MODO", MODO_HILO)
+        self.lote = app.config.get("AUDITORIA_LOTE", 200)
+        self.intervalo = app.config.get("AUDITORIA_INTERVALO", 2.0)
+        self.espera = app.config.get("AUDITORIA_ESPERA", 0.5)
+        self.directorio = app.config.get("AUDITORIA_SPOOL_DIR") or os.path.join(app.instance_path, "auditoria")
+        self._cola = queue.Queue(maxsize=app.config.get("AUDITORIA_COLA_MAX", 10000))
+        atexit.register(self.cerrar)
+
+    # ----------------- API -----------------
+    def registrar(self, usuario_id: int, accion: str, ip=None, agente=None, detalles=None):
+        """Encola una fila de `actividades_usuario`. No toca la sesión de la petición."""
+        fila = {
+            "usuario_id": usuario_id,
+            "accion": (accion or "")[:100],
+            "ip": (ip or None) and ip[:100],
+            "agente": (agente or None) and agente[:255],
+            "fecha_hora": datetime.utcnow(),
+            "detalles": detalles,
+        }
+        if self.modo == MODO_SINCRONO:
+            self._escribir_o_reservar([fila])
+            return
+        self._arrancar()
+        try:
+            self._cola.put(fila, timeout=self.espera)
+        except queue.Full:
+            self.app.logger.warning("Cola de auditoría llena: fila al fichero de reserva")
+            self._reservar([fila])
+
+    def vaciar(self, timeout: float = 10.0) -> bool:
+        """Espera a que se escriba todo lo encolado (tests, CLI). True si se vació a tiempo."""
+        limite = time.monotonic() + timeout
+        while self._cola.unfinished_tasks:
+            if not self._vivo():
+                self._drenar()
+                break
+            if time.monotonic() > limite:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def cerrar(self):
+        """Para el hilo y escribe lo pendiente (se llama al salir del proceso)."""
+        if self._cola is None:
+            return
+        self._parar.set()
+        if self._vivo():
+            self._hilo.join(timeout=10)
+        self._drenar()
+
+    # ----------------- Hilo escritor -----------------
+    def _vivo(self) -> bool:
+        return self._hilo is not None and self._hilo.is_alive() and self._pid == os.getpid()
+
+    def _arrancar(self):
+        # Perezoso y por proceso: tras el fork de gunicorn cada worker arranca el suyo
+        if self._vivo():
+            return
+        with self._lock:
+            if self._vivo():
+                return
+            if self._pid != os.getpid():
+                self._cola = queue.Queue(maxsize=self._cola.maxsize)
+                self._parar = threading.Event()
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._bucle, name="auditoria", daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        self._recoger_huerfanos()
+        while not self._parar.is_set():
+            filas = self._tomar(self.lote, self.intervalo)
+            if filas:
+                self._escribir_o_reservar(filas)
+                for _ in filas:
+                    self._cola.task_done()
+            else:
+                self._reintentar_reserva()
+
+    def _tomar(self, n: int, espera: Optional[float]) -> List[Dict]:
+        """Hasta `n` filas: espera (si se pide) por la primera, el resto sin bloquear."""
+        filas = []
+        try:
+            filas.append(self._cola.get(timeout=espera) if espera else self._cola.get_nowait())
+            while len(filas) < n:
+                filas.append(self._cola.get_nowait())
+        except queue.Empty:
+            pass
+        return filas
+
+    def _drenar(self):
+        while filas := self._tomar(self.lote, None):
+            self._escribir_o_reservar(filas)
+            for _ in filas:
+                self._cola.task_done()
+
+    # ----------------- Escritura -----------------
+    def _escribir(self, filas: List[Dict]):
+        from app.extensions import db
+        from app.models_shared import ActividadUsuario
+        with self.app.app_context():
+            with db.engine.begin() as conn:
+                conn.execute(insert(ActividadUsuario.__table__), filas)
+
+    def _escribir_o_reservar(self, filas: List[Dict]):
+        try:
+            self._escribir(filas)
+        except Exception:
+            self.app.logger.exception("No se pudieron escribir %s filas de auditoría", len(filas))
+            self._reservar(filas)
+
+    # ----------------- Fichero de reserva -----------------
+    def _ruta_reserva(self, pid=None) -> str:
+        return os.path.join(self.directorio, f"pendientes-{pid or os.getpid()}.jsonl")
+
+    def _reservar(self, filas: List[Dict]):
+        os.makedirs(self.directorio, exist_ok=True)
+        with self._lock_spool, open(self._ruta_reserva(), "a", encoding="utf-8") as f:
+            f.writelines(_linea(fila) for fila in filas)
+
+    def _reintentar_reserva(self, ruta: Optional[str] = None):
+        ruta = ruta or self._ruta_reserva()
+        with self._lock_spool:
+            if not os.path.exists(ruta):
+                return
+            with open(ruta, encoding="utf-8") as f:
+                filas = [json.loads(linea) for linea in f if linea.strip()]
+            for fila in filas:
+                fila["fecha_hora"] = datetime.fromisoformat(fila["fecha_hora"])
+            for i in range(0, len(filas), self.lote):
+                try:
+                    self._escribir(filas[i:i + self.lote])
+                except Exception:
+                    # Se deja solo lo que falta y se reintenta en la siguiente vuelta
+                    self._sobrescribir(ruta, filas[i:])
+                    return
+            os.remove(ruta)
+
+    def _sobrescribir(self, ruta: str, filas: List[Dict]):
+        tmp = f"{ruta}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(_linea(fila) for fila in filas)
+        os.replace(tmp, ruta)
+
+    def _recoger_huerfanos(self):
+        """Ficheros de reserva de procesos que ya terminaron."""
+        if not os.path.isdir(self.directorio):
+            return
+        for nombre in os.listdir(self.directorio):
+            if not (nombre.startswith("pendientes-") and nombre.endswith(".jsonl")):
+                continue
+            pid = nombre[len("pendientes-"):-len(".jsonl")]
+            if not pid.isdigit() or int(pid) == os.getpid() or _proceso_vivo(int(pid)):
+                continue
+            self._reintentar_reserva(os.path.join(self.directorio, nombre))
+
+
+def _linea(fila: Dict) -> str:
+    return json.dumps(dict(fila, fecha_hora=fila["fecha_hora"].isoformat()), ensure_ascii=False) + "\n"
+
+
+def _proceso_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+# ----------------- Archivo por meses -----------------
+def _mes(fecha: datetime) -> datetime:
+    return datetime(fecha.year, fecha.month, 1)
+
+
+def _sumar_meses(mes: datetime, n: int) -> datetime:
+    total = mes.year * 12 + mes.month - 1 + n
+    return datetime(total // 12, total % 12 + 1, 1)
+
+
+def directorio_archivo() -> str:
+    return current_app.config.get("AUDITORIA_ARCHIVO_DIR") or os.path.join(current_app.instance_path, "auditoria", "archivo")
+
+
+def ruta_archivo(mes: datetime) -> str:
+    return os.path.join(directorio_archivo(), f"actividades-{mes:%Y-%m}.jsonl.gz")
+
+
+def leer_archivo(ruta: str) -> Iterator[Dict]:
+    """
+    Filas de un fichero de archivo (JSON por línea, gzip). Una fila repetida
+    idéntica (ver `archivar_mes`) sale una sola vez.
+    """
+    vistas = set()
+    with gzip.open(ruta, "rt", encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if linea and linea not in vistas:
+                vistas.add(linea)
+                yield json.loads(linea)
+
+
+def meses_a_archivar(retencion_meses: int) -> List[datetime]:
+    """Meses con actividad anteriores a los `retencion_meses` últimos (el actual cuenta)."""
+    from app.extensions import db
+    from app.models_shared import ActividadUsuario
+    limite = _sumar_meses(_mes(datetime.utcnow()), -(retencion_meses - 1))
+    meses, desde = [], datetime.min
+    # Un salto por el índice de fecha_hora por mes con filas (los huecos no cuestan)
+    while (primera := db.session.execute(
+        select(func.min(ActividadUsuario.fecha_hora))
+        .where(ActividadUsuario.fecha_hora >= desde, ActividadUsuario.fecha_hora < limite)
+    ).scalar()) is not None:
+        meses.append(_mes(primera))
+        desde = _sumar_meses(meses[-1], 1)
+    return meses
+
+
+def archivar_mes(mes: datetime, lote: int = 5000) -> int:
+    """
+    Copia la actividad del mes a su fichero comprimido y la borra de la
+    tabla. Si el fichero ya existe (mes archivado antes) se le añaden las
+    filas del mes que haya ahora en la tabla. Solo se borran filas escritas
+    en esta ejecución. No se descarta nada por `id`: en SQLite los ids de
+    filas borradas se reutilizan, y una fila tardía (reserva de la
+    auditoría) puede tener el id de una ya archivada. Si una ejecución se
+    interrumpió entre escribir y borrar, esas filas se escriben otra vez.
+    `leer_archivo` omite las líneas idénticas. Devuelve cuántas filas salen
+    de la tabla.
+    """
+    from app.extensions import db
+    from app.models_shared import ActividadUsuario
+    tabla = ActividadUsuario.__table__
+    fin = _sumar_meses(mes, 1)
+    ruta = ruta_archivo(mes)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+    ids, ultimo = [], 0
+    tmp = f"{ruta}.part"
+    with open(tmp, "wb") as f:
+        if os.path.exists(ruta):
+            with open(ruta, "rb") as previo:
+                shutil.copyfileobj(previo, f)  # gzip admite varios miembros seguidos
+        with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+            while True:
+                filas = db.session.execute(
+                    select(tabla)
+                    .where(tabla.c.fecha_hora >= mes, tabla.c.fecha_hora < fin, tabla.c.id > ultimo)
+                    .order_by(tabla.c.id).limit(lote)
+                ).mappings().all()
+                if not filas:
+                    break
+                for fila in filas:
+                    gz.write(_linea(dict(fila)).encode("utf-8"))
+                ids.extend(fila["id"] for fila in filas)
+                ultimo = filas[-1]["id"]
+        f.flush()
+        os.fsync(f.fileno())
+    if not ids:
+        os.remove(tmp)
+        return 0
+    os.replace(tmp, ruta)
+
+    # Solo se borra cuando el fichero ya está completo en disco
+    for i in range(0, len(ids), lote):
+        db.session.execute(
+            delete(tabla)
+            .where(tabla.c.id.in_(ids[i:i + lote]), tabla.c.fecha_hora >= mes, tabla.c.fecha_hora < fin)
+        )
+        db.session.commit()
+    return len(ids)
+
+
+@click.command("audit-archive")
+@click.option("--meses", type=int, default=None,
+              help="Meses que se conservan en la tabla (por defecto AUDITORIA_RETENCION_MESES).")
+@click.option("--simular", is_flag=True, help="Solo muestra qué meses se archivarían.")
+@with_appcontext
+def audit_archive(meses, simular):
+    """Pasa la actividad de usuarios antigua a ficheros JSONL comprimidos, uno por mes"""
+    retencion = meses or current_app.config["AUDITORIA_RETENCION_MESES"]
+    pendientes = meses_a_archivar(max(retencion, 1))
+    if not pendientes:
+        click.echo(f"✅ Nada que archivar (se conservan {retencion} meses).")
+        return
+    for mes in pendientes:
+        if simular:
+            click.echo(f"  {mes:%Y-%m} → {ruta_archivo(mes)}")
+            continue
+        n = archivar_mes(mes)
+        click.echo(f"  {mes:%Y-%m}: {n} filas → {ruta_archivo(mes)}")
+    if not simular:
+        click.echo(f"✅ {len(pendientes)} meses archivados.")
@@ -0,0 +1,123 @@
+"""
+Autorización: roles y permisos del usuario actual.
+
+Los roles del usuario se leen una vez por petición (`current_user.roles`
+ya viene cargado con el usuario) y se guardan en `g` como frozenset de
+nombres y como máscara de bits. Cada permiso es la máscara de los roles que
+lo tienen, así que comprobarlo es un AND:
+
+    from app.autorizacion import puede, requiere_permiso
+
+    @bp.route("/nuevo")
+    @login_required
+    @requiere_permiso("gestionar")          # 403 si no
+    def nuevo(): ...
+
+    if puede("supervisar"): ...
+
+En las plantillas están `puede(...)` y `tiene_rol(...)`.
+"""
+from functools import wraps
+from typing import FrozenSet
+
+from flask import abort, flash, g, redirect, url_for
+from flask_login import current_user
+
+ROL_ADMINISTRADOR = "Administrador"
+ROL_ADMINISTRATIVO = "Administrativo"
+ROL_SUPERVISOR = "Supervisor"
+
+# Un bit por rol
+BITS_ROL = {
+    ROL_ADMINISTRADOR: 1 << 0,
+    ROL_ADMINISTRATIVO: 1 << 1,
+    ROL_SUPERVISOR: 1 << 2,
+}
+_ADMIN, _ADMINISTRATIVO, _SUPERVISOR = (BITS_ROL[r] for r in (ROL_ADMINISTRADOR, ROL_ADMINISTRATIVO, ROL_SUPERVISOR))
+
+# Permiso → roles que lo tienen
+PERMISOS = {
+    # Usuarios, borrados, validar/programar cursos, panel de rendimiento
+    "administrar": _ADMIN,
+    # Alta y edición de cursos y matrículas, validar pagos, exportaciones
+    "gestionar": _ADMIN | _ADMINISTRATIVO,
+    # Panel de validaciones, validar matrículas, facturación
+    "supervisar": _ADMIN | _SUPERVISOR,
+    # Notas de los alumnos
+    "calificar": _ADMIN | _ADMINISTRATIVO | _SUPERVISOR,
+}
+
+
+def _actual():
+    """(usuario_id, roles, máscara) del usuario actual, calculado una vez por petición."""
+    usuario_id = current_user.get_id() if current_user else None
+    datos = g.get("_autorizacion")
+    # Se recalcula si cambia el usuario dentro de la petición (login/logout)
+    if datos is None or datos[0] != usuario_id:
+        if usuario_id is None or not current_user.is_authenticated:
+            roles = frozenset()
+        else:
+            roles = frozenset(r.nombre for r in current_user.roles)
+        mascara = 0
+        for nombre in roles:
+            mascara |= BITS_ROL.get(nombre, 0)
+        datos = g._autorizacion = (usuario_id, roles, mascara)
+    return datos
+
+
+def roles_actuales() -> FrozenSet[str]:
+    return _actual()[1]
+
+
+def mascara_actual() -> int:
+    return _actual()[2]
+
+
+def tiene_rol(*nombres: str) -> bool:
+    """True si el usuario tiene alguno de los roles."""
+    return not roles_actuales().isdisjoint(nombres)
+
+
+def puede(permiso: str) -> bool:
+    return bool(mascara_actual() & PERMISOS[permiso])
+
+
+def es_admin() -> bool:
+    return puede("administrar")
+
+
+# ----------------- Decoradores -----------------
+def requiere_permiso(permiso: str, mensaje: str = None, destino: str = None):
+    """
+    403 si el usuario no tiene el permiso. Con `mensaje` y `destino`
+    (endpoint) muestra el aviso y redirige en vez de 403.
+    """
+    mascara = PERMISOS[permiso]  # KeyError al importar si el permiso no existe
+
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if not mascara_actual() & mascara:
+                if mensaje and destino:
+                    flash(mensaje, "danger")
+                    return redirect(url_for(destino))
+                abort(403)
+            return vista(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def requiere_rol(*nombres: str):
+    """403 si el usuario no tiene ninguno de los roles."""
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if not tiene_rol(*nombres):
+                abort(403)
+            return vista(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def contexto_plantillas():
+    return {"puede": puede, "tiene_rol": tiene_rol}
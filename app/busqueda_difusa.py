@@ -0,0 +1,72 @@
+"""
+busqueda_difusa.py
+Búsqueda aproximada de nombres por trigramas, reutilizable entre módulos.
+
+- normalizar(): clave de búsqueda sin tildes, en minúsculas y con un solo
+  espacio entre palabras ("José  GARCÍA-López" → "jose garcia lopez").
+- trigramas(): los de pg_trgm (cada palabra con "  " delante y " " detrás),
+  así que el orden se parece al de PostgreSQL.
+- IndiceTrigramas: índice invertido en memoria para las bases sin pg_trgm
+  (SQLite). Puntúa como `word_similarity`: qué parte de los trigramas de la
+  consulta aparece en la clave, de modo que "garsia" encuentra "garcia" y
+  una búsqueda parcial ("jose garcia") encuentra el nombre completo.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Puntuación mínima (0..1) para considerar que una clave coincide
+UMBRAL = 0.5
+
+
+def normalizar(texto) -> str:
+    if not texto:
+        return ""
+    sin_tildes = "".join(
+        c for c in unicodedata.normalize("NFKD", str(texto)) if not unicodedata.combining(c)
+    )
+    return " ".join(re.findall(r"[a-z0-9]+", sin_tildes.lower()))
+
+
+def trigramas(texto: str) -> Set[str]:
+    resultado = set()
+    for palabra in texto.split():
+        relleno = f"  {palabra} "
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return resultado
+
+
+class IndiceTrigramas:
+    """Índice trigrama → claves. Se construye una vez y se consulta muchas."""
+
+    def __init__(self, claves: Iterable[str]):
+        self.claves: List[str] = []
+        self.listas: Dict[str, List[int]] = defaultdict(list)
+        for clave in set(c for c in claves if c):
+            n = len(self.claves)
+            self.claves.append(clave)
+            for t in trigramas(clave):
+                self.listas[t].append(n)
+        self.listas = dict(self.listas)
+
+    def __len__(self):
+        return len(self.claves)
+
+    def buscar(self, consulta: str, limite: int = 500, umbral: float = UMBRAL) -> List[Tuple[str, float]]:
+        """[(clave, puntuación)] de mayor a menor. `consulta` ya normalizada."""
+        buscados = trigramas(consulta)
+        if not buscados:
+            return []
+        aciertos: Dict[int, int] = defaultdict(int)
+        for t in buscados:
+            for n in self.listas.get(t, ()):
+                aciertos[n] += 1
+        resultados = []
+        for n, cuantos in aciertos.items():
+            clave = self.claves[n]
+            puntuacion = 1.0 if consulta in clave else cuantos / len(buscados)
+            if puntuacion >= umbral:
+                resultados.append((clave, puntuacion))
+        resultados.sort(key=lambda r: (-r[1], r[0]))
+        return resultados[:limite]
@@ -0,0 +1,269 @@
+"""
+Caché de resultados con TTL e invalidación por modelo.
+
+Backends disponibles (config `CACHE_BACKEND`):
+- "memory": LRU en el propio proceso (desarrollo, un solo worker).
+- "sqlite": fichero SQLite compartido por todos los workers de gunicorn.
+- "null":   no guarda nada (tests).
+
+Cada entrada puede declarar `tags` (nombres de tabla). Cuando una transacción
+que ha escrito en esa tabla hace commit, se incrementa la generación del tag
+y todas las entradas que dependían de él dejan de ser válidas, sin tener que
+recorrerlas. Con el backend "sqlite" la generación es compartida, así que la
+invalidación alcanza a todos los workers.
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_SIN_VALOR = object()
+
+
+# ----------------- Backends -----------------
+# Interfaz común: get / set / delete / clear para las entradas, y
+# generations / bump para los contadores de invalidación de cada tag.
+class NullBackend:
+    def get(self, key):
+        return _SIN_VALOR
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def generations(self, tags):
+        return {t: 0 for t in tags}
+
+    def bump(self, tag):
+        pass
+
+
+class MemoryBackend:
+    """LRU en memoria con caducidad por entrada. Seguro entre hilos."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _SIN_VALOR
+            expira, value = item
+            if expira is not None and expira < time.time():
+                del self._data[key]
+                return _SIN_VALOR
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expira = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expira, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def generations(self, tags):
+        return {t: self._tags.get(t, 0) for t in tags}
+
+    def bump(self, tag):
+        with self._lock:
+            self._tags[tag] = self._tags.get(tag, 0) + 1
+
+
+class SQLiteBackend:
+    """
+    Caché en un fichero SQLite compartido entre procesos. Se abre una conexión
+    por operación para no heredar conexiones a través del fork de gunicorn.
+    """
+
+    def __init__(self, path, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expira REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT PRIMARY KEY, gen INTEGER NOT NULL)")
+
+    @contextmanager
+    def _conn(self):
+        # Autocommit: cada sentencia es su transacción. La conexión se cierra
+        # siempre (`with sqlite3.connect(...)` solo hace commit/rollback).
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        with self._conn() as conn:
+            row = conn.execute("SELECT value, expira FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return _SIN_VALOR
+        value, expira = row
+        if expira is not None and expira < time.time():
+            self.delete(key)
+            return _SIN_VALOR
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        ahora = time.time()
+        expira = ahora + ttl if ttl else None
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expira) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expira),
+            )
+            # Poda ocasional: caducadas primero y, si aún sobran, las más antiguas
+            if random.random() < 0.02:
+                conn.execute("DELETE FROM cache WHERE expira IS NOT NULL AND expira < ?", (ahora,))
+                conn.execute(
+                    "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY rowid"
+                    " LIMIT max(0, (SELECT count(*) FROM cache) - ?))",
+                    (self.max_entries,),
+                )
+
+    def delete(self, key):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM cache")
+
+    def generations(self, tags):
+        tags = list(tags)
+        with self._conn() as conn:
+            rows = conn.execute(
+                f"SELECT tag, gen FROM cache_tags WHERE tag IN ({','.join('?' * len(tags))})", tags
+            ).fetchall()
+        gens = dict(rows)
+        return {t: gens.get(t, 0) for t in tags}
+
+    def bump(self, tag):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO cache_tags (tag, gen) VALUES (?, 1)"
+                " ON CONFLICT(tag) DO UPDATE SET gen = gen + 1",
+                (tag,),
+            )
+
+
+# ----------------- Extensión -----------------
+class Cache:
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.default_ttl = 60
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        tipo = app.config.get("CACHE_BACKEND", "memory")
+        self.default_ttl = app.config.get("CACHE_DEFAULT_TTL", 60)
+        if tipo == "sqlite":
+            path = app.config.get("CACHE_SQLITE_PATH") or os.path.join(app.instance_path, "cache.sqlite3")
+            self.backend = SQLiteBackend(path)
+        elif tipo == "memory":
+            self.backend = MemoryBackend(app.config.get("CACHE_MAX_ENTRIES", 512))
+        else:
+            self.backend = NullBackend()
+        app.extensions["cache"] = self
+        _registrar_invalidacion(self)
+
+    def _clave(self, key, tags):
+        """La clave real incluye la generación actual de cada tag."""
+        if not tags:
+            return key
+        gens = self.backend.generations(sorted(tags))
+        return key + "|" + ",".join(f"{t}={g}" for t, g in gens.items())
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.bump(tag)
+
+    # --- API pública ---
+    def get(self, key, tags=()):
+        value = self.backend.get(self._clave(key, tags))
+        return None if value is _SIN_VALOR else value
+
+    def set(self, key, value, ttl=None, tags=()):
+        self.backend.set(self._clave(key, tags), value, ttl or self.default_ttl)
+
+    def delete(self, key, tags=()):
+        self.backend.delete(self._clave(key, tags))
+
+    def get_or_set(self, key, factory, ttl=None, tags=()):
+        """Devuelve el valor cacheado o lo calcula con `factory()` y lo guarda."""
+        clave = self._clave(key, tags)
+        value = self.backend.get(clave)
+        if value is _SIN_VALOR:
+            value = factory()
+            self.backend.set(clave, value, ttl or self.default_ttl)
+        return value
+
+    def clear(self):
+        self.backend.clear()
+
+
+# ----------------- Invalidación al hacer commit -----------------
+_INFO_TABLAS = "cache_tablas_modificadas"
+_registrado = False
+
+
+def _registrar_invalidacion(cache):
+    """Escucha todas las sesiones y, tras cada commit, invalida las tablas escritas."""
+    global _registrado
+    if _registrado:
+        return
+    _registrado = True
+
+    @event.listens_for(Session, "after_flush")
+    def _anotar_flush(session, flush_context):
+        tablas = session.info.setdefault(_INFO_TABLAS, set())
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            tabla = getattr(obj, "__table__", None)
+            if tabla is not None:
+                tablas.add(tabla.name)
+
+    @event.listens_for(Session, "do_orm_execute")
+    def _anotar_bulk(orm_execute_state):
+        # query.update()/query.delete() no pasan por el flush
+        if orm_execute_state.is_update or orm_execute_state.is_delete:
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None:
+                orm_execute_state.session.info.setdefault(_INFO_TABLAS, set()).add(mapper.local_table.name)
+
+    @event.listens_for(Session, "after_commit")
+    def _invalidar(session):
+        tablas = session.info.pop(_INFO_TABLAS, None)
+        if tablas:
+            cache.invalidate(*tablas)
+
+    @event.listens_for(Session, "after_rollback")
+    def _descartar(session):
+        session.info.pop(_INFO_TABLAS, None)
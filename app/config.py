@@ -11,6 +11,50 @@ class Config:
     # Configuración de uploads
     UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", os.path.join(BASE_DIR.parent, "instance", "uploads"))
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB máximo
+    UPLOAD_MAX_FILE_MB = float(os.getenv("UPLOAD_MAX_FILE_MB", 10))  # por fichero, salvo @limite_subida
+
+    # Almacén de ficheros por contenido: "local" (STORAGE_DIR) | "s3"
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+    STORAGE_DIR = os.getenv("STORAGE_DIR")  # por defecto UPLOAD_FOLDER/objetos
+    STORAGE_S3_BUCKET = os.getenv("STORAGE_S3_BUCKET")
+    STORAGE_S3_ENDPOINT = os.getenv("STORAGE_S3_ENDPOINT")  # p.ej. http://localhost:9000 (MinIO)
+    STORAGE_S3_PREFIX = os.getenv("STORAGE_S3_PREFIX", "")
+    STORAGE_S3_REGION = os.getenv("STORAGE_S3_REGION")
+    STORAGE_CACHE_DIR = os.getenv("STORAGE_CACHE_DIR")  # caché local del backend s3
+
+    # Entrega de ficheros: "python" (send_file) | "x-accel-redirect" (nginx) | "x-sendfile" (Apache)
+    ENTREGA_ARCHIVOS = os.getenv("ENTREGA_ARCHIVOS", "python")
+    ENTREGA_X_ACCEL_MAPA = os.getenv("ENTREGA_X_ACCEL_MAPA")  # "carpeta=/location/interna/;..."
+
+    # Miniaturas de comprobantes/documentos (necesitan Pillow; los PDF, pypdfium2)
+    MINIATURAS_DIR = os.getenv("MINIATURAS_DIR")  # por defecto instance/miniaturas
+
+    # Caché de contadores y dashboards: "memory" | "sqlite" | "null"
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", 60))  # segundos
+    CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH")  # por defecto instance/cache.sqlite3
+    IDENTIDAD_TTL = int(os.getenv("IDENTIDAD_TTL", 300))  # segundos que vale la identidad cacheada del usuario
+
+    # Instrumentación de rendimiento (/admin/perf y cabecera Server-Timing)
+    PERF_ENABLED = os.getenv("PERF_ENABLED", "0").lower() in ("1", "true", "yes")
+    PERF_BUFFER_SIZE = int(os.getenv("PERF_BUFFER_SIZE", 500))  # muestras por worker
+
+    # Trabajos en segundo plano: "worker" (proceso `flask worker`) | "hilo" (hilo del proceso web)
+    TRABAJOS_MODO = os.getenv("TRABAJOS_MODO", "hilo")
+    TRABAJOS_MAX_INTENTOS = int(os.getenv("TRABAJOS_MAX_INTENTOS", 3))
+    TRABAJOS_REINTENTO_BASE = int(os.getenv("TRABAJOS_REINTENTO_BASE", 30))  # segundos, se duplica en cada intento
+    TRABAJOS_LATIDO = int(os.getenv("TRABAJOS_LATIDO", 30))  # segundos entre latidos de un trabajo en curso
+    TRABAJOS_TIMEOUT = int(os.getenv("TRABAJOS_TIMEOUT", 300))  # sin latido → se devuelve a la cola
+
+    # Auditoría (actividades_usuario): "hilo" (por lotes en segundo plano) | "sincrono"
+    AUDITORIA_MODO = os.getenv("AUDITORIA_MODO", "hilo")
+    AUDITORIA_LOTE = int(os.getenv("AUDITORIA_LOTE", 200))  # filas por INSERT
+    AUDITORIA_INTERVALO = float(os.getenv("AUDITORIA_INTERVALO", 2))  # segundos máx. que espera una fila
+    AUDITORIA_COLA_MAX = int(os.getenv("AUDITORIA_COLA_MAX", 10000))  # llena → fichero de reserva
+    AUDITORIA_ESPERA = float(os.getenv("AUDITORIA_ESPERA", 0.5))  # segundos que espera quien registra si está llena
+    AUDITORIA_SPOOL_DIR = os.getenv("AUDITORIA_SPOOL_DIR")  # por defecto instance/auditoria
+    AUDITORIA_RETENCION_MESES = int(os.getenv("AUDITORIA_RETENCION_MESES", 12))  # el resto, a `flask audit-archive`
+    AUDITORIA_ARCHIVO_DIR = os.getenv("AUDITORIA_ARCHIVO_DIR")  # por defecto instance/auditoria/archivo
 
 class DevelopmentConfig(Config):
     """Configuración para desarrollo (SQLite)"""
@@ -21,6 +65,9 @@ class ProductionConfig(Config):
     """Configuración para producción (PostgreSQL)"""
     DEBUG = False
     TESTING = False
+
+    # Varios workers de gunicorn: la caché tiene que ser compartida
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")
     
     # Usar PostgreSQL en producción
     database_url = os.getenv("DATABASE_URL")
@@ -38,3 +85,5 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    CACHE_BACKEND = "null"
+    AUDITORIA_MODO = "sincrono"
@@ -1,6 +1,9 @@
-from flask import render_template, redirect, url_for
+from flask import render_template, redirect, url_for, request
 from flask_login import login_required
 
+from app.extensions import perf
+from app.autorizacion import requiere_permiso
+
 from . import bp
 
 @bp.route('/')
@@ -16,4 +19,21 @@ def dashboard():
     Endpoint de compatibilidad para el dashboard.
     Redirige al endpoint principal index.
     """
-    return redirect(url_for('core.index'))
\ No newline at end of file
+    return redirect(url_for('core.index'))
+
+
+@bp.route('/admin/perf', methods=['GET', 'POST'])
+@login_required
+@requiere_permiso("administrar")
+def perf_panel():
+    """Tiempos y nº de consultas por endpoint (solo Administradores)"""
+    if request.method == 'POST':
+        perf.vaciar()
+        return redirect(url_for('core.perf_panel'))
+
+    return render_template(
+        'core/perf.html',
+        enabled=perf.enabled,
+        resumen=perf.resumen(),
+        recientes=perf.recientes(),
+    )
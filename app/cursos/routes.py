@@ -2,8 +2,9 @@ from datetime import date, timedelta
 from flask import render_template, request, redirect, url_for, flash, abort
 from flask_login import login_required, current_user
 from sqlalchemy import func
-from app.extensions import db
+from app.extensions import db, cache
 from app.usuarios.models import Usuario
+from app.autorizacion import puede, requiere_permiso
 from . import bp
 from .models import (
     Curso, Modulo, Programacion,
@@ -27,16 +28,6 @@ from app.models_shared import registrar_actividad
 class DummyForm(FlaskForm):
     """Formulario vacío solo para incluir token CSRF en vistas informativas."""
     pass
-# ----------------- helpers permisos -----------------
-def es_admin() -> bool:
-    return any(r.nombre == "Administrador" for r in current_user.roles)
-
-def es_administrativo() -> bool:
-    return any(r.nombre == "Administrativo" for r in current_user.roles)
-
-def puede_crear_o_editar() -> bool:
-    return es_admin() or es_administrativo()
-
 
 def _flash_form_errors(form):
     """Muestra mensajes de error de validación."""
@@ -67,12 +58,17 @@ def index():
         cursos_fp = [c for c in cursos_fp if filtro.lower() in c.nombre.lower()]
         cursos_int = [c for c in cursos_int if filtro.lower() in c.nombre.lower()]
 
-    # ✅ Métricas globales (no cambian)
-    total_validados = Curso.query.filter(Curso.estado == ESTADO_VALIDADO).count()
-    total_borrador = Curso.query.filter(Curso.estado == ESTADO_BORRADOR).count()
-    total_programados = Curso.query.filter(Curso.estado == ESTADO_PROGRAMADO).count()
-    total_cancelados = Curso.query.filter(Curso.estado == "CANCELADO").count()
-    total_cerrados = Curso.query.filter(Curso.estado == "CERRADO").count()
+    # ✅ Métricas globales (no cambian): una sola consulta agrupada, cacheada hasta el próximo commit
+    totales = cache.get_or_set(
+        "cursos:totales_por_estado",
+        lambda: dict(db.session.query(Curso.estado, func.count(Curso.id)).group_by(Curso.estado).all()),
+        tags=(Curso.__tablename__,),
+    )
+    total_validados = totales.get(ESTADO_VALIDADO, 0)
+    total_borrador = totales.get(ESTADO_BORRADOR, 0)
+    total_programados = totales.get(ESTADO_PROGRAMADO, 0)
+    total_cancelados = totales.get("CANCELADO", 0)
+    total_cerrados = totales.get("CERRADO", 0)
 
     return render_template(
         "cursos/index.html",
@@ -88,10 +84,8 @@ def index():
 # ----------------- CREAR -----------------
 @bp.route("/nuevo", methods=["GET", "POST"])
 @login_required
+@requiere_permiso("gestionar")
 def nuevo():
-    if not puede_crear_o_editar():
-        abort(403)
-
     modo = request.args.get("modo", "vacio")  # "vacio" o "plantilla"
 
     # ----- desde plantilla -----
@@ -117,7 +111,7 @@ def nuevo():
                     horas_semanales=plantilla.horas_semanales,
                     estado=ESTADO_BORRADOR,
                     es_plantilla=False,
-                    created_by=current_user,
+                    created_by_id=current_user.id,
                 )
                 db.session.add(nuevo)
                 db.session.flush()
@@ -164,7 +158,7 @@ def nuevo():
                 horas_semanales=form.horas_semanales.data,
                 estado=ESTADO_BORRADOR,
                 es_plantilla=False,
-                created_by=current_user,
+                created_by_id=current_user.id,
             )
             db.session.add(curso)
             db.session.flush()
@@ -234,7 +228,7 @@ def editar(curso_id):
     curso = db.session.get(Curso, curso_id) or abort(404)
 
     # Modificación: permitir que tanto Administrador como Administrativo editen cursos
-    if curso.estado in (ESTADO_VALIDADO, ESTADO_PROGRAMADO) and not (es_admin() or es_administrativo()):
+    if curso.estado in (ESTADO_VALIDADO, ESTADO_PROGRAMADO) and not puede("gestionar"):
         abort(403)
 
     form = CursoNuevoForm()
@@ -320,9 +314,8 @@ def editar(curso_id):
 # ----------------- VALIDAR (solo admin) -----------------
 @bp.route("/<int:curso_id>/validar", methods=["POST"])
 @login_required
+@requiere_permiso("administrar")
 def validar(curso_id):
-    if not es_admin():
-        abort(403)
     curso = db.session.get(Curso, curso_id) or abort(404)
     if curso.estado != ESTADO_BORRADOR:
         flash("El curso no está en estado BORRADOR.", "warning")
@@ -341,9 +334,8 @@ def validar(curso_id):
 # ----------------- TOGGLE PLANTILLA -----------------
 @bp.route("/<int:curso_id>/toggle-plantilla", methods=["POST"])
 @login_required
+@requiere_permiso("administrar")
 def toggle_plantilla(curso_id):
-    if not es_admin():
-        abort(403)
     curso = db.session.get(Curso, curso_id) or abort(404)
     if curso.estado != ESTADO_VALIDADO:
         flash("Solo cursos validados pueden ser marcados como plantilla.", "warning")
@@ -359,7 +351,7 @@ def toggle_plantilla(curso_id):
 @login_required
 def programar(curso_id):
     curso = db.session.get(Curso, curso_id) or abort(404)
-    if not es_admin():
+    if not puede("administrar"):
         abort(403)
     if curso.estado != ESTADO_VALIDADO:
         flash("Solo cursos validados pueden programarse.", "warning")
@@ -447,9 +439,8 @@ def programacion_revision(curso_id):
 # -------- validar programación --------
 @bp.route("/<int:curso_id>/programacion/validar", methods=["POST"])
 @login_required
+@requiere_permiso("administrar")
 def programacion_validar(curso_id):
-    if not es_admin():
-        abort(403)
     curso = db.session.get(Curso, curso_id) or abort(404)
     prog = curso.programacion or abort(404)
 
@@ -465,8 +456,8 @@ def programacion_validar(curso_id):
 def desprogramar(curso_id):
     curso = Curso.query.get_or_404(curso_id)
 
-    # ✅ Comprobamos permisos usando las funciones helper definidas arriba
-    if not (es_admin() or es_administrativo()):
+    # ✅ Comprobamos permisos (app/autorizacion.py)
+    if not puede("gestionar"):
         flash("No tienes permisos para desprogramar cursos.", "danger")
         return redirect(url_for("cursos.detalle", curso_id=curso.id))
 
@@ -489,7 +480,7 @@ def cancelar(curso_id):
     form = CancelarCursoForm()
 
     # ✅ Control de permisos
-    if not (es_admin() or es_administrativo()):
+    if not puede("gestionar"):
         flash("No tienes permisos para cancelar cursos.", "danger")
         return redirect(url_for("cursos.detalle", curso_id=curso.id))
 
@@ -512,7 +503,7 @@ def cerrar(curso_id):
     form = CerrarCursoForm()
 
     # ✅ Control de permisos
-    if not (es_admin() or es_administrativo()):
+    if not puede("gestionar"):
         flash("No tienes permisos para cerrar cursos.", "danger")
         return redirect(url_for("cursos.detalle", curso_id=curso.id))
 
@@ -0,0 +1,150 @@
+"""
+Búsqueda de texto completo en el registro de entradas/salidas.
+
+Sustituye los `ILIKE '%término%'` sobre descripción y observaciones (que
+recorren la tabla entera) por un índice de texto:
+
+- SQLite: tabla virtual FTS5 `documentos_fts` con contenido externo
+  (`documentos_registros`), mantenida por triggers.
+- PostgreSQL: columna generada `busqueda` (tsvector, config "spanish") con
+  índice GIN; la mantiene la propia base de datos.
+
+En los dos casos el índice se actualiza solo en cada insert/update/delete,
+también si la fila se toca fuera del ORM. La API es la misma:
+
+    q = Documento.query.filter_by(tipo="entrada")
+    q = busqueda.filtrar(q, "factura agua")   # AND de prefijos, ordenado por relevancia
+
+Si el índice no existe (base creada con create_all en vez de migraciones)
+se usa el ILIKE de siempre; `flask documentos-reindexar` lo crea y lo rellena.
+"""
+import re
+from typing import Dict, List
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, literal_column, select, text, or_
+
+from app.extensions import db
+from .models import Documento
+
+TABLA_FTS = "documentos_fts"
+CAMPOS = ("numero_referencia", "remitente", "destinatario", "remitente_interno", "descripcion", "observaciones")
+# Peso de cada campo en el orden (bm25 en SQLite): la referencia pesa más que las observaciones
+PESOS = (10.0, 3.0, 3.0, 3.0, 2.0, 1.0)
+
+_disponible: Dict[str, bool] = {}
+
+
+def _terminos(termino: str) -> List[str]:
+    return re.findall(r"\w+", termino or "")
+
+
+# ----------------- DDL -----------------
+def ddl(dialecto: str) -> List[str]:
+    """Sentencias que crean el índice (idempotentes). Las mismas que la migración."""
+    if dialecto == "postgresql":
+        return [
+            "ALTER TABLE documentos_registros ADD COLUMN IF NOT EXISTS busqueda tsvector GENERATED ALWAYS AS ("
+            " setweight(to_tsvector('spanish', coalesce(numero_referencia, '')), 'A')"
+            " || setweight(to_tsvector('spanish', coalesce(remitente, '') || ' ' || coalesce(destinatario, '')"
+            " || ' ' || coalesce(remitente_interno, '')), 'B')"
+            " || setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'B')"
+            " || setweight(to_tsvector('spanish', coalesce(observaciones, '')), 'C')) STORED",
+            "CREATE INDEX IF NOT EXISTS ix_documentos_registros_busqueda ON documentos_registros USING gin (busqueda)",
+        ]
+    if dialecto == "sqlite":
+        campos = ", ".join(CAMPOS)
+        nuevos = ", ".join(f"new.{c}" for c in CAMPOS)
+        viejos = ", ".join(f"old.{c}" for c in CAMPOS)
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5({campos}, "
+            "content='documentos_registros', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+            f"CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ai AFTER INSERT ON documentos_registros BEGIN "
+            f"INSERT INTO {TABLA_FTS}(rowid, {campos}) VALUES (new.id, {nuevos}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ad AFTER DELETE ON documentos_registros BEGIN "
+            f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {campos}) VALUES ('delete', old.id, {viejos}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_au AFTER UPDATE OF {campos} ON documentos_registros BEGIN "
+            f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {campos}) VALUES ('delete', old.id, {viejos}); "
+            f"INSERT INTO {TABLA_FTS}(rowid, {campos}) VALUES (new.id, {nuevos}); END",
+        ]
+    return []
+
+
+def disponible() -> bool:
+    """True si la base de datos actual tiene el índice (se comprueba una vez por base de datos)."""
+    clave = str(db.engine.url)
+    if clave not in _disponible:
+        dialecto = db.engine.dialect.name
+        if dialecto == "sqlite":
+            sql = "SELECT 1 FROM sqlite_master WHERE name = :nombre"
+            existe = db.session.execute(text(sql), {"nombre": TABLA_FTS}).first()
+        elif dialecto == "postgresql":
+            sql = ("SELECT 1 FROM information_schema.columns "
+                   "WHERE table_name = 'documentos_registros' AND column_name = 'busqueda'")
+            existe = db.session.execute(text(sql)).first()
+        else:
+            existe = None
+        _disponible[clave] = existe is not None
+    return _disponible[clave]
+
+
+# ----------------- Consulta -----------------
+def filtrar(q, termino: str):
+    """
+    Filtra la consulta de Documento por `termino` (todas las palabras, como
+    prefijo) y la ordena por relevancia. Orden adicional: añadir después.
+    """
+    terminos = _terminos(termino)
+    if not terminos:
+        return q
+    if not disponible():
+        return _filtrar_ilike(q, terminos)
+
+    if db.engine.dialect.name == "postgresql":
+        consulta = func.to_tsquery("spanish", " & ".join(f"{t}:*" for t in terminos))
+        vector = literal_column("documentos_registros.busqueda")
+        return q.filter(vector.op("@@")(consulta)).order_by(func.ts_rank_cd(vector, consulta).desc())
+
+    pesos = ", ".join(str(p) for p in PESOS)
+    coincidencias = (
+        select(
+            literal_column("rowid").label("id"),
+            literal_column(f"bm25({TABLA_FTS}, {pesos})").label("puntuacion"),
+        )
+        .select_from(text(TABLA_FTS))
+        .where(text(f"{TABLA_FTS} MATCH :consulta").bindparams(consulta=" ".join(f'"{t}"*' for t in terminos)))
+        .subquery()
+    )
+    return q.join(coincidencias, coincidencias.c.id == Documento.id).order_by(coincidencias.c.puntuacion)
+
+
+def _filtrar_ilike(q, terminos: List[str]):
+    for t in terminos:
+        like = f"%{t}%"
+        q = q.filter(or_(*(getattr(Documento, c).ilike(like) for c in CAMPOS)))
+    return q
+
+
+# ----------------- Mantenimiento -----------------
+def reindexar():
+    """Crea el índice si falta y lo reconstruye desde la tabla."""
+    dialecto = db.engine.dialect.name
+    for sentencia in ddl(dialecto):
+        db.session.execute(text(sentencia))
+    if dialecto == "sqlite":
+        db.session.execute(text(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')"))
+    db.session.commit()
+    _disponible.pop(str(db.engine.url), None)
+    return disponible()
+
+
+@click.command("documentos-reindexar")
+@with_appcontext
+def documentos_reindexar():
+    """Crea/reconstruye el índice de texto completo del registro de documentos"""
+    if reindexar():
+        click.echo("✅ Índice de búsqueda de documentos reconstruido.")
+    else:
+        click.echo("⚠️ Esta base de datos no admite el índice; se seguirá usando ILIKE.")
@@ -23,6 +23,7 @@ class Documento(db.Model):
     # Archivo y versionado
     filename = db.Column(db.String(255), nullable=False)   # nombre base (última versión)
     version = db.Column(db.Integer, nullable=False, default=1)
+    sha256 = db.Column(db.String(64), nullable=True, index=True)  # fichero de la versión actual (app/storage)
 
     # Auditoría
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -33,6 +34,14 @@ class Documento(db.Model):
     # Ruta real del archivo de la versión actual
     @property
     def file_path(self) -> str:
+        if self.sha256:
+            from app.extensions import storage
+            return storage.ruta_local(self.sha256)
+        return self.ruta_legada
+
+    # Ruta con nombre propio que se usaba antes del almacén por contenido
+    @property
+    def ruta_legada(self) -> str:
         updir = current_app.config.get("UPLOAD_FOLDER", os.path.join(current_app.instance_path, "uploads", "documentos"))
         return os.path.join(updir, f"{self.numero_referencia}_v{self.version}{os.path.splitext(self.filename)[1].lower()}")
 
@@ -1,38 +1,39 @@
 import os
 from datetime import datetime
-from flask import render_template, request, redirect, url_for, flash, current_app, send_file, abort
+from flask import render_template, request, redirect, url_for, flash, abort
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from app.extensions import db
+from app.extensions import db, cache, storage
+from app.storage.subidas import limite_subida, tipo_real, nombre_seguro
+from app.storage.entrega import enviar_archivo
+from app.storage.miniaturas import encolar_miniatura, responder_miniatura
 from app.usuarios.models import Usuario
-from . import bp
+from app.autorizacion import requiere_permiso
+from . import bp, busqueda
 from .models import Documento
 from .forms import EntradaForm, SalidaForm
 
 # ====== Configuración de subida ======
-ALLOWED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg"}
+# El tipo se comprueba por el contenido; el tamaño, al recibirlo (@limite_subida)
+TIPOS_PERMITIDOS = ("pdf", "png", "jpg")
 MAX_FILE_MB = 20
 
-def ensure_upload_dir():
-    """Crea (si no existe) la carpeta de subida."""
-    updir = current_app.config.get(
-        "UPLOAD_FOLDER",
-        os.path.join(current_app.instance_path, "uploads", "documentos")
-    )
-    os.makedirs(updir, exist_ok=True)
-    return updir
 
-def allowed_file(filename: str) -> bool:
-    """Comprueba si la extensión es válida."""
-    return os.path.splitext(filename)[1].lower() in ALLOWED_EXTENSIONS
+def totales_por_tipo() -> dict:
+    """Nº de registros por tipo (entrada/salida), cacheado hasta el próximo commit."""
+    return cache.get_or_set(
+        "documentos:totales_por_tipo",
+        lambda: dict(db.session.query(Documento.tipo, db.func.count(Documento.id)).group_by(Documento.tipo).all()),
+        tags=(Documento.__tablename__,),
+    )
 
 
 # ====== Landing del módulo: tarjetas ENTRADAS / SALIDAS / ESTADÍSTICAS ======
 @bp.route("/")
 @login_required
 def index():
-    total_entradas = db.session.query(Documento).filter_by(tipo="entrada").count()
-    total_salidas = db.session.query(Documento).filter_by(tipo="salida").count()
+    totales = totales_por_tipo()
+    total_entradas = totales.get("entrada", 0)
+    total_salidas = totales.get("salida", 0)
     return render_template(
         "documentos/index.html",
         total_entradas=total_entradas,
@@ -56,15 +57,7 @@ def entradas():
 
     term = request.args.get("q", "").strip()
     if term:
-        like = f"%{term}%"
-        q = q.filter(
-            db.or_(
-                Documento.numero_referencia.ilike(like),
-                Documento.remitente.ilike(like),
-                Documento.descripcion.ilike(like),
-                Documento.observaciones.ilike(like),
-            )
-        )
+        q = busqueda.filtrar(q, term)  # texto completo, por relevancia
 
     docs = q.order_by(Documento.created_at.desc()).all()
     return render_template("documentos/entradas.html", docs=docs)
@@ -83,16 +76,7 @@ def salidas():
 
     term = request.args.get("q", "").strip()
     if term:
-        like = f"%{term}%"
-        q = q.filter(
-            db.or_(
-                Documento.numero_referencia.ilike(like),
-                Documento.destinatario.ilike(like),
-                Documento.remitente_interno.ilike(like),
-                Documento.descripcion.ilike(like),
-                Documento.observaciones.ilike(like),
-            )
-        )
+        q = busqueda.filtrar(q, term)  # texto completo, por relevancia
 
     docs = q.order_by(Documento.created_at.desc()).all()
     return render_template("documentos/salidas.html", docs=docs)
@@ -101,6 +85,7 @@ def salidas():
 # ====== Crear nuevo registro (entradas/salidas) ======
 @bp.route("/nuevo/<string:tipo>", methods=["GET", "POST"])
 @login_required
+@limite_subida(MAX_FILE_MB)
 def nuevo(tipo):
     if tipo not in ("entrada", "salida"):
         abort(404)
@@ -117,19 +102,14 @@ def nuevo(tipo):
             flash("Debes seleccionar un archivo.", "warning")
             return render_template("documentos/nuevo.html", form=form, tipo=tipo)
 
-        filename = secure_filename(file.filename)
-        if not allowed_file(filename):
+        tipo_archivo = tipo_real(file)
+        if tipo_archivo not in TIPOS_PERMITIDOS:
             flash("Tipo de archivo no permitido. Solo PDF, JPG o PNG.", "danger")
             return render_template("documentos/nuevo.html", form=form, tipo=tipo)
+        filename = nombre_seguro(file, tipo_archivo)
 
-        file.seek(0, os.SEEK_END)
-        size_mb = file.tell() / (1024 * 1024)
-        file.seek(0)
-        if size_mb > MAX_FILE_MB:
-            flash(f"El archivo supera {MAX_FILE_MB} MB.", "danger")
-            return render_template("documentos/nuevo.html", form=form, tipo=tipo)
-
-        # Crear registro
+        # Guardar archivo (almacén por contenido) y crear registro
+        sha = storage.guardar(file)
         doc = Documento(
             numero_referencia=form.numero_referencia.data.strip(),
             tipo=tipo,
@@ -141,17 +121,13 @@ def nuevo(tipo):
             observaciones=(form.observaciones.data or "").strip(),
             filename=filename,
             version=1,
-            created_by=current_user,
+            sha256=sha,
+            created_by_id=current_user.id,
         )
         db.session.add(doc)
+        encolar_miniatura(sha)
         db.session.commit()
 
-        # Guardar archivo físico
-        updir = ensure_upload_dir()
-        ext = os.path.splitext(filename)[1].lower()
-        target = os.path.join(updir, f"{doc.numero_referencia}_v1{ext}")
-        file.save(target)
-
         flash("Registro guardado correctamente.", "success")
         return redirect(url_for("documentos.entradas" if tipo == "entrada" else "documentos.salidas"))
 
@@ -169,6 +145,7 @@ def detalle(doc_id):
 # ====== Editar ======
 @bp.route("/editar/<int:doc_id>", methods=["GET", "POST"])
 @login_required
+@limite_subida(MAX_FILE_MB)
 def editar(doc_id):
     doc = db.session.get(Documento, doc_id) or abort(404)
     form = EntradaForm() if doc.tipo == "entrada" else SalidaForm()
@@ -189,25 +166,17 @@ def editar(doc_id):
     if form.validate_on_submit():
         file = request.files.get("archivo")
         if file and file.filename:
-            filename = secure_filename(file.filename)
-            if not allowed_file(filename):
+            tipo_archivo = tipo_real(file)
+            if tipo_archivo not in TIPOS_PERMITIDOS:
                 flash("Tipo de archivo no permitido.", "danger")
                 return render_template("documentos/nuevo.html", form=form, tipo=doc.tipo)
-
-            file.seek(0, os.SEEK_END)
-            size_mb = file.tell() / (1024 * 1024)
-            file.seek(0)
-            if size_mb > MAX_FILE_MB:
-                flash(f"El archivo supera {MAX_FILE_MB}MB.", "danger")
-                return render_template("documentos/nuevo.html", form=form, tipo=doc.tipo)
+            filename = nombre_seguro(file, tipo_archivo)
 
             # Nueva versión
             doc.version += 1
             doc.filename = filename
-            updir = ensure_upload_dir()
-            ext = os.path.splitext(filename)[1].lower()
-            target = os.path.join(updir, f"{doc.numero_referencia}_v{doc.version}{ext}")
-            file.save(target)
+            doc.sha256 = storage.guardar(file)
+            encolar_miniatura(doc.sha256)
 
         # Actualizar datos
         doc.fecha = form.fecha_recepcion.data if doc.tipo == "entrada" else form.fecha_despacho.data
@@ -227,9 +196,8 @@ def editar(doc_id):
 # ====== Eliminar (solo admin) ======
 @bp.route("/eliminar/<int:doc_id>", methods=["POST"])
 @login_required
+@requiere_permiso("administrar")
 def eliminar(doc_id):
-    if "Administrador" not in {r.nombre for r in current_user.roles}:
-        abort(403)
     doc = db.session.get(Documento, doc_id) or abort(404)
     db.session.delete(doc)
     db.session.commit()
@@ -245,7 +213,14 @@ def ver_archivo(doc_id):
     path = doc.file_path
     if not os.path.isfile(path):
         abort(404)
-    return send_file(path, as_attachment=False)
+    return enviar_archivo(path, doc.filename, etag=doc.sha256)
+
+
+@bp.route("/miniatura/<int:doc_id>")
+@login_required
+def miniatura(doc_id):
+    doc = db.session.get(Documento, doc_id) or abort(404)
+    return responder_miniatura(doc.sha256)
 
 
 @bp.route("/descargar/<int:doc_id>")
@@ -255,15 +230,17 @@ def descargar(doc_id):
     path = doc.file_path
     if not os.path.isfile(path):
         abort(404)
-    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
+    ext = os.path.splitext(doc.filename)[1].lower()
+    return enviar_archivo(path, f"{doc.numero_referencia}_v{doc.version}{ext}", as_attachment=True, etag=doc.sha256)
 
 
 # ====== Estadísticas ======
 @bp.route("/estadisticas")
 @login_required
 def estadisticas():
-    total_entradas = db.session.query(Documento).filter_by(tipo="entrada").count()
-    total_salidas = db.session.query(Documento).filter_by(tipo="salida").count()
+    totales = totales_por_tipo()
+    total_entradas = totales.get("entrada", 0)
+    total_salidas = totales.get("salida", 0)
     return render_template(
         "documentos/estadisticas.html",
         total_entradas=total_entradas,
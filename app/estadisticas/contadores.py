@@ -0,0 +1,192 @@
+"""
+Mantenimiento incremental de la tabla stats_counters.
+
+Cada modelo observado define qué contadores aporta una fila (`_aporte_*`).
+Los listeners de mapper restan el aporte de los valores anteriores y suman el
+de los nuevos dentro de la misma transacción del flush, de modo que los
+contadores nunca quedan por delante ni por detrás de los datos confirmados.
+
+`flask stats-rebuild` recalcula todos los contadores desde cero, con las
+mismas funciones de aporte, por si alguna escritura masiva (p.ej. un
+`query.delete()`) se salta los eventos del ORM.
+"""
+from collections import defaultdict
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, and_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.extensions import db
+from app.matriculas.models import Matricula
+from app.trabajos.cola import tarea
+from app.pagos.models import Pago, ESTADO_PAGO_VALIDADO
+from app.cursos.models import Curso
+from .models import (
+    StatCounter, CLAVE_CONTADOR,
+    METRICA_MATRICULAS, METRICA_MATRICULAS_COSTE, METRICA_MATRICULAS_DIA,
+    METRICA_PAGOS, METRICA_COBRADO_DIA, METRICA_CURSOS,
+)
+
+# Atributos de cada modelo que influyen en sus contadores
+CAMPOS_MATRICULA = ("campus", "curso_id", "estado", "created_at", "coste_total")
+CAMPOS_PAGO = ("estado", "fecha_pago", "monto", "es_pago_inicial")
+CAMPOS_CURSO = ("estado",)
+
+
+def _mes(valor) -> str:
+    return valor.strftime("%Y-%m") if valor else ""
+
+
+def _dia(valor) -> str:
+    return valor.strftime("%Y-%m-%d") if valor else ""
+
+
+def _clave(metrica, campus="", curso_id=0, estado="", periodo=""):
+    return (metrica, campus or "", curso_id or 0, estado or "", periodo)
+
+
+# ----------------- Aportes por fila -----------------
+def _aporte_matricula(v):
+    clave = dict(campus=v["campus"], curso_id=v["curso_id"], estado=v["estado"], periodo=_mes(v["created_at"]))
+    return [
+        (_clave(METRICA_MATRICULAS, **clave), 1),
+        (_clave(METRICA_MATRICULAS_COSTE, **clave), v["coste_total"] or 0),
+        (_clave(METRICA_MATRICULAS_DIA, periodo=_dia(v["created_at"])), 1),
+    ]
+
+
+def _aporte_pago(v):
+    aporte = [(_clave(METRICA_PAGOS, estado=v["estado"], periodo=_mes(v["fecha_pago"])), 1)]
+    if v["estado"] == ESTADO_PAGO_VALIDADO or v["es_pago_inicial"]:
+        aporte.append((_clave(METRICA_COBRADO_DIA, periodo=_dia(v["fecha_pago"])), v["monto"] or 0))
+    return aporte
+
+
+def _aporte_curso(v):
+    return [(_clave(METRICA_CURSOS, estado=v["estado"]), 1)]
+
+
+OBSERVADOS = (
+    (Matricula, CAMPOS_MATRICULA, _aporte_matricula),
+    (Pago, CAMPOS_PAGO, _aporte_pago),
+    (Curso, CAMPOS_CURSO, _aporte_curso),
+)
+
+
+# ----------------- Escritura de deltas -----------------
+def _acumular(deltas, aporte, signo):
+    for clave, valor in aporte:
+        deltas[clave] += signo * valor
+
+
+def _aplicar(connection, deltas):
+    """Suma cada delta a su contador (upsert atómico en SQLite/PostgreSQL)."""
+    tabla = StatCounter.__table__
+    dialecto = {"postgresql": postgresql, "sqlite": sqlite}.get(connection.dialect.name)
+
+    for clave, delta in deltas.items():
+        if not delta:
+            continue
+        valores = dict(zip(CLAVE_CONTADOR, clave))
+
+        if dialecto is not None:
+            stmt = dialecto.insert(tabla).values(valor=delta, **valores)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(CLAVE_CONTADOR),
+                set_={"valor": tabla.c.valor + delta},
+            )
+            connection.execute(stmt)
+            continue
+
+        res = connection.execute(
+            tabla.update()
+            .where(and_(*[tabla.c[k] == v for k, v in valores.items()]))
+            .values(valor=tabla.c.valor + delta)
+        )
+        if res.rowcount == 0:
+            connection.execute(tabla.insert().values(valor=delta, **valores))
+
+
+def _valores_actuales(target, campos):
+    return {c: getattr(target, c) for c in campos}
+
+
+def _valores_anteriores(target, campos):
+    """Valores previos al flush según el historial de atributos del ORM."""
+    estado = inspect(target)
+    previos = {}
+    for c in campos:
+        hist = estado.attrs[c].history
+        if hist.deleted:
+            previos[c] = hist.deleted[0]
+        elif hist.unchanged:
+            previos[c] = hist.unchanged[0]
+        else:
+            previos[c] = getattr(target, c)
+    return previos
+
+
+def _registrar(modelo, campos, aporte):
+    @event.listens_for(modelo, "after_insert")
+    def _insert(mapper, connection, target):
+        deltas = defaultdict(float)
+        _acumular(deltas, aporte(_valores_actuales(target, campos)), +1)
+        _aplicar(connection, deltas)
+
+    @event.listens_for(modelo, "after_delete")
+    def _delete(mapper, connection, target):
+        deltas = defaultdict(float)
+        _acumular(deltas, aporte(_valores_anteriores(target, campos)), -1)
+        _aplicar(connection, deltas)
+
+    @event.listens_for(modelo, "after_update")
+    def _update(mapper, connection, target):
+        estado = inspect(target)
+        if not any(estado.attrs[c].history.has_changes() for c in campos):
+            return
+        deltas = defaultdict(float)
+        _acumular(deltas, aporte(_valores_anteriores(target, campos)), -1)
+        _acumular(deltas, aporte(_valores_actuales(target, campos)), +1)
+        _aplicar(connection, deltas)
+
+    # active_history: al asignar un atributo expirado el ORM carga antes su
+    # valor anterior, para poder restar el aporte correcto en after_update.
+    for c in campos:
+        event.listen(getattr(modelo, c), "set", lambda *a: None, active_history=True)
+
+
+for _modelo, _campos, _aporte in OBSERVADOS:
+    _registrar(_modelo, _campos, _aporte)
+
+
+# ----------------- Recalculo completo -----------------
+def reconstruir_contadores():
+    """Borra y recalcula todos los contadores. Devuelve el nº de contadores."""
+    deltas = defaultdict(float)
+    for modelo, campos, aporte in OBSERVADOS:
+        columnas = [getattr(modelo, c) for c in campos]
+        for fila in db.session.query(*columnas).yield_per(1000):
+            _acumular(deltas, aporte(dict(zip(campos, fila))), +1)
+
+    db.session.query(StatCounter).delete()
+    db.session.bulk_insert_mappings(StatCounter, [
+        dict(zip(CLAVE_CONTADOR, clave), valor=valor)
+        for clave, valor in deltas.items() if valor
+    ])
+    db.session.commit()
+    return len(deltas)
+
+
+@tarea("estadisticas.reconstruir_contadores")
+def reconstruir_contadores_tarea():
+    return {"contadores": reconstruir_contadores()}
+
+
+@click.command("stats-rebuild")
+@with_appcontext
+def stats_rebuild():
+    """Recalcula desde cero la tabla stats_counters"""
+    click.echo("⏳ Recalculando contadores de estadísticas...")
+    total = reconstruir_contadores()
+    click.echo(f"✅ {total} contadores recalculados.")
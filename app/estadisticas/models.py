@@ -0,0 +1,38 @@
+from datetime import datetime
+from app.extensions import db
+
+# Métricas materializadas en stats_counters
+METRICA_MATRICULAS = "matriculas"              # nº matrículas por campus/curso/estado/mes de alta
+METRICA_MATRICULAS_COSTE = "matriculas_coste"  # suma de coste_total con la misma clave
+METRICA_MATRICULAS_DIA = "matriculas_dia"      # nº matrículas por día de alta (ventanas móviles)
+METRICA_PAGOS = "pagos"                        # nº pagos por estado/mes de pago
+METRICA_COBRADO_DIA = "cobrado_dia"            # importe cobrado por día de pago
+METRICA_CURSOS = "cursos"                      # nº cursos por estado
+
+# Columnas que forman la clave de un contador (sin NULLs para que UNIQUE funcione)
+CLAVE_CONTADOR = ("metrica", "campus", "curso_id", "estado", "periodo")
+
+
+class StatCounter(db.Model):
+    """
+    Contador agregado mantenido de forma incremental por los listeners de
+    `app.estadisticas.contadores`. `periodo` es 'YYYY-MM' para las métricas
+    mensuales, 'YYYY-MM-DD' para las diarias y '' cuando no aplica.
+    """
+    __tablename__ = "stats_counters"
+    __table_args__ = (
+        db.UniqueConstraint(*CLAVE_CONTADOR, name="uq_stats_counters_clave"),
+        {"extend_existing": True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    metrica = db.Column(db.String(32), nullable=False, index=True)
+    campus = db.Column(db.String(16), nullable=False, default="")
+    curso_id = db.Column(db.Integer, nullable=False, default=0)
+    estado = db.Column(db.String(24), nullable=False, default="")
+    periodo = db.Column(db.String(10), nullable=False, default="")
+    valor = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<StatCounter {self.metrica} {self.campus}/{self.curso_id}/{self.estado}/{self.periodo}={self.valor}>"
@@ -0,0 +1,162 @@
+"""
+Servicios de agregación para el dashboard de estadísticas.
+
+`StatsSnapshot.build()` calcula todas las métricas del panel en un número
+constante de consultas sobre los contadores materializados (stats_counters),
+de modo que ni añadir tarjetas ni el crecimiento de las tablas supone más
+trabajo por petición.
+"""
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, case, true
+from app.extensions import db
+
+from app.matriculas.models import (
+    ESTADO_MAT_VALIDADA, ESTADO_MAT_PENDIENTE, ESTADO_MAT_RECHAZADA,
+    CAMPUS_BATA, CAMPUS_MALABO,
+)
+from app.cursos.models import Curso, ESTADO_VALIDADO, ESTADO_PROGRAMADO
+from app.pagos.models import (
+    ESTADO_PAGO_VALIDADO, ESTADO_PAGO_PENDIENTE, ESTADO_PAGO_RECHAZADO,
+    ESTADO_PAGO_PENDIENTE_VALIDACION,
+)
+from app.usuarios.models import Usuario
+from .models import (
+    StatCounter, METRICA_MATRICULAS, METRICA_MATRICULAS_COSTE, METRICA_MATRICULAS_DIA,
+    METRICA_PAGOS, METRICA_COBRADO_DIA, METRICA_CURSOS,
+)
+
+
+def _contar(condicion):
+    """COUNT condicional: cuenta las filas que cumplen `condicion`."""
+    return func.coalesce(func.sum(case((condicion, 1), else_=0)), 0)
+
+
+def _sumar(columna, condicion):
+    """SUM condicional: suma `columna` en las filas que cumplen `condicion`."""
+    return func.coalesce(func.sum(case((condicion, columna), else_=0)), 0)
+
+
+@dataclass
+class Facturacion:
+    total_esperado: float = 0.0
+    total_pagado: float = 0.0
+    facturacion_mes: float = 0.0
+
+    @property
+    def deuda_total(self) -> float:
+        return self.total_esperado - self.total_pagado
+
+    @property
+    def porcentaje_pagado(self) -> float:
+        if self.total_esperado > 0:
+            return self.total_pagado / self.total_esperado * 100
+        return 0
+
+
+@dataclass
+class StatsSnapshot:
+    """Fotografía de todas las métricas del dashboard en un instante dado."""
+    hoy: date
+    total_estudiantes: int = 0
+    estudiantes_bata: int = 0
+    estudiantes_malabo: int = 0
+    matriculas_pendientes: int = 0
+    matriculas_rechazadas: int = 0
+    nuevas_matriculas: int = 0
+    pagos_pendientes: int = 0
+    pagos_rechazados: int = 0
+    pagos_validados: int = 0
+    pagos_pendientes_validacion: int = 0
+    cursos_activos: int = 0
+    total_usuarios: int = 0
+    usuarios_activos: int = 0
+    estudiantes_por_curso: List[Tuple[str, int]] = field(default_factory=list)
+    facturacion: Optional[Facturacion] = None
+
+    @property
+    def hace_7_dias(self) -> date:
+        return self.hoy - timedelta(days=7)
+
+    @property
+    def hace_30_dias(self) -> date:
+        return self.hoy - timedelta(days=30)
+
+    @classmethod
+    def build(cls, hoy: date = None, incluir_facturacion: bool = False) -> "StatsSnapshot":
+        """
+        Calcula la fotografía completa a partir de stats_counters, con dos
+        consultas cuyo coste depende del nº de contadores y no de filas:
+        1. Una fila con todos los totales (agregación condicional).
+        2. El desglose de matrículas validadas por curso.
+        """
+        snap = cls(hoy=hoy or date.today())
+
+        c = StatCounter
+        mat = (c.metrica == METRICA_MATRICULAS)
+        validada = mat & (c.estado == ESTADO_MAT_VALIDADA)
+        pagos = (c.metrica == METRICA_PAGOS)
+        cobrado = (c.metrica == METRICA_COBRADO_DIA)
+
+        cnt = db.session.query(
+            _sumar(c.valor, validada).label("total_estudiantes"),
+            _sumar(c.valor, validada & (c.campus == CAMPUS_BATA)).label("estudiantes_bata"),
+            _sumar(c.valor, validada & (c.campus == CAMPUS_MALABO)).label("estudiantes_malabo"),
+            _sumar(c.valor, mat & (c.estado == ESTADO_MAT_PENDIENTE)).label("matriculas_pendientes"),
+            _sumar(c.valor, mat & (c.estado == ESTADO_MAT_RECHAZADA)).label("matriculas_rechazadas"),
+            _sumar(c.valor, (c.metrica == METRICA_MATRICULAS_DIA)
+                   & (c.periodo >= snap.hace_7_dias.isoformat())).label("nuevas_matriculas"),
+            _sumar(c.valor, (c.metrica == METRICA_MATRICULAS_COSTE)
+                   & (c.estado == ESTADO_MAT_VALIDADA)).label("total_esperado"),
+            _sumar(c.valor, pagos & (c.estado == ESTADO_PAGO_PENDIENTE)).label("pagos_pendientes"),
+            _sumar(c.valor, pagos & (c.estado == ESTADO_PAGO_RECHAZADO)).label("pagos_rechazados"),
+            _sumar(c.valor, pagos & (c.estado == ESTADO_PAGO_VALIDADO)).label("pagos_validados"),
+            _sumar(c.valor, pagos & (c.estado == ESTADO_PAGO_PENDIENTE_VALIDACION)).label("pagos_pendientes_validacion"),
+            _sumar(c.valor, cobrado).label("total_pagado"),
+            _sumar(c.valor, cobrado & (c.periodo >= snap.hace_30_dias.isoformat())).label("facturacion_mes"),
+            _sumar(c.valor, (c.metrica == METRICA_CURSOS)
+                   & c.estado.in_([ESTADO_VALIDADO, ESTADO_PROGRAMADO])).label("cursos_activos"),
+        ).subquery("cnt")
+
+        usr = db.session.query(
+            func.count(Usuario.id).label("total_usuarios"),
+            _contar(Usuario.activo == True).label("usuarios_activos"),  # noqa: E712
+        ).subquery("usr")
+
+        fila = (
+            db.session.query(cnt, usr)
+            .select_from(cnt)
+            .join(usr, true())
+            .one()
+        )._asdict()
+
+        for nombre in (
+            "total_estudiantes", "estudiantes_bata", "estudiantes_malabo",
+            "matriculas_pendientes", "matriculas_rechazadas", "nuevas_matriculas",
+            "pagos_pendientes", "pagos_rechazados", "pagos_validados",
+            "pagos_pendientes_validacion", "cursos_activos",
+            "total_usuarios", "usuarios_activos",
+        ):
+            setattr(snap, nombre, int(fila[nombre] or 0))
+
+        if incluir_facturacion:
+            snap.facturacion = Facturacion(
+                total_esperado=float(fila["total_esperado"] or 0),
+                total_pagado=float(fila["total_pagado"] or 0),
+                facturacion_mes=float(fila["facturacion_mes"] or 0),
+            )
+
+        total = func.sum(c.valor)
+        snap.estudiantes_por_curso = [
+            (nombre, int(total_curso))
+            for nombre, total_curso in db.session.query(Curso.nombre, total.label("total"))
+            .join(c, c.curso_id == Curso.id)
+            .filter(validada)
+            .group_by(Curso.nombre)
+            .having(total > 0)
+            .order_by(total.desc())
+            .all()
+        ]
+        return snap
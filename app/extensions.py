@@ -2,8 +2,16 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
+from .cache import Cache
+from .perf import Perf
+from .storage import Storage
+from .auditoria import Auditoria
 
 db = SQLAlchemy()
 migrate = Migrate()
 login_manager = LoginManager()
-csrf = CSRFProtect()
\ No newline at end of file
+csrf = CSRFProtect()
+cache = Cache()
+perf = Perf()
+storage = Storage()
+auditoria = Auditoria()
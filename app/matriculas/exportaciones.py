@@ -0,0 +1,246 @@
+"""
+exportaciones.py
+Exportación masiva de documentos de matrícula (por curso, campus y/o rango
+de fechas) a un único ZIP, generado fuera de la petición por la cola de trabajos.
+
+- Los documentos salen de UNA consulta (MatriculaDocumento ⋈ Matricula ⋈ Curso),
+  ordenada por id para que el orden sea estable entre reintentos.
+- El ZIP se escribe con ZipStream en `instance/exports/<id>.zip.part` con
+  memoria constante; al terminar se renombra a `exportacion_<id>.zip`.
+- Cada pocas entradas se guarda un punto de control (`.part.json`) con los
+  CRC, tamaños y offsets ya escritos: si el proceso muere, la exportación se
+  reanuda desde la última entrada completa en vez de empezar de cero.
+- Se ejecuta como trabajo de la cola (app/trabajos): si falla, la cola lo
+  reintenta y el reintento continúa desde el último punto de control.
+- La descarga se sirve con enviar_archivo (Range o X-Accel: descargas reanudables).
+"""
+import json
+import os
+from datetime import datetime, date, time as dtime, timedelta
+from typing import Optional
+
+from flask import current_app
+from sqlalchemy import select
+
+from app.extensions import db, storage
+from app.zipstream import ZipStream
+from app.trabajos.cola import tarea, encolar
+from app.trabajos.models import ESTADO_TRABAJO_PENDIENTE, ESTADO_TRABAJO_EN_CURSO
+from app.cursos.models import Curso
+from .models import (
+    Matricula, MatriculaDocumento, ExportacionDocumentos,
+    ESTADO_EXP_EN_CURSO, ESTADO_EXP_COMPLETADA, ESTADO_EXP_ERROR,
+)
+
+# Cada cuántas entradas se guarda el progreso (BD) y el punto de control (disco)
+CADA_N_ENTRADAS = 25
+
+
+def directorio_exportaciones() -> str:
+    ruta = os.path.join(current_app.instance_path, "exports")
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def ruta_final(exp: ExportacionDocumentos) -> str:
+    return os.path.join(directorio_exportaciones(), exp.nombre_archivo)
+
+
+def _ruta_parcial(exp: ExportacionDocumentos) -> str:
+    return ruta_final(exp) + ".part"
+
+
+def _ruta_control(exp: ExportacionDocumentos) -> str:
+    return _ruta_parcial(exp) + ".json"
+
+
+def _fecha(valor) -> Optional[date]:
+    if not valor:
+        return None
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor))
+
+
+def _segmento(texto) -> str:
+    """Nombre seguro para una carpeta dentro del ZIP."""
+    limpio = "".join(c if c.isalnum() or c in " -_.()" else "_" for c in str(texto or "")).strip(" .")
+    return limpio or "sin_nombre"
+
+
+# ----------------- Consulta -----------------
+def consulta_documentos(filtros: dict):
+    """SELECT único de (documento, matrícula, curso) según los filtros de la exportación."""
+    q = (
+        select(
+            MatriculaDocumento.id, MatriculaDocumento.filename, MatriculaDocumento.path, MatriculaDocumento.sha256,
+            Matricula.id.label("matricula_id"), Matricula.estudiante_nombre, Matricula.campus,
+            Curso.nombre.label("curso_nombre"),
+        )
+        .join(Matricula, MatriculaDocumento.matricula_id == Matricula.id)
+        .join(Curso, Matricula.curso_id == Curso.id)
+        .order_by(MatriculaDocumento.id)
+    )
+    if filtros.get("curso_id"):
+        q = q.where(Matricula.curso_id == int(filtros["curso_id"]))
+    if filtros.get("campus"):
+        q = q.where(Matricula.campus == filtros["campus"])
+    desde, hasta = _fecha(filtros.get("desde")), _fecha(filtros.get("hasta"))
+    if desde:
+        q = q.where(Matricula.created_at >= datetime.combine(desde, dtime.min))
+    if hasta:
+        q = q.where(Matricula.created_at < datetime.combine(hasta + timedelta(days=1), dtime.min))
+    return q
+
+
+def describir(filtros: dict) -> str:
+    partes = []
+    if filtros.get("curso_id"):
+        curso = db.session.get(Curso, int(filtros["curso_id"]))
+        partes.append(f"Curso: {curso.nombre if curso else filtros['curso_id']}")
+    if filtros.get("campus"):
+        partes.append(f"Campus: {filtros['campus']}")
+    if filtros.get("desde") or filtros.get("hasta"):
+        partes.append(f"Fechas: {filtros.get('desde') or '…'} – {filtros.get('hasta') or '…'}")
+    return " · ".join(partes) or "Todas las matrículas"
+
+
+def _construir_zip(filtros: dict) -> ZipStream:
+    z = ZipStream()
+    for fila in db.session.execute(consulta_documentos(filtros)):
+        carpeta = f"{_segmento(fila.campus)}/{_segmento(fila.curso_nombre)}/" \
+                  f"{fila.matricula_id}_{_segmento(fila.estudiante_nombre)}"
+        ruta = storage.ruta_local(fila.sha256) if fila.sha256 else fila.path
+        if ruta:
+            z.agregar(ruta, f"{carpeta}/{fila.filename}")
+    return z
+
+
+# ----------------- Punto de control -----------------
+def _guardar_control(ruta: str, entradas, offset: int):
+    datos = {
+        "offset": offset,
+        "entradas": [
+            {"nombre": e.nombre, "crc": e.crc, "tamano": e.tamano,
+             "tamano_comprimido": e.tamano_comprimido, "offset": e.offset}
+            for e in entradas
+        ],
+    }
+    tmp = ruta + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(datos, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+
+
+def _cargar_control(ruta: str, z: ZipStream):
+    """
+    Aplica el punto de control a las entradas de `z`.
+    Devuelve (nº de entradas ya escritas, offset) o (0, 0) si no sirve.
+    """
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+    except (OSError, ValueError):
+        return 0, 0
+    hechas = datos.get("entradas", [])
+    # Si la lista de documentos cambió, no se puede reanudar a ciegas
+    if len(hechas) > len(z.entradas) or any(
+        h["nombre"] != e.nombre for h, e in zip(hechas, z.entradas)
+    ):
+        return 0, 0
+    for h, e in zip(hechas, z.entradas):
+        e.crc, e.tamano, e.tamano_comprimido, e.offset = (
+            h["crc"], h["tamano"], h["tamano_comprimido"], h["offset"]
+        )
+    return len(hechas), int(datos.get("offset", 0))
+
+
+def _limpiar(*rutas):
+    for ruta in rutas:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+# ----------------- Ejecución -----------------
+def ejecutar_exportacion(exportacion_id: int) -> ExportacionDocumentos:
+    """Genera (o reanuda) el ZIP de una exportación. Pensado para correr fuera de la petición."""
+    exp = db.session.get(ExportacionDocumentos, exportacion_id)
+    if exp is None or exp.estado == ESTADO_EXP_COMPLETADA:
+        return exp
+
+    parcial, control = _ruta_parcial(exp), _ruta_control(exp)
+    z = _construir_zip(exp.filtros or {})
+    exp.estado = ESTADO_EXP_EN_CURSO
+    exp.total = len(z.entradas)
+    exp.error = None
+
+    desde, offset = _cargar_control(control, z) if os.path.exists(parcial) else (0, 0)
+    exp.procesados = desde
+    exp.bytes_escritos = offset
+    db.session.commit()
+
+    def al_completar(i, entrada, offset_actual):
+        n = i + 1
+        if n % CADA_N_ENTRADAS == 0 or n == len(z.entradas):
+            f.flush()
+            os.fsync(f.fileno())
+            _guardar_control(control, z.entradas[:n], offset_actual)
+            exp.procesados = n
+            exp.bytes_escritos = offset_actual
+            db.session.commit()
+
+    try:
+        with open(parcial, "r+b" if desde else "wb") as f:
+            f.truncate(offset)  # descarta una entrada que quedara a medias
+            f.seek(offset)
+            tamano = z.escribir(f, desde=desde, offset=offset, al_completar=al_completar)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(parcial, ruta_final(exp))
+        _limpiar(control)
+    except Exception as e:
+        db.session.rollback()
+        exp = db.session.get(ExportacionDocumentos, exportacion_id)
+        exp.estado = ESTADO_EXP_ERROR
+        exp.error = f"{type(e).__name__}: {e}"
+        db.session.commit()
+        current_app.logger.warning("Exportación %s fallida: %s", exportacion_id, exp.error)
+        return exp
+
+    exp.estado = ESTADO_EXP_COMPLETADA
+    exp.procesados = exp.total
+    exp.bytes_escritos = tamano
+    exp.finalizado_en = datetime.utcnow()
+    db.session.commit()
+    return exp
+
+
+@tarea("matriculas.exportar_documentos")
+def exportar_documentos(exportacion_id: int):
+    exp = ejecutar_exportacion(exportacion_id)
+    if exp is None:
+        return None
+    if exp.estado == ESTADO_EXP_ERROR:
+        # Que la cola lo reintente: el reintento continúa desde el punto de control
+        raise RuntimeError(exp.error)
+    return {"documentos": exp.total, "bytes": exp.bytes_escritos}
+
+
+def encolar_exportacion(exp: ExportacionDocumentos, creado_por_id: Optional[int] = None):
+    """Encola la (re)ejecución de una exportación. El llamador hace commit."""
+    trabajo = encolar("matriculas.exportar_documentos", exportacion_id=exp.id, creado_por_id=creado_por_id)
+    exp.trabajo_id = trabajo.id
+    return trabajo
+
+
+def en_cola(exp: ExportacionDocumentos) -> bool:
+    """True si la exportación tiene un trabajo pendiente o en curso (no se debe lanzar otro)."""
+    return exp.trabajo is not None and exp.trabajo.estado in (ESTADO_TRABAJO_PENDIENTE, ESTADO_TRABAJO_EN_CURSO)
+
+
+def eliminar_archivos(exp: ExportacionDocumentos):
+    _limpiar(ruta_final(exp), _ruta_parcial(exp), _ruta_control(exp))
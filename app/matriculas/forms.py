@@ -11,7 +11,8 @@ from wtforms import (
     IntegerField
 )
 from wtforms.validators import DataRequired, Optional, Length, NumberRange
-from flask_wtf.file import FileField, FileAllowed, FileRequired
+from flask_wtf.file import FileField, FileRequired
+from app.storage.subidas import ContenidoPermitido
 
 # -------------------------------------------------------------------
 # OPCIONES DE CAMPUS
@@ -73,7 +74,7 @@ class MatriculaBaseForm(FlaskForm):
         "Expediente Académico (PDF)",
         validators=[
             FileRequired(message="Debe adjuntar el expediente académico."),
-            FileAllowed(["pdf"], "Solo se permiten archivos PDF.")
+            ContenidoPermitido(["pdf"], "Solo se permiten archivos PDF.")
         ],
     )
 
@@ -81,7 +82,7 @@ class MatriculaBaseForm(FlaskForm):
         "Factura del Primer Pago (PDF)",
         validators=[
             FileRequired(message="Debe adjuntar la factura del primer pago."),
-            FileAllowed(["pdf"], "Solo se permiten archivos PDF.")
+            ContenidoPermitido(["pdf"], "Solo se permiten archivos PDF.")
         ],
     )
 
@@ -128,7 +129,8 @@ from wtforms import (
     SubmitField, HiddenField, FloatField, IntegerField
 )
 from wtforms.validators import DataRequired, Optional, Length, NumberRange
-from flask_wtf.file import FileField, FileAllowed, FileRequired
+from flask_wtf.file import FileField, FileRequired
+from app.storage.subidas import ContenidoPermitido
 
 class MatriculaBaseForm(FlaskForm):
     """Formulario base de matrícula (datos personales + documentos requeridos)"""
@@ -164,7 +166,7 @@ class MatriculaBaseForm(FlaskForm):
         "Expediente Académico (PDF)",
         validators=[
             FileRequired(message="Debe adjuntar el expediente académico."),
-            FileAllowed(["pdf"], "Solo se permiten archivos PDF.")
+            ContenidoPermitido(["pdf"], "Solo se permiten archivos PDF.")
         ],
     )
 
@@ -172,7 +174,7 @@ class MatriculaBaseForm(FlaskForm):
         "Factura del Primer Pago (PDF)",
         validators=[
             FileRequired(message="Debe adjuntar la factura del primer pago."),
-            FileAllowed(["pdf"], "Solo se permiten archivos PDF.")
+            ContenidoPermitido(["pdf"], "Solo se permiten archivos PDF.")
         ],
     )
 
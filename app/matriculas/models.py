@@ -27,6 +27,8 @@ class Matricula(db.Model):
     # Datos básicos del alumno
     estudiante_nombre = db.Column(db.String(150), nullable=False)
     doc_identidad = db.Column(db.String(64), nullable=True, index=True)
+    # Expediente al que pertenece (app/actas_expedientes/models.py lo asigna al guardar)
+    estudiante_id = db.Column(db.Integer, db.ForeignKey("estudiantes.id", ondelete="SET NULL"), nullable=True, index=True)
     telefono = db.Column(db.String(32), nullable=True)
     email = db.Column(db.String(120), nullable=True)
     direccion = db.Column(db.String(200), nullable=True)
@@ -44,6 +46,11 @@ class Matricula(db.Model):
     # ✅ NUEVO CAMPO: Monto del pago inicial
     monto_inicial = db.Column(db.Float, nullable=False, default=0.0)
 
+    # Saldo desnormalizado: lo mantiene app/pagos/ledger.py en cada flush que toca pagos
+    total_pagado = db.Column(db.Float, nullable=False, default=0.0, server_default="0")
+    deuda_actual = db.Column(db.Float, nullable=False, default=0.0, server_default="0", index=True)
+    cuotas_pendientes = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
     # Auditoría
     created_by_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -51,9 +58,10 @@ class Matricula(db.Model):
 
     # Relaciones
     curso = db.relationship("Curso", backref=db.backref("matriculas", lazy="dynamic"))
-    documentos = db.relationship("MatriculaDocumento", cascade="all, delete-orphan", lazy="dynamic")
+    documentos = db.relationship("MatriculaDocumento", cascade="all, delete-orphan")
     asignaturas = db.relationship("MatriculaAsignatura", back_populates="matricula", cascade="all, delete-orphan")
     pagos = db.relationship("Pago", back_populates="matricula", cascade="all, delete-orphan")
+    estudiante = db.relationship("Estudiante", back_populates="matriculas")
 
     def __repr__(self):
         return f"<Matricula {self.estudiante_nombre} ({self.campus})>"
@@ -67,7 +75,15 @@ class MatriculaDocumento(db.Model):
     matricula_id = db.Column(db.Integer, db.ForeignKey("matriculas.id"), nullable=False)
     tipo = db.Column(db.String(50), nullable=False)  # 'EXPEDIENTE_ACADEMICO' o 'FACTURA_PRIMER_PAGO'
     filename = db.Column(db.String(200), nullable=False)
-    path = db.Column(db.String(300), nullable=False)
+    path = db.Column(db.String(300), nullable=True)  # ficheros anteriores al almacén por contenido
+    sha256 = db.Column(db.String(64), nullable=True, index=True)  # ver app/storage
+
+    @property
+    def ruta_archivo(self):
+        if self.sha256:
+            from app.extensions import storage
+            return storage.ruta_local(self.sha256)
+        return self.path
 
 
 class MatriculaAsignatura(db.Model):
@@ -151,3 +167,49 @@ class Calificacion(db.Model):
 
 
 
+
+
+# ----------------- Exportaciones masivas de documentos -----------------
+ESTADO_EXP_PENDIENTE = "PENDIENTE"
+ESTADO_EXP_EN_CURSO = "EN_CURSO"
+ESTADO_EXP_COMPLETADA = "COMPLETADA"
+ESTADO_EXP_ERROR = "ERROR"
+
+
+class ExportacionDocumentos(db.Model):
+    """ZIP con los documentos de varias matrículas (curso, campus y/o fechas), generado en segundo plano."""
+    __tablename__ = "exportaciones_documentos"
+
+    id = db.Column(db.Integer, primary_key=True)
+    creado_por_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=True)
+    creado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finalizado_en = db.Column(db.DateTime, nullable=True)
+
+    # {"curso_id": int|None, "campus": str|None, "desde": "YYYY-MM-DD"|None, "hasta": ...}
+    filtros = db.Column(db.JSON, nullable=False, default=dict)
+    descripcion = db.Column(db.String(200), nullable=False, default="")
+
+    estado = db.Column(db.String(20), nullable=False, default=ESTADO_EXP_PENDIENTE, index=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    procesados = db.Column(db.Integer, nullable=False, default=0)
+    bytes_escritos = db.Column(db.BigInteger, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    # Último trabajo de la cola que la ejecuta (app/trabajos)
+    trabajo_id = db.Column(db.Integer, db.ForeignKey("trabajos.id", ondelete="SET NULL"), nullable=True)
+
+    creado_por = db.relationship("Usuario")
+    trabajo = db.relationship("Trabajo")
+
+    @property
+    def progreso(self) -> int:
+        if self.estado == ESTADO_EXP_COMPLETADA:
+            return 100
+        return int(self.procesados * 100 / self.total) if self.total else 0
+
+    @property
+    def nombre_archivo(self) -> str:
+        return f"exportacion_{self.id}.zip"
+
+    def __repr__(self):
+        return f"<ExportacionDocumentos {self.id} {self.estado}>"
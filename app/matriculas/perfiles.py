@@ -0,0 +1,67 @@
+"""
+perfiles.py
+Perfiles de carga con nombre para las consultas de matrículas.
+
+Cada vista pide el perfil que corresponde a lo que su plantilla recorre, de
+forma que las relaciones se cargan en un nº fijo de consultas (JOIN para las
+many-to-one, SELECT ... IN para las colecciones) y no una por fila.
+
+    Matricula.query.options(*opciones("lista"))
+    Pago.query.options(*opciones("validacion", via=Pago.matricula))
+"""
+from sqlalchemy.orm import joinedload, selectinload, raiseload
+
+from .models import Matricula, MatriculaAsignatura
+
+# Las opciones se construyen al pedirlas: acceder a Matricula.pagos en la
+# importación forzaría la configuración de los mappers antes de que existan
+# todos los modelos.
+def _curso():
+    return joinedload(Matricula.curso)
+
+
+def _documentos():
+    return selectinload(Matricula.documentos)
+
+
+def _pagos():
+    return selectinload(Matricula.pagos)
+
+
+def _asignaturas():
+    return selectinload(Matricula.asignaturas).joinedload(MatriculaAsignatura.modulo)
+
+
+def _sin_relaciones():
+    return raiseload("*")
+
+
+PERFILES = {
+    # Filas de las tablas por curso (index y "Cargar más")
+    "tabla": (_curso,),
+    # Listado general: curso, nº de documentos y nº de pagos por fila
+    "lista": (_curso, _documentos, _pagos),
+    # Ficha completa de una matrícula
+    "detalle": (_curso, _documentos, _pagos, _asignaturas),
+    # Historial académico (actas y expedientes)
+    "expediente": (_curso, _asignaturas),
+    # Pagos pendientes de validar: la plantilla muestra curso y documentos
+    "validacion": (_curso, _documentos),
+    # Listados que solo usan columnas propias (p.ej. el saldo guardado):
+    # cualquier acceso a una relación lanza error en vez de hacer N+1
+    "saldos": (_sin_relaciones,),
+}
+
+
+def opciones(perfil: str, via=None) -> list:
+    """
+    Opciones de carga del perfil `perfil`. Con `via` (una relación hacia
+    Matricula, p.ej. Pago.matricula) se cargan a través de esa relación.
+    """
+    try:
+        opts = [construir() for construir in PERFILES[perfil]]
+    except KeyError:
+        raise ValueError(f"Perfil de carga desconocido: {perfil!r}") from None
+    if via is None:
+        return opts
+    return [joinedload(via).options(*opts)]
@@ -1,21 +1,28 @@
 # app/matriculas/routes.py
 import os
-import io
-import zipfile
 from datetime import datetime, timedelta
 from flask import (
     render_template, request, redirect, url_for, flash, abort,
-    current_app, send_file
+    make_response, jsonify
 )
 from flask_login import login_required, current_user
 from sqlalchemy import func
-from app.extensions import db
+from app.extensions import db, cache, storage
+from app.storage.subidas import limite_subida
+from app.storage.entrega import enviar_archivo
+from app.storage.miniaturas import encolar_miniatura, responder_miniatura
+from app.paginacion import paginar_keyset, paginar_keyset_request, codificar_cursor
+from app.zipstream import ZipStream
+from app.autorizacion import puede, requiere_permiso
 from app.usuarios.models import Usuario
 from app.cursos.models import Curso, Modulo, CURSO_TIPO_FP, CURSO_TIPO_INTENSIVO, ESTADO_VALIDADO, ESTADO_PROGRAMADO
 from . import bp
+from .perfiles import opciones
+from . import exportaciones
 from .models import (
-    Matricula, MatriculaDocumento, MatriculaAsignatura,
-    ESTADO_MAT_PENDIENTE, ESTADO_MAT_VALIDADA, ESTADO_MAT_RECHAZADA,
+    Matricula, MatriculaDocumento, MatriculaAsignatura, ExportacionDocumentos,
+    ESTADO_EXP_PENDIENTE, ESTADO_EXP_EN_CURSO, ESTADO_EXP_COMPLETADA, ESTADO_EXP_ERROR,
+    CAMPUS_BATA, CAMPUS_MALABO, ESTADO_MAT_PENDIENTE, ESTADO_MAT_VALIDADA, ESTADO_MAT_RECHAZADA,
     TIPO_FP_PRIMERO, TIPO_FP_SEGUNDO
 )
 from .forms import (
@@ -32,32 +39,23 @@ from app.pagos.models import (
     ESTADO_PAGO_PENDIENTE_VALIDACION
 )
 
-# ----------------- Helpers de roles y permisos -----------------
-def es_admin() -> bool:
-    return any(r.nombre == "Administrador" for r in current_user.roles)
-
-def es_administrativo() -> bool:
-    return any(r.nombre == "Administrativo" for r in current_user.roles)
-
-def es_supervisor() -> bool:
-    return any(r.nombre == "Supervisor" for r in current_user.roles)
-
+# ----------------- Helpers de permisos -----------------
 def puede_editar_matricula(m: Matricula) -> bool:
     """Editable solo si está pendiente o rechazada, y el usuario es admin/administrativo"""
-    return m.estado in (ESTADO_MAT_PENDIENTE, ESTADO_MAT_RECHAZADA) and (es_admin() or es_administrativo())
+    return m.estado in (ESTADO_MAT_PENDIENTE, ESTADO_MAT_RECHAZADA) and puede("gestionar")
 
 # ----------------- Funciones auxiliares -----------------
+# Límite por documento adjunto (se aplica mientras se recibe, ver storage/subidas.py)
+MAX_FILE_MB = 20
+
 def _save_if_present(file_storage, tipo: str, matricula_id: int):
-    """Guarda un archivo si está presente"""
+    """Guarda un archivo si está presente (en el almacén por contenido: un duplicado no ocupa más)"""
     if not file_storage or file_storage.filename == "":
         return None
-    upload_dir = os.path.join(current_app.config.get("UPLOAD_FOLDER", "uploads"), "matriculas")
-    os.makedirs(upload_dir, exist_ok=True)
-    fname = f"{matricula_id}_{tipo}_{int(datetime.utcnow().timestamp())}_{file_storage.filename}"
-    path = os.path.join(upload_dir, fname)
-    file_storage.save(path)
-    doc = MatriculaDocumento(matricula_id=matricula_id, tipo=tipo, filename=file_storage.filename, path=path)
+    sha = storage.guardar(file_storage)
+    doc = MatriculaDocumento(matricula_id=matricula_id, tipo=tipo, filename=file_storage.filename, sha256=sha)
     db.session.add(doc)
+    encolar_miniatura(sha)
     # retornamos la instancia (está en la sesión, puede no tener id hasta commit)
     return doc
 
@@ -93,64 +91,71 @@ def _calcular_fechas_vencimiento(fecha_base, numero_cuota):
     return date(year, month, 10)
 
 
+def _totales_por_estado():
+    """Nº de matrículas por estado en una sola consulta (cacheado hasta el próximo commit)."""
+    return cache.get_or_set(
+        "matriculas:totales_por_estado",
+        lambda: dict(db.session.query(Matricula.estado, func.count(Matricula.id)).group_by(Matricula.estado).all()),
+        tags=("matriculas",),
+    )
 
-def calcular_monto_pagado(matricula_id):
-    """Calcula el monto total pagado (pago inicial + cuotas validadas)"""
-    from app.pagos.models import Pago, ESTADO_PAGO_VALIDADO, ESTADO_PAGO_INICIAL
-    
-    pagos = Pago.query.filter_by(matricula_id=matricula_id).all()
-    monto_pagado = 0
-    
-    for pago in pagos:
-        if pago.estado == ESTADO_PAGO_VALIDADO or getattr(pago, "es_pago_inicial", False):
-            monto_pagado += pago.monto
-    
-    return monto_pagado
 
-def calcular_deuda_actual(matricula):
-    """Calcula la deuda actual (costo total - monto pagado)"""
-    monto_pagado = calcular_monto_pagado(matricula.id)
-    return matricula.coste_total - monto_pagado
+def _conteo_por_curso_y_campus():
+    """{curso_id: {"total": n, "BATA": n, "MALABO": n}} en una sola consulta agrupada."""
+    def calcular():
+        conteo = {}
+        filas = (
+            db.session.query(Matricula.curso_id, Matricula.campus, func.count(Matricula.id))
+            .group_by(Matricula.curso_id, Matricula.campus)
+            .all()
+        )
+        for curso_id, campus, n in filas:
+            c = conteo.setdefault(curso_id, {"total": 0})
+            c[campus] = n
+            c["total"] += n
+        return conteo
 
-def redistribuir_cuotas_pendientes(matricula):
-    """Redistribuye el monto de las cuotas pendientes basado en la deuda actual"""
-    from app.pagos.models import Pago, ESTADO_PAGO_PENDIENTE
-    
-    # Obtener cuotas pendientes
-    cuotas_pendientes = Pago.query.filter_by(
-        matricula_id=matricula.id, 
-        estado=ESTADO_PAGO_PENDIENTE
-    ).order_by(Pago.numero_cuota).all()
-    
-    if not cuotas_pendientes:
-        return
-    
-    # Calcular deuda actual
-    deuda_actual = calcular_deuda_actual(matricula)
-    
-    # Recalcular monto por cuota
-    nuevo_monto_cuota = round(deuda_actual / len(cuotas_pendientes), 2)
-    
-    # Ajustar la última cuota por posibles diferencias de redondeo
-    for i, cuota in enumerate(cuotas_pendientes):
-        if i == len(cuotas_pendientes) - 1:
-            # La última cuota lleva el ajuste por redondeo
-            total_asignado = nuevo_monto_cuota * (len(cuotas_pendientes) - 1)
-            cuota.monto = round(deuda_actual - total_asignado, 2)
-        else:
-            cuota.monto = nuevo_monto_cuota
-    
-    db.session.commit()
+    return cache.get_or_set("matriculas:conteo_por_curso_y_campus", calcular, tags=("matriculas",))
+
+
+# Orden de los listados: más recientes primero, desempate por id
+ORDEN_MATRICULAS = (Matricula.created_at.desc().nulls_last(), Matricula.id.desc())
+
+# Nº de matrículas que se muestran de entrada en cada tarjeta de curso
+MATS_POR_CURSO_INICIAL = 10
+
+
+def _primeras_por_curso(curso_ids, limite=MATS_POR_CURSO_INICIAL):
+    """Las `limite` matrículas más recientes de cada curso, en una sola consulta."""
+    if not curso_ids:
+        return {}
+    rn = func.row_number().over(partition_by=Matricula.curso_id, order_by=ORDEN_MATRICULAS).label("rn")
+    sub = (
+        db.session.query(Matricula.id.label("id"), rn)
+        .filter(Matricula.curso_id.in_(curso_ids))
+        .subquery()
+    )
+    mats_por_curso = {}
+    for m in (
+        Matricula.query.options(*opciones("tabla"))
+        .join(sub, sub.c.id == Matricula.id)
+        .filter(sub.c.rn <= limite)
+        .order_by(Matricula.curso_id, sub.c.rn)
+        .all()
+    ):
+        mats_por_curso.setdefault(m.curso_id, []).append(m)
+    return mats_por_curso
 
 
 # ----------------- INDEX GENERAL -----------------
 @bp.route("/")
 @login_required
 def index():
-    total = Matricula.query.count()
-    total_val = Matricula.query.filter_by(estado=ESTADO_MAT_VALIDADA).count()
-    total_pend = Matricula.query.filter_by(estado=ESTADO_MAT_PENDIENTE).count()
-    total_rech = Matricula.query.filter_by(estado=ESTADO_MAT_RECHAZADA).count()
+    totales = _totales_por_estado()
+    total = sum(totales.values())
+    total_val = totales.get(ESTADO_MAT_VALIDADA, 0)
+    total_pend = totales.get(ESTADO_MAT_PENDIENTE, 0)
+    total_rech = totales.get(ESTADO_MAT_RECHAZADA, 0)
 
     cursos_visibles = (
         Curso.query.filter(Curso.estado.in_([ESTADO_VALIDADO, ESTADO_PROGRAMADO]))
@@ -158,14 +163,20 @@ def index():
         .all()
     )
 
-    mats_por_curso = {}
-    for m in Matricula.query.order_by(Matricula.created_at.desc()).all():
-        mats_por_curso.setdefault(m.curso_id, []).append(m)
+    # Solo las primeras matrículas de cada curso; el resto se carga bajo demanda
+    conteo_por_curso = _conteo_por_curso_y_campus()
+    mats_por_curso = _primeras_por_curso([c.id for c in cursos_visibles])
+    siguiente_por_curso = {}
+    for curso_id, mats in mats_por_curso.items():
+        if conteo_por_curso.get(curso_id, {}).get("total", 0) > len(mats):
+            siguiente_por_curso[curso_id] = codificar_cursor(mats[-1].created_at, mats[-1].id)
 
     return render_template(
         "matriculas/index.html",
         cursos=cursos_visibles,
         mats_por_curso=mats_por_curso,
+        conteo_por_curso=conteo_por_curso,
+        siguiente_por_curso=siguiente_por_curso,
         total=total,
         total_val=total_val,
         total_pend=total_pend,
@@ -173,6 +184,24 @@ def index():
     )
 
 
+@bp.route("/curso/<int:curso_id>/filas")
+@login_required
+def filas_curso(curso_id):
+    """Siguiente bloque de filas de la tabla de un curso (expansión bajo demanda del index)."""
+    pagina = paginar_keyset(
+        Matricula.query.options(*opciones("tabla")).filter(Matricula.curso_id == curso_id),
+        Matricula.created_at, Matricula.id,
+        despues=request.args.get("despues"),
+        por_pagina=request.args.get("por_pagina", MATS_POR_CURSO_INICIAL),
+    )
+    resp = make_response(render_template("matriculas/partials/_filas_matriculas.html", mats=pagina.items))
+    resp.headers["X-Siguiente"] = (
+        url_for("matriculas.filas_curso", curso_id=curso_id, despues=pagina.cursor_siguiente)
+        if pagina.tiene_siguiente else ""
+    )
+    return resp
+
+
 # ----------------- LISTA CON FILTROS -----------------
 @bp.route("/lista")
 @login_required
@@ -182,7 +211,7 @@ def lista():
     estado = request.args.get("estado", "").strip()
     campus = request.args.get("campus", "").strip()
 
-    query = Matricula.query
+    query = Matricula.query.options(*opciones("lista"))
     if search:
         query = query.filter(
             db.or_(
@@ -195,10 +224,11 @@ def lista():
     if campus:
         query = query.filter(Matricula.campus == campus)
 
-    matriculas = query.order_by(Matricula.created_at.desc()).all()
+    pagina = paginar_keyset_request(query, Matricula.created_at, Matricula.id)
     return render_template(
         "matriculas/lista.html",
-        matriculas=matriculas,
+        matriculas=pagina.items,
+        pagina=pagina,
         search=search,
         estado=estado,
         campus=campus,
@@ -208,6 +238,7 @@ def lista():
 # ----------------- NUEVA MATRÍCULA -----------------
 @bp.route("/nueva/<int:curso_id>", methods=["GET", "POST"])
 @login_required
+@limite_subida(MAX_FILE_MB)
 def nueva(curso_id):
     curso = db.session.get(Curso, curso_id) or abort(404)
     form = MatriculaFPForm() if curso.tipo == CURSO_TIPO_FP else MatriculaIntensivoForm()
@@ -323,30 +354,8 @@ def nueva(curso_id):
 @bp.route("/<int:matricula_id>")
 @login_required
 def detalle(matricula_id):
-    # Recuperar la matrícula
-    # Intentamos usar query normal y luego forzar .all() en relaciones dinámicas
-    m = db.session.get(Matricula, matricula_id) or abort(404)
-
-    # Convertir relaciones dinámicas (AppenderQuery) a listas para uso en plantillas
-    # Esto evita errores de Jinja al usar |length o len() sobre AppenderQuery.
-    try:
-        if hasattr(m, "documentos") and hasattr(m.documentos, "all"):
-            m.documentos = m.documentos.all()
-    except Exception:
-        # no rompemos la vista por un fallo en la conversión
-        pass
-
-    try:
-        if hasattr(m, "pagos") and hasattr(m.pagos, "all"):
-            m.pagos = m.pagos.all()
-    except Exception:
-        pass
-
-    try:
-        if hasattr(m, "asignaturas") and hasattr(m.asignaturas, "all"):
-            m.asignaturas = m.asignaturas.all()
-    except Exception:
-        pass
+    # Matrícula con curso, documentos, pagos y asignaturas (y sus módulos) ya cargados
+    m = db.session.get(Matricula, matricula_id, options=opciones("detalle")) or abort(404)
 
     return render_template("matriculas/detalle.html", m=m)
 
@@ -354,6 +363,7 @@ def detalle(matricula_id):
 # ----------------- EDITAR -----------------
 @bp.route("/<int:matricula_id>/editar", methods=["GET", "POST"])
 @login_required
+@limite_subida(MAX_FILE_MB)
 def editar(matricula_id):
     m = db.session.get(Matricula, matricula_id) or abort(404)
     if not puede_editar_matricula(m):
@@ -397,7 +407,8 @@ def editar(matricula_id):
 
         # 🔹 ACTUALIZAR CALENDARIO DE PAGOS AL EDITAR
         # Eliminar pagos existentes y recrearlos
-        Pago.query.filter_by(matricula_id=m.id).delete()
+        # (vía ORM y no con query.delete() para que se actualicen los contadores de estadísticas)
+        m.pagos = []
         
         # Crear nuevo pago inicial (marcado para validación)
         pago_inicial = Pago(
@@ -459,9 +470,8 @@ def editar(matricula_id):
 # ----------------- ELIMINAR (solo admin) -----------------
 @bp.route("/<int:matricula_id>/eliminar", methods=["POST"])
 @login_required
+@requiere_permiso("administrar")
 def eliminar(matricula_id):
-    if not es_admin():
-        abort(403)
     m = db.session.get(Matricula, matricula_id) or abort(404)
     db.session.delete(m)
     db.session.commit()
@@ -483,22 +493,18 @@ def descargar_documentos(matricula_id, documento_id=None):
     # Si se solicita un documento individual
     if documento_id is not None:
         doc = db.session.get(MatriculaDocumento, documento_id)
-        if not doc or doc.matricula_id != m.id or not os.path.exists(doc.path):
+        if not doc or doc.matricula_id != m.id or not os.path.exists(doc.ruta_archivo or ""):
             flash("Documento no encontrado.", "danger")
             return redirect(url_for("matriculas.detalle", matricula_id=m.id))
-        return send_file(doc.path, as_attachment=True, download_name=doc.filename)
-
-    # Si no, crear ZIP con todos los documentos
-    buffer = io.BytesIO()
-    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-        # si m.documentos es AppenderQuery, iterar con .all() por seguridad
-        docs_iter = m.documentos.all() if hasattr(m, "documentos") and hasattr(m.documentos, "all") else getattr(m, "documentos", []) or []
-        for doc in docs_iter:
-            if os.path.exists(doc.path):
-                zipf.write(doc.path, arcname=doc.filename)
-    buffer.seek(0)
+        return enviar_archivo(doc.ruta_archivo, doc.filename, as_attachment=True, etag=doc.sha256)
+
+    # Si no, ZIP con todos los documentos, generado en streaming (memoria constante)
+    z = ZipStream()
+    for doc in m.documentos:
+        if doc.ruta_archivo:
+            z.agregar(doc.ruta_archivo, doc.filename)
     filename = f"matricula_{m.id}_{(m.estudiante_nombre or 'alumno').replace(' ', '_')}.zip"
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype="application/zip")
+    return z.respuesta(filename)
 
 # ----------------- DESCARGAR DOCUMENTO INDIVIDUAL -----------------
 @bp.route("/documento/<int:documento_id>")
@@ -506,11 +512,141 @@ def descargar_documentos(matricula_id, documento_id=None):
 def descargar_documento(documento_id):
     """Descarga un documento individual de matrícula"""
     doc = db.session.get(MatriculaDocumento, documento_id)
-    if not doc or not os.path.exists(doc.path):
+    if not doc or not os.path.exists(doc.ruta_archivo or ""):
         flash("Documento no encontrado.", "danger")
         return redirect(url_for("matriculas.lista"))
     
-    return send_file(doc.path, as_attachment=True, download_name=doc.filename)
+    return enviar_archivo(doc.ruta_archivo, doc.filename, as_attachment=True, etag=doc.sha256)
+
+@bp.route("/documento/<int:documento_id>/miniatura")
+@login_required
+def miniatura_documento(documento_id):
+    """Miniatura de un documento de matrícula (404 si aún no se ha generado)"""
+    doc = db.session.get(MatriculaDocumento, documento_id) or abort(404)
+    return responder_miniatura(doc.sha256)
+
+
+# ----------------- EXPORTACIONES MASIVAS DE DOCUMENTOS -----------------
+def _exportacion_o_404(exportacion_id) -> ExportacionDocumentos:
+    if not puede("gestionar"):
+        abort(403)
+    return db.session.get(ExportacionDocumentos, exportacion_id) or abort(404)
+
+
+def _exportacion_json(exp: ExportacionDocumentos) -> dict:
+    return {
+        "id": exp.id,
+        "estado": exp.estado,
+        "total": exp.total,
+        "procesados": exp.procesados,
+        "progreso": exp.progreso,
+        "bytes_escritos": exp.bytes_escritos,
+        "error": exp.error,
+        "trabajo": url_for("trabajos.estado", trabajo_id=exp.trabajo_id) if exp.trabajo_id else None,
+        "descargar": url_for("matriculas.descargar_exportacion", exportacion_id=exp.id)
+        if exp.estado == ESTADO_EXP_COMPLETADA else None,
+    }
+
+
+@bp.route("/exportaciones", methods=["GET", "POST"])
+@login_required
+@requiere_permiso("gestionar")
+def exportaciones_index():
+    """Lanza y lista exportaciones ZIP de documentos por curso, campus y/o fechas."""
+    if request.method == "POST":
+        filtros = {
+            "curso_id": request.form.get("curso_id", type=int),
+            "campus": request.form.get("campus", "").strip() or None,
+            "desde": request.form.get("desde", "").strip() or None,
+            "hasta": request.form.get("hasta", "").strip() or None,
+        }
+        try:
+            for clave in ("desde", "hasta"):
+                if filtros[clave]:
+                    datetime.strptime(filtros[clave], "%Y-%m-%d")
+        except ValueError:
+            flash("Fecha no válida.", "danger")
+            return redirect(url_for("matriculas.exportaciones_index"))
+
+        exp = ExportacionDocumentos(
+            creado_por_id=current_user.id,
+            filtros=filtros,
+            descripcion=exportaciones.describir(filtros)[:200],
+            estado=ESTADO_EXP_PENDIENTE,
+        )
+        db.session.add(exp)
+        db.session.flush()
+        exportaciones.encolar_exportacion(exp, current_user.id)
+        db.session.commit()
+        flash("⏳ Exportación encolada. Puedes seguir trabajando; aparecerá aquí al terminar.", "info")
+        return redirect(url_for("matriculas.exportaciones_index"))
+
+    lista_exp = (
+        ExportacionDocumentos.query
+        .order_by(ExportacionDocumentos.creado_en.desc(), ExportacionDocumentos.id.desc())
+        .limit(50)
+        .all()
+    )
+    cursos = Curso.query.filter_by(es_plantilla=False).order_by(Curso.nombre).all()
+    return render_template(
+        "matriculas/exportaciones.html",
+        exportaciones=lista_exp,
+        cursos=cursos,
+        campus_opciones=(CAMPUS_BATA, CAMPUS_MALABO),
+        en_curso=(ESTADO_EXP_PENDIENTE, ESTADO_EXP_EN_CURSO),
+    )
+
+
+@bp.route("/exportaciones/<int:exportacion_id>/estado")
+@login_required
+def estado_exportacion(exportacion_id):
+    """Progreso de una exportación (JSON, para el sondeo desde la página)."""
+    return jsonify(_exportacion_json(_exportacion_o_404(exportacion_id)))
+
+
+@bp.route("/exportaciones/<int:exportacion_id>/descargar")
+@login_required
+def descargar_exportacion(exportacion_id):
+    """Descarga del ZIP terminado; admite Range (o lo atiende el proxy), así que es reanudable."""
+    exp = _exportacion_o_404(exportacion_id)
+    ruta = exportaciones.ruta_final(exp)
+    if exp.estado != ESTADO_EXP_COMPLETADA or not os.path.exists(ruta):
+        flash("La exportación no está disponible.", "warning")
+        return redirect(url_for("matriculas.exportaciones_index"))
+    return enviar_archivo(ruta, exp.nombre_archivo, as_attachment=True, mimetype="application/zip")
+
+
+@bp.route("/exportaciones/<int:exportacion_id>/reanudar", methods=["POST"])
+@login_required
+def reanudar_exportacion(exportacion_id):
+    """Reintenta una exportación fallida desde su último punto de control."""
+    exp = _exportacion_o_404(exportacion_id)
+    if exp.estado != ESTADO_EXP_ERROR:
+        flash("Solo se pueden reanudar exportaciones con error.", "warning")
+    elif exportaciones.en_cola(exp):
+        flash("La exportación ya tiene un reintento programado.", "info")
+    else:
+        exp.estado = ESTADO_EXP_PENDIENTE
+        exportaciones.encolar_exportacion(exp, current_user.id)
+        db.session.commit()
+        flash("⏳ Exportación reanudada.", "info")
+    return redirect(url_for("matriculas.exportaciones_index"))
+
+
+@bp.route("/exportaciones/<int:exportacion_id>/eliminar", methods=["POST"])
+@login_required
+def eliminar_exportacion(exportacion_id):
+    exp = _exportacion_o_404(exportacion_id)
+    if exp.estado in (ESTADO_EXP_PENDIENTE, ESTADO_EXP_EN_CURSO) or exportaciones.en_cola(exp):
+        flash("No se puede eliminar una exportación en curso.", "warning")
+        return redirect(url_for("matriculas.exportaciones_index"))
+    exportaciones.eliminar_archivos(exp)
+    db.session.delete(exp)
+    db.session.commit()
+    flash("🗑️ Exportación eliminada.", "success")
+    return redirect(url_for("matriculas.exportaciones_index"))
+
+
 # ----------------- VALIDACIONES -----------------
 @bp.route("/validaciones")
 @login_required
@@ -521,9 +657,8 @@ def validaciones_index():
 
 @bp.route("/validaciones/<int:matricula_id>", methods=["GET", "POST"])
 @login_required
+@requiere_permiso("supervisar")
 def validar_o_rechazar(matricula_id):
-    if not (es_admin() or es_supervisor()):
-        abort(403)
     m = db.session.get(Matricula, matricula_id) or abort(404)
     f_ok = ValidarForm(prefix="ok")
     f_bad = RechazoForm(prefix="bad")
@@ -557,7 +692,7 @@ def gestion_notas(matricula_asignatura_id):
     
     # Permisos: solo admin, supervisor o docente asignado (si existiera lógica de docente)
     # Por ahora restringimos a roles administrativos
-    if not (es_admin() or es_supervisor() or es_administrativo()):
+    if not puede("calificar"):
         abort(403)
 
     # Instanciar formulario
@@ -588,10 +723,8 @@ def gestion_notas(matricula_asignatura_id):
 
 @bp.route("/calificaciones/agregar", methods=["POST"])
 @login_required
+@requiere_permiso("calificar")
 def agregar_calificacion():
-    if not (es_admin() or es_supervisor() or es_administrativo()):
-        abort(403)
-
     form = CalificacionForm()
     ma_id = request.form.get("matricula_asignatura_id")
     
@@ -637,10 +770,8 @@ def agregar_calificacion():
 
 @bp.route("/calificaciones/eliminar/<int:calificacion_id>", methods=["POST"])
 @login_required
+@requiere_permiso("calificar")
 def eliminar_calificacion(calificacion_id):
-    if not (es_admin() or es_supervisor() or es_administrativo()):
-        abort(403)
-
     calif = db.session.get(Calificacion, calificacion_id) or abort(404)
     ma = calif.asignatura
     
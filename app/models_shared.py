@@ -4,7 +4,9 @@ Centraliza tablas compartidas y auditoría.
 """
 
 from datetime import datetime
-from .extensions import db
+from flask import has_request_context, request
+
+from .extensions import db, auditoria
 
 
 
@@ -18,7 +20,13 @@ user_roles = db.Table(
 
 class ActividadUsuario(db.Model):
     __tablename__ = "actividades_usuario"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        # Actividad de un usuario, de la más reciente a la más antigua
+        db.Index("ix_actividades_usuario_usuario_fecha", "usuario_id", "fecha_hora"),
+        # Archivo por meses (`flask audit-archive`): rango de fechas
+        db.Index("ix_actividades_usuario_fecha_hora", "fecha_hora"),
+        {"extend_existing": True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=False)
@@ -34,15 +42,15 @@ class ActividadUsuario(db.Model):
     def __repr__(self):
         return f"<ActividadUsuario {self.accion} - {self.usuario_id}>"
 
-def registrar_actividad(usuario, accion, ip=None, navegador=None, detalles=None):
+def registrar_actividad(usuario, accion, detalles=None, ip=None, agente=None):
+    """
+    Audita una acción del usuario. No usa la sesión de la petición: la fila
+    se escribe por lotes en segundo plano (ver app/auditoria.py). IP y
+    navegador salen de la petición actual si no se indican.
+    """
     if not usuario:
         return
-    act = ActividadUsuario(
-        usuario_id=usuario.id,
-        accion=accion,
-        ip=ip,
-        navegador=navegador,
-        detalles=detalles
-    )
-    db.session.add(act)
-    db.session.commit()
+    if has_request_context():
+        ip = ip or request.remote_addr
+        agente = agente or request.user_agent.string or None
+    auditoria.registrar(usuario.id, accion, ip=ip, agente=agente, detalles=detalles)
@@ -0,0 +1,147 @@
+"""
+paginacion.py
+Paginación por clave (keyset) reutilizable entre módulos.
+
+En lugar de OFFSET, cada página arranca justo después (o antes) de la última
+fila vista, identificada por el par (columna de orden, id). El coste de una
+página es el mismo sea la primera o la número mil, y no se saltan ni repiten
+filas aunque se inserten registros nuevos mientras se navega.
+
+Orden fijo: columna de orden DESC (NULLs al final), id DESC.
+"""
+import base64
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, List, Optional
+
+from flask import request
+from sqlalchemy import and_, or_
+
+POR_PAGINA_DEFECTO = 25
+POR_PAGINA_MAX = 100
+
+
+def limitar_por_pagina(valor, defecto=POR_PAGINA_DEFECTO, maximo=POR_PAGINA_MAX) -> int:
+    """Normaliza el tamaño de página pedido por el usuario a [1, maximo]."""
+    try:
+        valor = int(valor)
+    except (TypeError, ValueError):
+        return defecto
+    return max(1, min(valor, maximo))
+
+
+def codificar_cursor(orden, id_: int) -> str:
+    crudo = f"{orden.isoformat() if orden else ''}|{id_}"
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def _parse_orden(valor: str):
+    if not valor:
+        return None
+    # Columnas Date ('YYYY-MM-DD') o DateTime (con hora)
+    return date.fromisoformat(valor) if len(valor) == 10 else datetime.fromisoformat(valor)
+
+
+def decodificar_cursor(cursor: Optional[str]):
+    """Devuelve (orden, id) o None si el cursor no es válido."""
+    if not cursor:
+        return None
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        orden, id_ = crudo.rsplit("|", 1)
+        return _parse_orden(orden), int(id_)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+@dataclass
+class PaginaKeyset:
+    items: List[Any] = field(default_factory=list)
+    por_pagina: int = POR_PAGINA_DEFECTO
+    cursor_siguiente: Optional[str] = None
+    cursor_anterior: Optional[str] = None
+
+    @property
+    def tiene_siguiente(self) -> bool:
+        return self.cursor_siguiente is not None
+
+    @property
+    def tiene_anterior(self) -> bool:
+        return self.cursor_anterior is not None
+
+
+def _despues_de(col_orden, col_id, orden, id_):
+    """Filas que van detrás de (orden, id) en orden DESC con NULLs al final."""
+    if orden is None:
+        return and_(col_orden.is_(None), col_id < id_)
+    return or_(
+        col_orden < orden,
+        and_(col_orden == orden, col_id < id_),
+        col_orden.is_(None),
+    )
+
+
+def _antes_de(col_orden, col_id, orden, id_):
+    """Filas que van delante de (orden, id) en orden DESC con NULLs al final."""
+    if orden is None:
+        return or_(col_orden.isnot(None), col_id > id_)
+    return and_(
+        col_orden.isnot(None),
+        or_(col_orden > orden, and_(col_orden == orden, col_id > id_)),
+    )
+
+
+def paginar_keyset(query, col_orden, col_id, despues=None, antes=None,
+                   por_pagina=POR_PAGINA_DEFECTO) -> PaginaKeyset:
+    """
+    Devuelve una página de `query` ordenada por (col_orden DESC, col_id DESC).
+
+    `despues` / `antes` son cursores opacos obtenidos de una página anterior
+    (`cursor_siguiente` / `cursor_anterior`). Se piden por_pagina + 1 filas
+    para saber si existe otra página sin necesidad de un COUNT.
+    """
+    por_pagina = limitar_por_pagina(por_pagina)
+    pos_despues = decodificar_cursor(despues)
+    pos_antes = decodificar_cursor(antes) if pos_despues is None else None
+
+    if pos_antes is not None:
+        # Hacia atrás: orden invertido y luego se da la vuelta al resultado
+        filas = (
+            query.filter(_antes_de(col_orden, col_id, *pos_antes))
+            .order_by(col_orden.asc().nulls_first(), col_id.asc())
+            .limit(por_pagina + 1)
+            .all()
+        )
+        hay_mas = len(filas) > por_pagina
+        items = list(reversed(filas[:por_pagina]))
+        hay_anterior, hay_siguiente = hay_mas, True
+    else:
+        if pos_despues is not None:
+            query = query.filter(_despues_de(col_orden, col_id, *pos_despues))
+        filas = (
+            query.order_by(col_orden.desc().nulls_last(), col_id.desc())
+            .limit(por_pagina + 1)
+            .all()
+        )
+        items = filas[:por_pagina]
+        hay_anterior, hay_siguiente = pos_despues is not None, len(filas) > por_pagina
+
+    pagina = PaginaKeyset(items=items, por_pagina=por_pagina)
+    if items:
+        clave = col_orden.key, col_id.key
+        primero, ultimo = items[0], items[-1]
+        if hay_siguiente:
+            pagina.cursor_siguiente = codificar_cursor(getattr(ultimo, clave[0]), getattr(ultimo, clave[1]))
+        if hay_anterior:
+            pagina.cursor_anterior = codificar_cursor(getattr(primero, clave[0]), getattr(primero, clave[1]))
+    return pagina
+
+
+def paginar_keyset_request(query, col_orden, col_id, defecto=POR_PAGINA_DEFECTO) -> PaginaKeyset:
+    """Atajo que lee `despues`, `antes` y `por_pagina` de los parámetros de la URL."""
+    return paginar_keyset(
+        query, col_orden, col_id,
+        despues=request.args.get("despues"),
+        antes=request.args.get("antes"),
+        por_pagina=limitar_por_pagina(request.args.get("por_pagina"), defecto=defecto),
+    )
@@ -0,0 +1,265 @@
+"""
+ledger.py
+Balance financiero de las matrículas calculado en la base de datos.
+
+Un pago cuenta como cobrado si está VALIDADO o es el pago inicial. Todo lo
+demás (pendiente, pendiente de validación, rechazado) sigue siendo deuda.
+
+Además, cada matrícula guarda su saldo (total_pagado, deuda_actual,
+cuotas_pendientes). Un listener de sesión lo recalcula en SQL en el mismo
+flush en que cambia cualquiera de sus pagos, así que nunca se confirma un
+pago sin su saldo. `flask saldos-check` detecta (y con --reparar corrige)
+las matrículas cuyo saldo guardado no coincide con sus pagos.
+"""
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, Iterable, List, Optional
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, case, or_, select, update, event, inspect
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.matriculas.models import Matricula
+from app.trabajos.cola import tarea
+from .models import Pago, ESTADO_PAGO_VALIDADO, ESTADO_PAGO_PENDIENTE
+
+
+def condicion_pagado():
+    """Predicado SQL de 'pago cobrado' (mismo criterio en todo el módulo)."""
+    return or_(Pago.estado == ESTADO_PAGO_VALIDADO, Pago.es_pago_inicial == True)  # noqa: E712
+
+
+@dataclass
+class Balance:
+    matricula_id: int
+    coste_total: float = 0.0
+    total_pagado: float = 0.0
+    cuotas_totales: int = 0
+    cuotas_pagadas: int = 0
+
+    @property
+    def total_adeudado(self) -> float:
+        return self.coste_total - self.total_pagado
+
+    @property
+    def cuotas_pendientes(self) -> int:
+        return self.cuotas_totales - self.cuotas_pagadas
+
+    @property
+    def progreso(self) -> float:
+        return (self.total_pagado / self.coste_total * 100) if self.coste_total > 0 else 0
+
+
+def balances_for(matricula_ids: Iterable[int]) -> Dict[int, Balance]:
+    """
+    Balance de varias matrículas en una sola consulta agregada
+    (matriculas LEFT JOIN pagos GROUP BY matricula). Devuelve {matricula_id: Balance}.
+    """
+    ids = list(set(matricula_ids))
+    if not ids:
+        return {}
+
+    pagado = condicion_pagado()
+    filas = (
+        db.session.query(
+            Matricula.id,
+            Matricula.coste_total,
+            func.coalesce(func.sum(case((pagado, Pago.monto), else_=0)), 0),
+            func.count(Pago.id),
+            func.coalesce(func.sum(case((pagado, 1), else_=0)), 0),
+        )
+        .outerjoin(Pago, Pago.matricula_id == Matricula.id)
+        .filter(Matricula.id.in_(ids))
+        .group_by(Matricula.id, Matricula.coste_total)
+        .all()
+    )
+    return {
+        mid: Balance(
+            matricula_id=mid,
+            coste_total=coste or 0.0,
+            total_pagado=float(pagado_total or 0),
+            cuotas_totales=int(totales or 0),
+            cuotas_pagadas=int(pagadas or 0),
+        )
+        for mid, coste, pagado_total, totales, pagadas in filas
+    }
+
+
+def balance_for(matricula) -> Balance:
+    """Balance de una matrícula (objeto o id)."""
+    mid = getattr(matricula, "id", matricula)
+    return balances_for([mid]).get(mid) or Balance(matricula_id=mid)
+
+
+def obtener_cuotas_pendientes(matricula_id):
+    """Cuotas aún sin pagar ni enviar a validación, por orden de vencimiento"""
+    return Pago.query.filter_by(
+        matricula_id=matricula_id,
+        estado=ESTADO_PAGO_PENDIENTE
+    ).order_by(Pago.numero_cuota).all()
+
+
+def redistribuir_cuotas_pendientes(matricula):
+    """
+    Redistribuye el monto de las cuotas pendientes basado en la deuda actual.
+    No hace commit: se confirma junto con el cambio de pago que la provoca.
+    """
+    cuotas_pendientes = obtener_cuotas_pendientes(matricula.id)
+
+    if not cuotas_pendientes:
+        return
+
+    deuda_actual = balance_for(matricula).total_adeudado
+
+    # Recalcular monto por cuota
+    nuevo_monto_cuota = round(deuda_actual / len(cuotas_pendientes), 2)
+
+    # Ajustar la última cuota por posibles diferencias de redondeo
+    for i, cuota in enumerate(cuotas_pendientes):
+        if i == len(cuotas_pendientes) - 1:
+            # La última cuota lleva el ajuste por redondeo
+            total_asignado = nuevo_monto_cuota * (len(cuotas_pendientes) - 1)
+            cuota.monto = round(deuda_actual - total_asignado, 2)
+        else:
+            cuota.monto = nuevo_monto_cuota
+
+
+# ----------------- Saldo guardado en Matricula -----------------
+CAMPOS_SALDO = ("total_pagado", "deuda_actual", "cuotas_pendientes")
+_INFO_SALDOS = "saldos_recalculados"
+
+
+def actualizar_saldos(connection, matricula_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recalcula con un único UPDATE (subconsultas correlacionadas) el saldo
+    guardado de las matrículas indicadas, o de todas si `matricula_ids` es
+    None. Devuelve el nº de filas actualizadas.
+    """
+    t = Matricula.__table__
+    pagado = condicion_pagado()
+    por_matricula = Pago.matricula_id == t.c.id
+
+    total_pagado = (
+        select(func.coalesce(func.sum(case((pagado, Pago.monto), else_=0)), 0))
+        .where(por_matricula).scalar_subquery()
+    )
+    # total - pagadas (y no NOT pagado, que con es_pago_inicial NULL daría NULL)
+    pendientes = (
+        select(func.count(Pago.id) - func.coalesce(func.sum(case((pagado, 1), else_=0)), 0))
+        .where(por_matricula).scalar_subquery()
+    )
+    stmt = update(t).values(
+        total_pagado=total_pagado,
+        deuda_actual=t.c.coste_total - total_pagado,
+        cuotas_pendientes=pendientes,
+    )
+    if matricula_ids is not None:
+        ids = list(matricula_ids)
+        if not ids:
+            return 0
+        stmt = stmt.where(t.c.id.in_(ids))
+    return connection.execute(stmt).rowcount
+
+
+def _matriculas_afectadas(session) -> set:
+    """Matrículas cuyo saldo puede haber cambiado en el flush en curso."""
+    ids = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Pago):
+            ids.add(obj.matricula_id)
+            # Un pago movido de matrícula afecta también a la anterior
+            ids.update(inspect(obj).attrs.matricula_id.history.deleted or ())
+        elif isinstance(obj, Matricula) and obj not in session.deleted:
+            if obj in session.new or inspect(obj).attrs.coste_total.history.has_changes():
+                ids.add(obj.id)
+    ids.discard(None)
+    return ids
+
+
+@event.listens_for(Session, "after_flush")
+def _recalcular_saldos(session, flush_context):
+    ids = _matriculas_afectadas(session)
+    if ids:
+        actualizar_saldos(session.connection(), ids)
+        session.info.setdefault(_INFO_SALDOS, set()).update(ids)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _expirar_saldos(session, flush_context):
+    # El UPDATE va por Core: se expiran los atributos para que el objeto
+    # en memoria recargue el saldo nuevo la próxima vez que se lea.
+    ids = session.info.pop(_INFO_SALDOS, None)
+    if not ids:
+        return
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Matricula) and obj.id in ids:
+            session.expire(obj, CAMPOS_SALDO)
+
+
+# ----------------- Comprobación de consistencia -----------------
+def saldos_descuadrados() -> List[tuple]:
+    """
+    Matrículas cuyo saldo guardado no coincide con sus pagos.
+    Devuelve [(matricula_id, (pagado, deuda, cuotas) guardados, (pagado, deuda, cuotas) reales)].
+    """
+    pagado = condicion_pagado()
+    agregado = (
+        db.session.query(
+            Pago.matricula_id.label("matricula_id"),
+            func.sum(case((pagado, Pago.monto), else_=0)).label("pagado"),
+            func.sum(case((pagado, 0), else_=1)).label("pendientes"),
+        )
+        .group_by(Pago.matricula_id)
+        .subquery()
+    )
+    real_pagado = func.coalesce(agregado.c.pagado, 0)
+    real_pendientes = func.coalesce(agregado.c.pendientes, 0)
+
+    filas = (
+        db.session.query(
+            Matricula.id, Matricula.total_pagado, Matricula.deuda_actual, Matricula.cuotas_pendientes,
+            real_pagado, Matricula.coste_total - real_pagado, real_pendientes,
+        )
+        .outerjoin(agregado, agregado.c.matricula_id == Matricula.id)
+        .filter(or_(
+            func.abs(Matricula.total_pagado - real_pagado) > 0.005,
+            func.abs(Matricula.deuda_actual - (Matricula.coste_total - real_pagado)) > 0.005,
+            Matricula.cuotas_pendientes != real_pendientes,
+        ))
+        .order_by(Matricula.id)
+        .all()
+    )
+    return [(f[0], tuple(f[1:4]), tuple(f[4:7])) for f in filas]
+
+
+@tarea("pagos.recalcular_saldos")
+def recalcular_saldos(matricula_ids=None):
+    """Recalcula (en segundo plano) el saldo guardado de las matrículas indicadas o de todas."""
+    n = actualizar_saldos(db.session.connection(), matricula_ids)
+    db.session.commit()
+    return {"matriculas": n}
+
+
+@click.command("saldos-check")
+@click.option("--reparar", is_flag=True, help="Recalcula el saldo de las matrículas descuadradas.")
+@with_appcontext
+def saldos_check(reparar):
+    """Comprueba que el saldo guardado en cada matrícula cuadra con sus pagos"""
+    descuadres = saldos_descuadrados()
+    if not descuadres:
+        click.echo("✅ Todos los saldos cuadran.")
+        return
+
+    for mid, guardado, real in descuadres:
+        click.echo(
+            f"⚠️ Matrícula {mid}: guardado pagado/deuda/cuotas={guardado} "
+            f"→ real={tuple(round(v, 2) for v in real)}"
+        )
+
+    if reparar:
+        actualizar_saldos(db.session.connection(), [mid for mid, _, _ in descuadres])
+        db.session.commit()
+        click.echo(f"✅ {len(descuadres)} saldos reparados.")
+    else:
+        click.echo(f"❌ {len(descuadres)} saldos descuadrados (use --reparar para corregirlos).")
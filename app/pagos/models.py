@@ -1,4 +1,6 @@
 from datetime import datetime, date
+from sqlalchemy import and_
+from sqlalchemy.ext.hybrid import hybrid_method
 from sqlalchemy.types import TypeDecorator, Date
 from app.extensions import db
 
@@ -9,9 +11,13 @@ ESTADO_PAGO_RECHAZADO = "RECHAZADO"
 ESTADO_PAGO_INICIAL = "INICIAL"
 ESTADO_PAGO_PENDIENTE_VALIDACION = "PENDIENTE_VALIDACION"
 
+# Estados en los que un pago con fecha de vencimiento pasada se considera fuera de plazo
+ESTADOS_PAGO_VENCIBLES = (ESTADO_PAGO_PENDIENTE, ESTADO_PAGO_PENDIENTE_VALIDACION)
+
 class SafeDate(TypeDecorator):
     """Tipo de columna que maneja de forma segura diferentes formatos de fecha"""
     impl = Date
+    cache_ok = True
     
     def process_result_value(self, value, dialect):
         """Convierte valores de la base de datos a objetos date de Python"""
@@ -46,7 +52,13 @@ class SafeDate(TypeDecorator):
 # Actualizar el modelo Pago para usar SafeDate
 class Pago(db.Model):
     __tablename__ = "pagos"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Pagos fuera de plazo: estado IN (...) AND fecha_vencimiento < hoy
+        db.Index("ix_pagos_estado_fecha_vencimiento", "estado", "fecha_vencimiento"),
+        # Pagos de una matrícula filtrados por estado (balances, cuotas pendientes)
+        db.Index("ix_pagos_matricula_id_estado", "matricula_id", "estado"),
+        {'extend_existing': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     matricula_id = db.Column(db.Integer, db.ForeignKey("matriculas.id"), nullable=False)
@@ -61,7 +73,8 @@ class Pago(db.Model):
     # Campos para control de validación - USAR SafeDate
     fecha_vencimiento = db.Column(SafeDate, nullable=True)
     fecha_pago = db.Column(SafeDate, nullable=True)
-    comprobante_path = db.Column(db.String(300), nullable=True)
+    comprobante_path = db.Column(db.String(300), nullable=True)  # ficheros anteriores al almacén
+    comprobante_sha256 = db.Column(db.String(64), nullable=True, index=True)  # ver app/storage
     motivo_rechazo = db.Column(db.Text, nullable=True)
     
     # Campos legacy para compatibilidad
@@ -78,11 +91,28 @@ class Pago(db.Model):
     def __repr__(self):
         return f"<Pago {self.numero_cuota} - {self.estado}>"
 
-    def esta_vencido(self):
+    @property
+    def comprobante_ruta(self):
+        """Ruta local del comprobante (almacén por contenido o ruta antigua)."""
+        if self.comprobante_sha256:
+            from app.extensions import storage
+            return storage.ruta_local(self.comprobante_sha256)
+        return self.comprobante_path
+
+    @hybrid_method
+    def esta_vencido(self, hoy=None):
         """Verifica si el pago está fuera de plazo"""
         if not self.fecha_vencimiento:
             return False
-        return self.fecha_vencimiento < date.today() and self.estado in [ESTADO_PAGO_PENDIENTE, ESTADO_PAGO_PENDIENTE_VALIDACION]
+        return self.fecha_vencimiento < (hoy or date.today()) and self.estado in ESTADOS_PAGO_VENCIBLES
+
+    @esta_vencido.expression
+    def esta_vencido(cls, hoy=None):
+        """Misma condición como predicado SQL (usa ix_pagos_estado_fecha_vencimiento)"""
+        return and_(
+            cls.estado.in_(ESTADOS_PAGO_VENCIBLES),
+            cls.fecha_vencimiento < (hoy or date.today()),
+        )
 
     def get_estado_display(self):
         """Retorna el estado para mostrar en la interfaz"""
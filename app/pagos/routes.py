@@ -3,102 +3,25 @@ import os
 from datetime import datetime, date, timedelta
 from flask import (
     render_template, redirect, url_for, flash, request, 
-    abort, send_file, current_app
+    abort
 )
 from flask_login import login_required, current_user
 import os
-from werkzeug.utils import secure_filename
-from app.extensions import db
+from app.extensions import db, storage
+from app.storage.subidas import limite_subida, tipo_real, nombre_seguro
+from app.storage.entrega import enviar_archivo
+from app.storage.miniaturas import encolar_miniatura, responder_miniatura
 from app.matriculas.models import Matricula
 from app.pagos.models import Pago, ESTADO_PAGO_PENDIENTE, ESTADO_PAGO_VALIDADO, ESTADO_PAGO_RECHAZADO, ESTADO_PAGO_PENDIENTE_VALIDACION, ESTADO_PAGO_INICIAL
 from app.pagos.forms import RegistrarPagoForm
+from app.matriculas.perfiles import opciones
 
 from . import bp
 
-# Configuración de subida de archivos
-ALLOWED_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg'}
+# Configuración de subida de archivos (el tipo se comprueba por el contenido)
+TIPOS_PERMITIDOS = ("pdf", "png", "jpg")
 MAX_FILE_MB = 10
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ['pdf', 'png', 'jpg', 'jpeg']
-
-def ensure_upload_dir():
-    upload_dir = os.path.join(current_app.instance_path, "uploads", "pagos")
-    os.makedirs(upload_dir, exist_ok=True)
-    return upload_dir
-
-# ----------------- NUEVAS FUNCIONES PARA CÁLCULOS FINANCIEROS -----------------
-def calcular_monto_pagado(matricula_id):
-    """Calcula el monto total pagado (pago inicial + cuotas validadas)"""
-    pagos = Pago.query.filter_by(matricula_id=matricula_id).all()
-    monto_pagado = 0
-    
-    for pago in pagos:
-        if pago.estado == ESTADO_PAGO_VALIDADO or pago.es_pago_inicial:
-            monto_pagado += pago.monto
-    
-    return monto_pagado
-
-def calcular_deuda_actual(matricula):
-    """Calcula la deuda actual (costo total - monto pagado)"""
-    monto_pagado = calcular_monto_pagado(matricula.id)
-    return matricula.coste_total - monto_pagado
-
-def obtener_cuotas_pendientes(matricula_id):
-    """Obtiene las cuotas pendientes de validación"""
-    return Pago.query.filter_by(
-        matricula_id=matricula_id, 
-        estado=ESTADO_PAGO_PENDIENTE
-    ).order_by(Pago.numero_cuota).all()
-
-def redistribuir_cuotas_pendientes(matricula):
-    """Redistribuye el monto de las cuotas pendientes basado en la deuda actual"""
-    # Obtener cuotas pendientes
-    cuotas_pendientes = obtener_cuotas_pendientes(matricula.id)
-    
-    if not cuotas_pendientes:
-        return
-    
-    # Calcular deuda actual
-    deuda_actual = calcular_deuda_actual(matricula)
-    
-    # Recalcular monto por cuota
-    nuevo_monto_cuota = round(deuda_actual / len(cuotas_pendientes), 2)
-    
-    # Ajustar la última cuota por posibles diferencias de redondeo
-    for i, cuota in enumerate(cuotas_pendientes):
-        if i == len(cuotas_pendientes) - 1:
-            # La última cuota lleva el ajuste por redondeo
-            total_asignado = nuevo_monto_cuota * (len(cuotas_pendientes) - 1)
-            cuota.monto = round(deuda_actual - total_asignado, 2)
-        else:
-            cuota.monto = nuevo_monto_cuota
-    
-    db.session.commit()
-
-def _calcular_balance(matricula):
-    """Calcular balance total pagado y adeudado - VERSIÓN MEJORADA"""
-    monto_pagado = calcular_monto_pagado(matricula.id)
-    deuda_actual = calcular_deuda_actual(matricula)
-    
-    # Obtener información de cuotas
-    cuotas_totales = Pago.query.filter_by(matricula_id=matricula.id).count()
-    cuotas_pagadas = Pago.query.filter(
-        Pago.matricula_id == matricula.id,
-        db.or_(Pago.estado == ESTADO_PAGO_VALIDADO, Pago.es_pago_inicial == True)
-    ).count()
-    cuotas_pendientes = cuotas_totales - cuotas_pagadas
-    
-    return {
-        'total_pagado': monto_pagado,
-        'total_adeudado': deuda_actual,
-        'coste_total': matricula.coste_total,
-        'progreso': (monto_pagado / matricula.coste_total * 100) if matricula.coste_total > 0 else 0,
-        'cuotas_pagadas': cuotas_pagadas,
-        'cuotas_pendientes': cuotas_pendientes,
-        'cuotas_totales': cuotas_totales
-    }
-
 def _verificar_crear_pago_inicial(matricula):
     """Verificar y crear pago inicial si no existe"""
     try:
@@ -151,13 +74,28 @@ def _calcular_fechas_vencimiento(fecha_base, numero_cuota):
 @bp.route("/", endpoint="index")
 @login_required
 def index():
-    malabo = Matricula.query.filter_by(campus="MALABO").all()
-    bata = Matricula.query.filter_by(campus="BATA").all()
+    # El saldo va guardado en cada matrícula: filtrar y ordenar por deuda
+    # usa directamente el índice de matriculas.deuda_actual
+    con_deuda = request.args.get("con_deuda") == "1"
+    orden = request.args.get("orden", "nombre")
+
+    q = Matricula.query.options(*opciones("saldos"))
+    if con_deuda:
+        q = q.filter(Matricula.deuda_actual > 0)
+    if orden == "deuda":
+        q = q.order_by(Matricula.deuda_actual.desc(), Matricula.id)
+    else:
+        q = q.order_by(Matricula.estudiante_nombre, Matricula.id)
+
+    malabo = q.filter(Matricula.campus == "MALABO").all()
+    bata = q.filter(Matricula.campus == "BATA").all()
 
     return render_template(
         "pagos/index.html",
         malabo=malabo,
-        bata=bata
+        bata=bata,
+        con_deuda=con_deuda,
+        orden=orden
     )
 
 # -------------------------------------------------------------
@@ -174,22 +112,19 @@ def ficha(matricula_id):
     # Obtener todos los pagos de la matrícula
     pagos = Pago.query.filter_by(matricula_id=matricula_id).order_by(Pago.numero_cuota).all()
     
-    # Obtener pago inicial
-    pago_inicial = Pago.query.filter_by(matricula_id=matricula_id, es_pago_inicial=True).first()
-    
-    # Calcular información financiera actualizada
-    monto_pagado = calcular_monto_pagado(matricula_id)
-    deuda_actual = calcular_deuda_actual(matricula)
-    cuotas_pendientes = obtener_cuotas_pendientes(matricula_id)
+    # Pago inicial y cuotas pendientes salen de la misma lista
+    pago_inicial = next((p for p in pagos if p.es_pago_inicial), None)
+    cuotas_pendientes = [p for p in pagos if p.estado == ESTADO_PAGO_PENDIENTE]
     
-    balance = _calcular_balance(matricula)
+    # Información financiera: saldo guardado en la matrícula
+    monto_pagado = matricula.total_pagado
+    deuda_actual = matricula.deuda_actual
     
     return render_template(
         "pagos/ficha_pago.html", 
         m=matricula, 
         pagos=pagos,
         pago_inicial=pago_inicial,
-        balance=balance,
         monto_pagado=monto_pagado,
         deuda_actual=deuda_actual,
         cuotas_pendientes=cuotas_pendientes,
@@ -201,6 +136,7 @@ def ficha(matricula_id):
 # -------------------------------------------------------------
 @bp.route("/registrar/<int:pago_id>", methods=["POST"], endpoint="registrar_pago")
 @login_required
+@limite_subida(MAX_FILE_MB)
 def registrar_pago(pago_id):
     pago = Pago.query.get_or_404(pago_id)
     
@@ -215,26 +151,19 @@ def registrar_pago(pago_id):
         flash("Debe adjuntar un comprobante de pago.", "danger")
         return redirect(url_for("pagos.ficha", matricula_id=pago.matricula_id))
     
-    if not allowed_file(file.filename):
+    # El tamaño ya se ha limitado al recibirlo (@limite_subida)
+    tipo = tipo_real(file)
+    if tipo not in TIPOS_PERMITIDOS:
         flash("Formato de archivo no permitido. Use PDF, JPG o PNG.", "danger")
         return redirect(url_for("pagos.ficha", matricula_id=pago.matricula_id))
     
-    # Verificar tamaño del archivo
-    file.seek(0, os.SEEK_END)
-    size_mb = file.tell() / (1024 * 1024)
-    file.seek(0)
-    if size_mb > MAX_FILE_MB:
-        flash(f"El archivo supera {MAX_FILE_MB} MB.", "danger")
-        return redirect(url_for("pagos.ficha", matricula_id=pago.matricula_id))
-    
-    # Guardar archivo
-    upload_dir = ensure_upload_dir()
-    filename = secure_filename(f"pago_{pago.id}_{datetime.utcnow().timestamp()}_{file.filename}")
-    filepath = os.path.join(upload_dir, filename)
-    file.save(filepath)
+    # Guardar archivo (almacén por contenido: el mismo recibo subido dos veces se guarda una)
+    pago.comprobante_sha256 = storage.guardar(file)
+    pago.comprobante_path = None
+    pago.factura_nombre = nombre_seguro(file, tipo)
+    encolar_miniatura(pago.comprobante_sha256)
     
     # Actualizar pago
-    pago.comprobante_path = filepath
     pago.fecha_pago = date.today()
     pago.estado = ESTADO_PAGO_PENDIENTE_VALIDACION
     
@@ -252,8 +181,8 @@ def detalles_pago(pago_id):
     pago = Pago.query.get_or_404(pago_id)
     
     # Calcular información financiera para el contexto
-    monto_pagado = calcular_monto_pagado(pago.matricula_id)
-    deuda_actual = calcular_deuda_actual(pago.matricula)
+    monto_pagado = pago.matricula.total_pagado
+    deuda_actual = pago.matricula.deuda_actual
     
     return render_template("pagos/detalles_pago.html", 
                          pago=pago,
@@ -265,6 +194,7 @@ def detalles_pago(pago_id):
 # -------------------------------------------------------------
 @bp.route("/editar/<int:pago_id>", methods=["GET", "POST"], endpoint="editar_pago")
 @login_required
+@limite_subida(MAX_FILE_MB)
 def editar_pago(pago_id):
     pago = Pago.query.get_or_404(pago_id)
     
@@ -279,19 +209,14 @@ def editar_pago(pago_id):
             flash("Debe adjuntar un comprobante de pago.", "danger")
             return redirect(url_for("pagos.editar_pago", pago_id=pago.id))
         
-        if not allowed_file(file.filename):
+        # El tamaño ya se ha limitado al recibirlo (@limite_subida)
+        tipo = tipo_real(file)
+        if tipo not in TIPOS_PERMITIDOS:
             flash("Formato de archivo no permitido. Use PDF, JPG o PNG.", "danger")
             return redirect(url_for("pagos.editar_pago", pago_id=pago.id))
         
-        # Verificar tamaño del archivo
-        file.seek(0, os.SEEK_END)
-        size_mb = file.tell() / (1024 * 1024)
-        file.seek(0)
-        if size_mb > MAX_FILE_MB:
-            flash(f"El archivo supera {MAX_FILE_MB} MB.", "danger")
-            return redirect(url_for("pagos.editar_pago", pago_id=pago.id))
-        
-        # Eliminar archivo anterior si existe
+        # Eliminar archivo anterior si es de antes del almacén
+        # (los del almacén se liberan solos al dejar de estar referenciados)
         if pago.comprobante_path and os.path.exists(pago.comprobante_path):
             try:
                 os.remove(pago.comprobante_path)
@@ -299,13 +224,12 @@ def editar_pago(pago_id):
                 pass
         
         # Guardar nuevo archivo
-        upload_dir = ensure_upload_dir()
-        filename = secure_filename(f"pago_{pago.id}_{datetime.utcnow().timestamp()}_{file.filename}")
-        filepath = os.path.join(upload_dir, filename)
-        file.save(filepath)
+        pago.comprobante_sha256 = storage.guardar(file)
+        pago.comprobante_path = None
+        pago.factura_nombre = nombre_seguro(file, tipo)
+        encolar_miniatura(pago.comprobante_sha256)
         
         # Actualizar pago
-        pago.comprobante_path = filepath
         pago.fecha_pago = date.today()
         pago.estado = ESTADO_PAGO_PENDIENTE_VALIDACION
         pago.motivo_rechazo = None
@@ -325,10 +249,21 @@ def editar_pago(pago_id):
 def ver_comprobante(pago_id):
     pago = Pago.query.get_or_404(pago_id)
     
-    if not pago.comprobante_path or not os.path.exists(pago.comprobante_path):
+    if not pago.comprobante_ruta or not os.path.exists(pago.comprobante_ruta):
         abort(404)
     
-    return send_file(pago.comprobante_path, as_attachment=False)
+    # El nombre también da el tipo MIME: en el almacén el fichero no tiene extensión
+    nombre = pago.factura_nombre or os.path.basename(pago.comprobante_ruta)
+    return enviar_archivo(pago.comprobante_ruta, nombre, etag=pago.comprobante_sha256)
+
+# -------------------------------------------------------------
+# 🖼️ MINIATURA DEL COMPROBANTE
+# -------------------------------------------------------------
+@bp.route("/comprobante/<int:pago_id>/miniatura", endpoint="miniatura_comprobante")
+@login_required
+def miniatura_comprobante(pago_id):
+    pago = Pago.query.get_or_404(pago_id)
+    return responder_miniatura(pago.comprobante_sha256)
 
 # -------------------------------------------------------------
 # 📥 DESCARGAR COMPROBANTE
@@ -338,7 +273,8 @@ def ver_comprobante(pago_id):
 def descargar_comprobante(pago_id):
     pago = Pago.query.get_or_404(pago_id)
     
-    if not pago.comprobante_path or not os.path.exists(pago.comprobante_path):
+    if not pago.comprobante_ruta or not os.path.exists(pago.comprobante_ruta):
         abort(404)
     
-    return send_file(pago.comprobante_path, as_attachment=True, download_name=os.path.basename(pago.comprobante_path))
\ No newline at end of file
+    nombre = pago.factura_nombre or os.path.basename(pago.comprobante_ruta)
+    return enviar_archivo(pago.comprobante_ruta, nombre, as_attachment=True, etag=pago.comprobante_sha256)
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""
+Instrumentación de rendimiento por endpoint (opcional, `PERF_ENABLED`).
+
+Por cada petición se mide:
+- nº de consultas SQL y tiempo total en la base de datos,
+- la consulta más lenta,
+- nº de objetos ORM cargados (tamaño del resultado),
+- tiempo total de la petición.
+
+Las muestras se guardan en un buffer circular en memoria (uno por worker) y se
+consultan en /admin/perf. Cada respuesta lleva además una cabecera
+`Server-Timing` que muestran las herramientas de desarrollo del navegador.
+
+Un endpoint se marca como sospechoso de N+1 cuando, entre sus muestras, el nº
+de consultas crece a la par que el nº de objetos cargados.
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from flask import g, has_request_context, request, request_started, request_finished
+from sqlalchemy import event
+
+_INFO_INICIO = "perf_inicio"
+
+
+@dataclass
+class Muestra:
+    endpoint: str
+    metodo: str
+    ruta: str
+    status: int
+    consultas: int
+    sql_ms: float
+    total_ms: float
+    filas: int
+    lenta_ms: float = 0.0
+    lenta_sql: str = ""
+    cuando: Optional[datetime] = None
+
+
+@dataclass
+class ResumenEndpoint:
+    endpoint: str
+    peticiones: int
+    total_ms_medio: float
+    total_ms_max: float
+    sql_ms_medio: float
+    consultas_media: float
+    consultas_max: int
+    filas_max: int
+    lenta_ms: float
+    lenta_sql: str
+    sospechoso_n1: bool
+
+
+def _correlacion(xs, ys) -> float:
+    """Coeficiente de Pearson (0 si alguna serie es constante)."""
+    n = len(xs)
+    mx, my = sum(xs) / n, sum(ys) / n
+    sxy = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+    sxx = sum((x - mx) ** 2 for x in xs)
+    syy = sum((y - my) ** 2 for y in ys)
+    if not sxx or not syy:
+        return 0.0
+    return sxy / (sxx * syy) ** 0.5
+
+
+def escala_con_resultado(muestras: List[Muestra], min_distintos=3, min_correlacion=0.9, min_rango=3) -> bool:
+    """
+    True si el nº de consultas del endpoint crece con el nº de filas cargadas:
+    al menos `min_distintos` tamaños de resultado distintos, correlación alta y
+    una diferencia de al menos `min_rango` consultas entre la menor y la mayor.
+    """
+    if len({m.filas for m in muestras}) < min_distintos:
+        return False
+    consultas = [m.consultas for m in muestras]
+    if max(consultas) - min(consultas) < min_rango:
+        return False
+    return _correlacion([m.filas for m in muestras], consultas) >= min_correlacion
+
+
+class Perf:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.muestras = deque(maxlen=500)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("PERF_ENABLED", False)
+        self.muestras = deque(maxlen=app.config.get("PERF_BUFFER_SIZE", 500))
+        app.extensions["perf"] = self
+        if not self.enabled:
+            return
+
+        request_started.connect(self._inicio_peticion, app)
+        request_finished.connect(self._fin_peticion, app)
+        with app.app_context():
+            from app.extensions import db
+            _registrar_sql(db.engine)
+        _registrar_cargas()
+
+    # --- Señales de Flask ---
+    def _inicio_peticion(self, sender, **extra):
+        g.perf = {"inicio": time.perf_counter(), "consultas": 0, "sql": 0.0,
+                  "filas": 0, "lenta": 0.0, "lenta_sql": ""}
+
+    def _fin_peticion(self, sender, response, **extra):
+        datos = g.pop("perf", None)
+        if datos is None or request.endpoint in (None, "static"):
+            return
+        total_ms = (time.perf_counter() - datos["inicio"]) * 1000
+        sql_ms = datos["sql"] * 1000
+
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={sql_ms:.1f};desc="{datos["consultas"]} consultas", app;dur={total_ms:.1f}',
+        )
+        self.registrar(Muestra(
+            endpoint=request.endpoint,
+            metodo=request.method,
+            ruta=request.full_path.rstrip("?"),
+            status=response.status_code,
+            consultas=datos["consultas"],
+            sql_ms=sql_ms,
+            total_ms=total_ms,
+            filas=datos["filas"],
+            lenta_ms=datos["lenta"] * 1000,
+            lenta_sql=datos["lenta_sql"],
+            cuando=datetime.utcnow(),
+        ))
+
+    # --- Buffer ---
+    def registrar(self, muestra: Muestra):
+        with self._lock:
+            self.muestras.append(muestra)
+
+    def recientes(self, limite=50) -> List[Muestra]:
+        with self._lock:
+            copia = list(self.muestras)
+        return list(reversed(copia[-limite:]))
+
+    def resumen(self) -> List[ResumenEndpoint]:
+        """Agregado por endpoint, del más lento al más rápido (tiempo medio)."""
+        with self._lock:
+            copia = list(self.muestras)
+        por_endpoint = {}
+        for m in copia:
+            por_endpoint.setdefault(m.endpoint, []).append(m)
+
+        resumen = []
+        for endpoint, ms in por_endpoint.items():
+            lenta = max(ms, key=lambda m: m.lenta_ms)
+            n = len(ms)
+            resumen.append(ResumenEndpoint(
+                endpoint=endpoint,
+                peticiones=n,
+                total_ms_medio=sum(m.total_ms for m in ms) / n,
+                total_ms_max=max(m.total_ms for m in ms),
+                sql_ms_medio=sum(m.sql_ms for m in ms) / n,
+                consultas_media=sum(m.consultas for m in ms) / n,
+                consultas_max=max(m.consultas for m in ms),
+                filas_max=max(m.filas for m in ms),
+                lenta_ms=lenta.lenta_ms,
+                lenta_sql=lenta.lenta_sql,
+                sospechoso_n1=escala_con_resultado(ms),
+            ))
+        resumen.sort(key=lambda r: r.total_ms_medio, reverse=True)
+        return resumen
+
+    def vaciar(self):
+        with self._lock:
+            self.muestras.clear()
+
+
+# ----------------- Hooks de SQLAlchemy -----------------
+def _datos_peticion():
+    return g.get("perf") if has_request_context() else None
+
+
+def _registrar_sql(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(_INFO_INICIO, []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        inicio = conn.info[_INFO_INICIO].pop()
+        datos = _datos_peticion()
+        if datos is None:
+            return
+        duracion = time.perf_counter() - inicio
+        datos["consultas"] += 1
+        datos["sql"] += duracion
+        if duracion > datos["lenta"]:
+            datos["lenta"] = duracion
+            datos["lenta_sql"] = statement
+
+
+_cargas_registradas = False
+
+
+def _registrar_cargas():
+    """Cuenta los objetos ORM cargados en la petición (tamaño del resultado)."""
+    global _cargas_registradas
+    if _cargas_registradas:
+        return
+    _cargas_registradas = True
+
+    from app.extensions import db
+
+    @event.listens_for(db.Model, "load", propagate=True)
+    def _cargado(target, context):
+        datos = _datos_peticion()
+        if datos is not None:
+            datos["filas"] += 1
@@ -2,6 +2,7 @@ from flask import render_template, redirect, url_for, flash
 from flask_login import login_required, current_user
 from app.extensions import db
 from app.perfil.forms import PerfilForm, CambiarContrasenaForm
+from app.usuarios.identidad import renovar_sesion
 
 from app.perfil import bp
 
@@ -9,7 +10,9 @@ from app.perfil import bp
 @bp.route("/ver")
 @login_required
 def ver_perfil():
-    return render_template("perfil/ver.html", usuario=current_user)
+    # Últimas acciones (índice usuario_id + fecha_hora; lo antiguo está archivado)
+    actividades = current_user.actividades.limit(10).all()
+    return render_template("perfil/ver.html", usuario=current_user, actividades=actividades)
 
 
 @bp.route("/editar", methods=["GET", "POST"])
@@ -36,6 +39,8 @@ def cambiar_contrasena():
         else:
             current_user.set_password(form.nueva_contrasena.data)
             db.session.commit()
+            # Las demás sesiones de este usuario dejan de valer; esta no
+            renovar_sesion(current_user._get_current_object())
             flash("Contraseña actualizada correctamente.", "success")
             return redirect(url_for("perfil.ver_perfil"))
     return render_template("perfil/cambiar_contrasena.html", form=form)
@@ -1,4 +1,3 @@
-from datetime import datetime
 import click
 from flask.cli import with_appcontext
 from app import db
@@ -25,8 +24,6 @@ def seed_datos_iniciales():
             full_name="Administrador del Sistema",
             email="admin@bbs.edu",
             activo=True,
-            sesion_activa=False,
-            ultimo_login=datetime.utcnow(),
         )
         admin.set_password("admin123")
 
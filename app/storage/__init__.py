@@ -0,0 +1,9 @@
+"""
+Almacén de ficheros subidos por contenido (SHA-256), con deduplicación.
+
+- almacen.py:     extensión `Storage` (guardar / ruta_local) y escritura atómica.
+- backends.py:    disco local y S3 compatible.
+- models.py:      tabla `blobs` con la cuenta de referencias.
+- referencias.py: listeners de refcount, recolección e importación (CLI).
+"""
+from .almacen import Storage  # noqa: F401
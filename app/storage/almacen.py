@@ -0,0 +1,122 @@
+"""
+Almacén de ficheros subidos, direccionado por contenido.
+
+Cada fichero se guarda una sola vez con su SHA-256 como nombre: si un alumno
+vuelve a subir el mismo DNI o el mismo recibo, no ocupa más disco. Las filas
+que usan el fichero guardan solo el hash (p.ej. `MatriculaDocumento.sha256`)
+y la tabla `blobs` lleva la cuenta de referencias (ver referencias.py).
+
+    sha = storage.guardar(request.files["archivo"])   # hash mientras se escribe
+    doc.sha256 = sha
+    db.session.commit()
+    ...
+    enviar_archivo(storage.ruta_local(doc.sha256), doc.filename, etag=doc.sha256)   # entrega.py
+
+La escritura es atómica: se escribe en un temporal del mismo sistema de
+ficheros y se renombra, así que nunca hay un objeto a medio escribir con su
+nombre definitivo.
+
+Backends (config `STORAGE_BACKEND`): "local" (disco) o "s3" (S3 o compatible).
+"""
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+
+from .backends import LocalBackend, S3Backend
+from .subidas import ArchivoEntrante
+
+TAM_BLOQUE = 64 * 1024
+
+
+class Storage:
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        tipo = app.config.get("STORAGE_BACKEND", "local").lower()
+        directorio = app.config.get("STORAGE_DIR") or os.path.join(app.config["UPLOAD_FOLDER"], "objetos")
+        if tipo == "s3":
+            self.backend = S3Backend(
+                bucket=app.config["STORAGE_S3_BUCKET"],
+                directorio_cache=app.config.get("STORAGE_CACHE_DIR") or os.path.join(app.instance_path, "storage-cache"),
+                endpoint_url=app.config.get("STORAGE_S3_ENDPOINT"),
+                prefijo=app.config.get("STORAGE_S3_PREFIX", ""),
+                region=app.config.get("STORAGE_S3_REGION"),
+            )
+        else:
+            self.backend = LocalBackend(directorio)
+        app.extensions["storage"] = self
+
+    # --- Escritura ---
+    def guardar(self, origen) -> str:
+        """
+        Guarda el contenido de `origen` (FileStorage o fichero binario abierto)
+        y devuelve su SHA-256. Registra el blob en la sesión actual (sin commit);
+        la referencia la cuenta el listener al guardar la fila que use el hash.
+
+        Si viene de una subida (ArchivoEntrante) ya está en un temporal con el
+        hash calculado: solo se mueve, sin volver a leerlo.
+        """
+        flujo = getattr(origen, "stream", origen)
+        if isinstance(flujo, ArchivoEntrante) and not flujo.closed:
+            clave, tamano = flujo.sha256, flujo.tamano
+            self.backend.escribir(clave, flujo.entregar())
+            _registrar_blob(clave, tamano)
+            return clave
+
+        sha = hashlib.sha256()
+        tamano = 0
+        fd, tmp = tempfile.mkstemp(dir=self.backend.directorio_temporal)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    bloque = flujo.read(TAM_BLOQUE)
+                    if not bloque:
+                        break
+                    sha.update(bloque)
+                    f.write(bloque)
+                    tamano += len(bloque)
+            clave = sha.hexdigest()
+            self.backend.escribir(clave, tmp)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        _registrar_blob(clave, tamano)
+        return clave
+
+    def guardar_ruta(self, ruta: str) -> str:
+        """Igual que guardar() pero a partir de un fichero del disco (que no se toca)."""
+        with open(ruta, "rb") as f:
+            return self.guardar(f)
+
+    # --- Lectura ---
+    def ruta_local(self, clave: str) -> str:
+        return self.backend.ruta_local(clave)
+
+    def existe(self, clave: str) -> bool:
+        return self.backend.existe(clave)
+
+    def abrir(self, clave: str):
+        return open(self.ruta_local(clave), "rb")
+
+
+def _registrar_blob(clave: str, tamano: int):
+    """Crea la fila del blob si no existe y refresca `actualizado_en` (la protege de la recolección)."""
+    from sqlalchemy.dialects import postgresql, sqlite
+    from app.extensions import db
+    from .models import Blob
+
+    tabla = Blob.__table__
+    ahora = datetime.utcnow()
+    connection = db.session.connection()
+    dialecto = {"postgresql": postgresql, "sqlite": sqlite}.get(connection.dialect.name)
+    if dialecto is not None:
+        stmt = dialecto.insert(tabla).values(sha256=clave, tamano=tamano, refcount=0, creado_en=ahora, actualizado_en=ahora)
+        connection.execute(stmt.on_conflict_do_update(index_elements=["sha256"], set_={"actualizado_en": ahora}))
+        return
+    res = connection.execute(tabla.update().where(tabla.c.sha256 == clave).values(actualizado_en=ahora))
+    if res.rowcount == 0:
+        connection.execute(tabla.insert().values(sha256=clave, tamano=tamano, refcount=0, creado_en=ahora, actualizado_en=ahora))
@@ -0,0 +1,134 @@
+"""
+Backends del almacén de ficheros. Interfaz común:
+
+- escribir(clave, origen): mueve/sube el fichero temporal `origen` a `clave`
+  (si la clave ya existe no hace nada: el contenido es el mismo) y lo borra.
+- ruta_local(clave): ruta de un fichero local con el contenido.
+- existe(clave), borrar(clave).
+- listar(): (clave, mtime) de todos los objetos, para la recolección.
+- directorio_temporal: dónde crear los temporales (mismo sistema de ficheros
+  que los objetos, para que el rename sea atómico).
+"""
+import os
+import tempfile
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+
+def _subruta(clave: str) -> str:
+    # 2 niveles de carpetas: evita directorios con cientos de miles de ficheros
+    return os.path.join(clave[:2], clave[2:4], clave)
+
+
+def _fsync_y_mover(origen: str, destino: str):
+    with open(origen, "rb") as f:
+        os.fsync(f.fileno())
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    os.replace(origen, destino)
+
+
+class LocalBackend:
+    """Objetos en disco local: <directorio>/ab/cd/<sha256>."""
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        self.directorio_temporal = os.path.join(directorio, "tmp")
+        os.makedirs(self.directorio_temporal, exist_ok=True)
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, _subruta(clave))
+
+    def existe(self, clave: str) -> bool:
+        return os.path.exists(self._ruta(clave))
+
+    def escribir(self, clave: str, origen: str):
+        destino = self._ruta(clave)
+        if os.path.exists(destino):
+            os.remove(origen)  # ya lo tenemos: deduplicado
+            return
+        _fsync_y_mover(origen, destino)
+
+    def ruta_local(self, clave: str) -> str:
+        return self._ruta(clave)
+
+    def borrar(self, clave: str):
+        try:
+            os.remove(self._ruta(clave))
+        except FileNotFoundError:
+            pass
+
+    def listar(self) -> Iterator[Tuple[str, datetime]]:
+        for raiz, dirs, ficheros in os.walk(self.directorio):
+            if os.path.abspath(raiz) == os.path.abspath(self.directorio_temporal):
+                dirs[:] = []
+                continue
+            for nombre in ficheros:
+                if len(nombre) == 64:
+                    mtime = os.path.getmtime(os.path.join(raiz, nombre))
+                    yield nombre, datetime.utcfromtimestamp(mtime)
+
+
+class S3Backend:
+    """
+    Objetos en un bucket S3 o compatible (MinIO, Ceph, R2...): <prefijo>ab/<sha256>.
+
+    Para leerlos se descargan a una caché local (también por hash, así que
+    nunca queda obsoleta). Las credenciales se toman de las variables
+    estándar de AWS (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY).
+    """
+
+    def __init__(self, bucket: str, directorio_cache: str, endpoint_url: Optional[str] = None,
+                 prefijo: str = "", region: Optional[str] = None):
+        try:
+            import boto3
+        except ImportError as e:  # dependencia opcional
+            raise RuntimeError("STORAGE_BACKEND=s3 necesita el paquete boto3 (pip install boto3)") from e
+        self.bucket = bucket
+        self.prefijo = prefijo
+        self.cache = LocalBackend(directorio_cache)
+        self.directorio_temporal = self.cache.directorio_temporal
+        self.cliente = boto3.client("s3", endpoint_url=endpoint_url or None, region_name=region or None)
+
+    def _clave_s3(self, clave: str) -> str:
+        return f"{self.prefijo}{clave[:2]}/{clave}"
+
+    def existe(self, clave: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.cliente.head_object(Bucket=self.bucket, Key=self._clave_s3(clave))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def escribir(self, clave: str, origen: str):
+        if not self.existe(clave):
+            self.cliente.upload_file(origen, self.bucket, self._clave_s3(clave))
+        # Lo dejamos en la caché local: lo normal es que se lea enseguida
+        self.cache.escribir(clave, origen)
+
+    def ruta_local(self, clave: str) -> str:
+        ruta = self.cache.ruta_local(clave)
+        if not os.path.exists(ruta):
+            fd, tmp = tempfile.mkstemp(dir=self.directorio_temporal)
+            os.close(fd)
+            try:
+                self.cliente.download_file(self.bucket, self._clave_s3(clave), tmp)
+                self.cache.escribir(clave, tmp)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        return ruta
+
+    def borrar(self, clave: str):
+        self.cliente.delete_object(Bucket=self.bucket, Key=self._clave_s3(clave))
+        self.cache.borrar(clave)
+
+    def listar(self) -> Iterator[Tuple[str, datetime]]:
+        paginas = self.cliente.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=self.prefijo)
+        for pagina in paginas:
+            for obj in pagina.get("Contents", []):
+                nombre = obj["Key"].rsplit("/", 1)[-1]
+                if len(nombre) == 64:
+                    yield nombre, obj["LastModified"].replace(tzinfo=None)
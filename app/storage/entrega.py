@@ -0,0 +1,101 @@
+"""
+Entrega de ficheros al navegador (comprobantes, documentos, exportaciones).
+
+Según `ENTREGA_ARCHIVOS`:
+
+- "python" (por defecto): send_file con Range y respuestas condicionales.
+  La ETag de un fichero del almacén es su SHA-256, así que al volver a abrir
+  un comprobante el navegador recibe un 304 sin cuerpo.
+- "x-accel-redirect" (nginx delante): la aplicación comprueba permisos y
+  solo devuelve la cabecera `X-Accel-Redirect`; los bytes los manda nginx y
+  el worker de gunicorn queda libre. Las rutas locales se traducen a
+  locations `internal` con `ENTREGA_X_ACCEL_MAPA`.
+- "x-sendfile" (Apache mod_xsendfile, lighttpd): cabecera `X-Sendfile` con
+  la ruta absoluta.
+
+Un fichero fuera de las carpetas mapeadas se sirve siempre desde Python.
+En todos los casos la respuesta es `Cache-Control: private, no-cache`: los
+ficheros son personales y el navegador revalida con la ETag.
+"""
+import mimetypes
+import os
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from flask import current_app, request, send_file
+from werkzeug.utils import send_file as werkzeug_send_file
+
+from app.zipstream import nombre_adjunto
+
+def _mapa_x_accel() -> Dict[str, str]:
+    """
+    {carpeta local: prefijo interno}. Formato de ENTREGA_X_ACCEL_MAPA:
+    "/srv/app/instance/uploads=/_protegido/uploads/;/srv/app/instance/exports=/_protegido/exports/".
+    Sin configurar: uploads, exports y miniaturas de la instancia.
+    """
+    valor = current_app.config.get("ENTREGA_X_ACCEL_MAPA")
+    if not valor:
+        return {
+            current_app.config["UPLOAD_FOLDER"]: "/_protegido/uploads/",
+            os.path.join(current_app.instance_path, "exports"): "/_protegido/exports/",
+            os.path.join(current_app.instance_path, "miniaturas"): "/_protegido/miniaturas/",
+        }
+    mapa = {}
+    for par in valor.split(";"):
+        if "=" in par:
+            local, interno = par.split("=", 1)
+            mapa[local.strip()] = interno.strip()
+    return mapa
+
+
+def uri_interna(ruta: str) -> Optional[str]:
+    """Location interna de nginx para `ruta`, o None si no está en ninguna carpeta mapeada."""
+    ruta = os.path.realpath(ruta)
+    for local, interno in _mapa_x_accel().items():
+        local = os.path.realpath(local)
+        if ruta.startswith(local + os.sep):
+            relativa = os.path.relpath(ruta, local).replace(os.sep, "/")
+            return interno.rstrip("/") + "/" + quote(relativa)
+    return None
+
+
+def _x_accel(ruta: str, interno: str, nombre: str, mimetype: str, as_attachment: bool, etag):
+    rv = current_app.response_class(mimetype=mimetype)
+    rv.headers["X-Accel-Redirect"] = interno
+    rv.headers.set("Content-Disposition", "attachment" if as_attachment else "inline", **nombre_adjunto(nombre))
+    st = os.stat(ruta)
+    rv.set_etag(etag or f"{int(st.st_mtime)}-{st.st_size}")
+    rv.last_modified = int(st.st_mtime)
+    # El 304 lo damos aquí mismo; si no, nginx envía el fichero (y atiende Range)
+    rv = rv.make_conditional(request)
+    if rv.status_code == 304:
+        del rv.headers["X-Accel-Redirect"]
+    return rv
+
+
+def enviar_archivo(ruta: str, nombre: str, as_attachment: bool = False,
+                   etag: Optional[str] = None, mimetype: Optional[str] = None):
+    """
+    Respuesta con el fichero `ruta`, presentado como `nombre` (también da el
+    tipo MIME: en el almacén los ficheros no tienen extensión). `etag` debe
+    ser el SHA-256 si se conoce.
+    """
+    mimetype = mimetype or mimetypes.guess_type(nombre)[0] or "application/octet-stream"
+    modo = current_app.config.get("ENTREGA_ARCHIVOS", "python")
+
+    interno = uri_interna(ruta) if modo == "x-accel-redirect" else None
+    if interno:
+        rv = _x_accel(ruta, interno, nombre, mimetype, as_attachment, etag)
+    elif modo == "x-sendfile":
+        rv = werkzeug_send_file(
+            ruta, request.environ, mimetype=mimetype, as_attachment=as_attachment,
+            download_name=nombre, etag=etag or True, use_x_sendfile=True,
+            response_class=current_app.response_class,
+        )
+    else:
+        rv = send_file(ruta, mimetype=mimetype, as_attachment=as_attachment,
+                       download_name=nombre, etag=etag or True)
+
+    rv.cache_control.private = True
+    rv.cache_control.no_cache = True
+    return rv
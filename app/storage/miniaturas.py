@@ -0,0 +1,155 @@
+"""
+Miniaturas de los ficheros del almacén (comprobantes, documentos).
+
+Las pantallas de validación muestran docenas de comprobantes: en vez de
+cargar cada PDF o foto original, se enseña una miniatura JPEG pequeña
+(primera página en los PDF). Se generan fuera de la petición, con la cola
+de trabajos, justo después de la subida:
+
+    pago.comprobante_sha256 = storage.guardar(file)
+    encolar_miniatura(pago.comprobante_sha256)
+    db.session.commit()
+
+Como el almacén es por contenido, la miniatura va por hash
+(`MINIATURAS_DIR/ab/<sha256>_<tam>.jpg`): un recibo subido diez veces se
+procesa una. Si falta Pillow (o pypdfium2 para los PDF) no se generan y las
+plantillas muestran solo el enlace, como antes.
+
+`flask miniaturas-generar` encola las de los ficheros subidos antes.
+"""
+import os
+import tempfile
+from typing import Optional
+
+import click
+from flask import current_app, abort
+from flask.cli import with_appcontext
+from sqlalchemy import select
+
+from app.extensions import db, storage
+from app.trabajos.cola import tarea, encolar
+from .subidas import detectar_tipo, TAM_CABECERA
+from .entrega import enviar_archivo
+
+# Lado mayor de la miniatura, en píxeles
+TAM = 320
+CALIDAD_JPEG = 75
+
+
+def directorio_miniaturas() -> str:
+    return current_app.config.get("MINIATURAS_DIR") or os.path.join(current_app.instance_path, "miniaturas")
+
+
+def ruta_miniatura(sha256: str) -> str:
+    return os.path.join(directorio_miniaturas(), sha256[:2], f"{sha256}_{TAM}.jpg")
+
+
+def existe_miniatura(sha256: Optional[str]) -> bool:
+    return bool(sha256) and os.path.exists(ruta_miniatura(sha256))
+
+
+def soportado(tipo: Optional[str]) -> bool:
+    """True si hay con qué generar la miniatura de ese tipo (dependencias opcionales)."""
+    try:
+        import PIL  # noqa: F401
+        if tipo == "pdf":
+            import pypdfium2  # noqa: F401
+    except ImportError:
+        return False
+    return tipo in ("pdf", "png", "jpg")
+
+
+# ----------------- Generación -----------------
+def _imagen_pdf(ruta: str):
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(ruta)
+    try:
+        pagina = pdf[0]
+        ancho, alto = pagina.get_size()
+        return pagina.render(scale=TAM / max(ancho, alto)).to_pil()
+    finally:
+        pdf.close()
+
+
+def _imagen(ruta: str):
+    from PIL import Image, ImageOps
+    img = Image.open(ruta)
+    img.draft("RGB", (TAM, TAM))  # JPEG: decodifica ya reducido
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((TAM, TAM))
+    return img
+
+
+def generar(sha256: str) -> Optional[str]:
+    """Genera la miniatura de un blob si no existe. Devuelve su ruta o None si no se puede."""
+    destino = ruta_miniatura(sha256)
+    if os.path.exists(destino):
+        return destino
+    origen = storage.ruta_local(sha256)
+    if not os.path.exists(origen):
+        return None
+    with open(origen, "rb") as f:
+        tipo = detectar_tipo(f.read(TAM_CABECERA))
+    if not soportado(tipo):
+        return None
+
+    try:
+        img = _imagen_pdf(origen) if tipo == "pdf" else _imagen(origen)
+    except Exception as e:  # fichero dañado: reintentar no lo arregla
+        current_app.logger.warning("Miniatura de %s no generada: %s", sha256, e)
+        return None
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, "JPEG", quality=CALIDAD_JPEG, optimize=True)
+        os.replace(tmp, destino)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return destino
+
+
+@tarea("storage.miniatura")
+def generar_tarea(sha256: str):
+    return {"miniatura": bool(generar(sha256))}
+
+
+def encolar_miniatura(sha256: Optional[str]):
+    """Encola la miniatura de un fichero recién subido (el llamador hace commit)."""
+    if not sha256 or existe_miniatura(sha256):
+        return None
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return None
+    return encolar("storage.miniatura", sha256=sha256)
+
+
+# ----------------- Entrega -----------------
+def responder_miniatura(sha256: Optional[str]):
+    """Respuesta con la miniatura (ETag por hash: el navegador revalida con 304), o 404 si aún no hay."""
+    if not existe_miniatura(sha256):
+        abort(404)
+    return enviar_archivo(ruta_miniatura(sha256), f"{sha256[:12]}.jpg", etag=f"{sha256}-{TAM}")
+
+
+# ----------------- Ficheros antiguos -----------------
+@click.command("miniaturas-generar")
+@click.option("--ahora", is_flag=True, help="Las genera en este proceso en vez de encolarlas.")
+@with_appcontext
+def miniaturas_generar(ahora):
+    """Encola (o genera) las miniaturas que faltan de los ficheros del almacén"""
+    from .models import Blob
+    pendientes = [s for s in db.session.execute(select(Blob.sha256)).scalars() if not existe_miniatura(s)]
+    hechas = 0
+    for sha in pendientes:
+        if ahora:
+            hechas += bool(generar(sha))
+        else:
+            hechas += encolar_miniatura(sha) is not None
+    db.session.commit()
+    click.echo(f"✅ {hechas} de {len(pendientes)} miniaturas {'generadas' if ahora else 'encoladas'}.")
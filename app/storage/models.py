@@ -0,0 +1,18 @@
+# app/storage/models.py
+from datetime import datetime
+from app.extensions import db
+
+
+class Blob(db.Model):
+    """Fichero guardado por contenido (SHA-256). `refcount` = filas que lo referencian."""
+    __tablename__ = "blobs"
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    tamano = db.Column(db.BigInteger, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    creado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Último cambio de refcount: la recolección respeta un margen desde aquí
+    actualizado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<Blob {self.sha256[:12]} refs={self.refcount}>"
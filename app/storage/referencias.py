@@ -0,0 +1,183 @@
+"""
+Cuenta de referencias de los blobs y recolección de los que ya no se usan.
+
+Cada columna que guarda un hash del almacén se declara en REFERENCIAS. Los
+listeners del ORM suman/restan en `blobs.refcount` dentro del mismo flush
+(igual que los contadores de estadísticas), así que la cuenta se confirma o
+se deshace junto con la fila que la provoca.
+
+Los objetos no se borran en el momento: `flask storage-gc` (o la tarea
+"storage.recolectar") elimina los blobs con refcount 0 pasado un margen, y
+también los objetos huérfanos que dejó una transacción deshecha.
+"""
+import os
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, select, func, update, literal
+
+from app.extensions import db, storage
+from app.trabajos.cola import tarea
+from app.matriculas.models import MatriculaDocumento
+from app.pagos.models import Pago
+from app.documentos.models import Documento
+from .models import Blob
+
+# (modelo, columna con el hash)
+REFERENCIAS = (
+    (MatriculaDocumento, "sha256"),
+    (Pago, "comprobante_sha256"),
+    (Documento, "sha256"),
+)
+
+# Un blob sin referencias se conserva al menos este tiempo (puede estar a punto de usarse)
+MARGEN_MINUTOS = 60
+
+
+# ----------------- Listeners -----------------
+def _sumar(connection, clave, delta):
+    if not clave or not delta:
+        return
+    tabla = Blob.__table__
+    connection.execute(
+        tabla.update()
+        .where(tabla.c.sha256 == clave)
+        .values(refcount=tabla.c.refcount + delta, actualizado_en=datetime.utcnow())
+    )
+
+
+def _anterior(target, columna):
+    hist = inspect(target).attrs[columna].history
+    if hist.deleted:
+        return hist.deleted[0]
+    if hist.unchanged:
+        return hist.unchanged[0]
+    return getattr(target, columna)
+
+
+def _registrar(modelo, columna):
+    @event.listens_for(modelo, "after_insert")
+    def _insert(mapper, connection, target):
+        _sumar(connection, getattr(target, columna), +1)
+
+    @event.listens_for(modelo, "after_delete")
+    def _delete(mapper, connection, target):
+        _sumar(connection, _anterior(target, columna), -1)
+
+    @event.listens_for(modelo, "after_update")
+    def _update(mapper, connection, target):
+        hist = inspect(target).attrs[columna].history
+        if not hist.has_changes():
+            return
+        _sumar(connection, hist.deleted[0] if hist.deleted else None, -1)
+        _sumar(connection, getattr(target, columna), +1)
+
+    event.listen(getattr(modelo, columna), "set", lambda *a: None, active_history=True)
+
+
+for _modelo, _columna in REFERENCIAS:
+    _registrar(_modelo, _columna)
+
+
+# ----------------- Recuento y recolección -----------------
+def recontar() -> int:
+    """Recalcula refcount desde las tablas que referencian blobs. Devuelve los blobs corregidos."""
+    tabla = Blob.__table__
+    total = literal(0)
+    for modelo, columna in REFERENCIAS:
+        col = getattr(modelo, columna)
+        total = total + select(func.count()).where(col == tabla.c.sha256).scalar_subquery()
+    res = db.session.execute(
+        update(tabla).where(tabla.c.refcount != total).values(refcount=total, actualizado_en=datetime.utcnow())
+    )
+    db.session.commit()
+    return res.rowcount
+
+
+def recolectar(margen_minutos: int = MARGEN_MINUTOS) -> dict:
+    """Borra los blobs sin referencias y los objetos sin fila en `blobs`, más viejos que el margen."""
+    limite = datetime.utcnow() - timedelta(minutes=margen_minutos)
+    borrados = 0
+    sin_uso = db.session.execute(
+        select(Blob.sha256).where(Blob.refcount <= 0, Blob.actualizado_en < limite)
+    ).scalars().all()
+    for clave in sin_uso:
+        # Condicional: si entre medias alguien lo ha vuelto a referenciar, se queda
+        res = db.session.execute(
+            Blob.__table__.delete().where(
+                Blob.sha256 == clave, Blob.refcount <= 0, Blob.actualizado_en < limite
+            )
+        )
+        db.session.commit()
+        if res.rowcount:
+            storage.backend.borrar(clave)
+            borrados += 1
+
+    huerfanos = 0
+    conocidos = set(db.session.execute(select(Blob.sha256)).scalars())
+    for clave, mtime in storage.backend.listar():
+        if clave not in conocidos and mtime < limite:
+            storage.backend.borrar(clave)
+            huerfanos += 1
+    return {"blobs": borrados, "huerfanos": huerfanos}
+
+
+@tarea("storage.recolectar")
+def recolectar_tarea(margen_minutos: int = MARGEN_MINUTOS):
+    return recolectar(margen_minutos)
+
+
+# ----------------- Importación de ficheros antiguos -----------------
+def _pendientes_de_importar():
+    """(fila, atributo hash, ruta antigua) de las filas que aún no están en el almacén."""
+    for doc in MatriculaDocumento.query.filter(MatriculaDocumento.sha256.is_(None), MatriculaDocumento.path.isnot(None)):
+        yield doc, "sha256", doc.path
+    for pago in Pago.query.filter(Pago.comprobante_sha256.is_(None), Pago.comprobante_path.isnot(None)):
+        yield pago, "comprobante_sha256", pago.comprobante_path
+    for doc in Documento.query.filter(Documento.sha256.is_(None)):
+        yield doc, "sha256", doc.ruta_legada
+
+
+def importar(borrar_originales: bool = False, lote: int = 100) -> dict:
+    importados, ausentes, originales = 0, 0, []
+    for fila, atributo, ruta in list(_pendientes_de_importar()):
+        if not ruta or not os.path.isfile(ruta):
+            ausentes += 1
+            continue
+        setattr(fila, atributo, storage.guardar_ruta(ruta))
+        originales.append(ruta)
+        importados += 1
+        if importados % lote == 0:
+            db.session.commit()
+    db.session.commit()
+
+    if borrar_originales:
+        for ruta in set(originales):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+    return {"importados": importados, "ausentes": ausentes}
+
+
+@click.command("storage-importar")
+@click.option("--borrar-originales", is_flag=True, help="Borra los ficheros antiguos una vez importados.")
+@with_appcontext
+def storage_importar(borrar_originales):
+    """Pasa al almacén por contenido los ficheros subidos antes de tenerlo"""
+    click.echo("⏳ Importando ficheros al almacén...")
+    r = importar(borrar_originales)
+    click.echo(f"✅ {r['importados']} ficheros importados; {r['ausentes']} filas sin fichero en disco.")
+
+
+@click.command("storage-gc")
+@click.option("--recontar", "recontar_antes", is_flag=True, help="Recalcula antes las referencias desde las tablas.")
+@click.option("--margen", default=MARGEN_MINUTOS, show_default=True, help="Minutos que se respeta un blob sin uso.")
+@with_appcontext
+def storage_gc(recontar_antes, margen):
+    """Borra del almacén los ficheros que ya no usa ninguna fila"""
+    if recontar_antes:
+        click.echo(f"🔢 {recontar()} blobs con la cuenta de referencias corregida.")
+    r = recolectar(margen)
+    click.echo(f"✅ {r['blobs']} blobs sin uso y {r['huerfanos']} objetos huérfanos borrados.")
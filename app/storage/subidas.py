@@ -0,0 +1,203 @@
+"""
+Subida de ficheros en streaming, sin cargar el fichero entero.
+
+Werkzeug escribe cada parte de un multipart en el objeto que devuelve
+`Request._get_file_stream`. Aquí ese objeto es un `ArchivoEntrante`, que
+mientras recibe los bloques:
+
+- los escribe ya en el directorio temporal del almacén (mismo sistema de
+  ficheros que los objetos, así que guardarlo después es solo un rename),
+- calcula el SHA-256,
+- corta con 413 en cuanto se pasa del límite de la vista, sin leer el resto,
+- conserva los primeros bytes para saber el tipo real por su firma.
+
+El límite por fichero se declara en la vista (por defecto UPLOAD_MAX_FILE_MB):
+
+    @bp.route("/registrar/<int:pago_id>", methods=["POST"])
+    @login_required
+    @limite_subida(10)
+    def registrar_pago(pago_id):
+        file = request.files.get("comprobante")
+        tipo = tipo_real(file)                     # "pdf", "png", "jpg" o None
+        pago.comprobante_sha256 = storage.guardar(file)   # sin volver a leerlo
+
+Se decide al parsear el formulario (CSRFProtect lo hace en before_request),
+por eso va como atributo de la vista y no como comprobación dentro de ella.
+"""
+import hashlib
+import os
+import tempfile
+from typing import Iterable, Optional
+
+from flask import Request, current_app, has_app_context
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+from wtforms.validators import StopValidation
+
+# Firmas (magic bytes) de los tipos que se aceptan en la aplicación
+FIRMAS = {
+    "pdf": (b"%PDF-",),
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "jpg": (b"\xff\xd8\xff",),
+}
+TAM_CABECERA = 16
+
+
+class ArchivoDemasiadoGrande(RequestEntityTooLarge):
+    def __init__(self, limite_mb: float):
+        super().__init__(f"El archivo supera {limite_mb:g} MB.")
+        self.limite_mb = limite_mb
+
+
+def detectar_tipo(cabecera: bytes) -> Optional[str]:
+    for tipo, firmas in FIRMAS.items():
+        if any(cabecera.startswith(f) for f in firmas):
+            return tipo
+    return None
+
+
+# ----------------- Fichero entrante -----------------
+class ArchivoEntrante:
+    """
+    Destino de una parte del multipart: temporal en disco + hash + límite.
+    Se comporta como un fichero binario (read/seek/tell) para FileStorage.
+    """
+
+    def __init__(self, directorio: str, limite_bytes: int):
+        fd, self.ruta = tempfile.mkstemp(dir=directorio, prefix="subida-")
+        self._f = os.fdopen(fd, "w+b")
+        self._sha = hashlib.sha256()
+        self.limite_bytes = limite_bytes
+        self.tamano = 0
+        self.cabecera = b""
+        self._entregado = False
+
+    # --- Escritura (la hace Werkzeug por bloques) ---
+    def write(self, bloque: bytes) -> int:
+        self.tamano += len(bloque)
+        if self.tamano > self.limite_bytes:
+            self.close()
+            raise ArchivoDemasiadoGrande(self.limite_bytes / (1024 * 1024))
+        if len(self.cabecera) < TAM_CABECERA:
+            self.cabecera += bloque[:TAM_CABECERA - len(self.cabecera)]
+        self._sha.update(bloque)
+        return self._f.write(bloque)
+
+    @property
+    def sha256(self) -> str:
+        return self._sha.hexdigest()
+
+    @property
+    def tipo(self) -> Optional[str]:
+        return detectar_tipo(self.cabecera)
+
+    def entregar(self) -> str:
+        """Cierra el temporal y cede su ruta (quien lo recibe lo mueve o lo borra)."""
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        self._entregado = True
+        return self.ruta
+
+    # --- Interfaz de fichero ---
+    def read(self, n: int = -1) -> bytes:
+        return self._f.read(n)
+
+    def readline(self, n: int = -1) -> bytes:
+        return self._f.readline(n)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._f.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+    def flush(self):
+        self._f.flush()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    @property
+    def closed(self) -> bool:
+        return self._f.closed
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+        if not self._entregado:
+            try:
+                os.remove(self.ruta)
+            except FileNotFoundError:
+                pass
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def __del__(self):
+        self.close()
+
+
+# ----------------- Límite por vista -----------------
+def limite_subida(mb: float):
+    """Límite por fichero (MB) de la vista; se aplica mientras se recibe."""
+    def decorador(vista):
+        vista.limite_subida_mb = mb
+        return vista
+    return decorador
+
+
+def _limite_mb(request) -> float:
+    vista = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+    return getattr(vista, "limite_subida_mb", None) or current_app.config.get("UPLOAD_MAX_FILE_MB", 10)
+
+
+class RequestSubidas(Request):
+    """Request que recibe los ficheros con ArchivoEntrante (ver app.request_class)."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not has_app_context():
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        from app.extensions import storage
+        limite = int(_limite_mb(self) * 1024 * 1024)
+        if content_length is not None and content_length > limite:
+            raise ArchivoDemasiadoGrande(limite / (1024 * 1024))
+        return ArchivoEntrante(storage.backend.directorio_temporal, limite)
+
+
+# ----------------- Tipo real -----------------
+def tipo_real(file_storage) -> Optional[str]:
+    """Tipo según los primeros bytes del contenido (no según la extensión)."""
+    flujo = getattr(file_storage, "stream", file_storage)
+    if isinstance(flujo, ArchivoEntrante):
+        return flujo.tipo
+    pos = flujo.tell()
+    cabecera = flujo.read(TAM_CABECERA)
+    flujo.seek(pos)
+    return detectar_tipo(cabecera)
+
+
+def nombre_seguro(file_storage, tipo: str) -> str:
+    """Nombre saneado con la extensión del tipo real (el navegador elige el visor por ella)."""
+    base = os.path.splitext(secure_filename(file_storage.filename or ""))[0] or "archivo"
+    return f"{base}.{tipo}"
+
+
+class ContenidoPermitido:
+    """Validador WTForms: el fichero debe ser de uno de `tipos` por su contenido."""
+
+    def __init__(self, tipos: Iterable[str], message: Optional[str] = None):
+        self.tipos = tuple(tipos)
+        self.message = message
+
+    def __call__(self, form, field):
+        if not field.data or not getattr(field.data, "filename", None):
+            return
+        if tipo_real(field.data) not in self.tipos:
+            raise StopValidation(self.message or "Tipo de archivo no permitido.")
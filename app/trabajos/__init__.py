@@ -0,0 +1,3 @@
+from flask import Blueprint
+bp = Blueprint("trabajos", __name__)
+from . import routes  # noqa
@@ -0,0 +1,358 @@
+"""
+cola.py
+Cola de trabajos en base de datos para sacar de la petición lo que es lento
+(exportaciones, recálculos masivos...).
+
+    from app.trabajos.cola import tarea, encolar
+
+    @tarea("matriculas.exportar_documentos")
+    def exportar(exportacion_id):
+        ...
+
+    encolar("matriculas.exportar_documentos", exportacion_id=exp.id)
+    db.session.commit()   # el trabajo se encola en la misma transacción
+
+Los trabajos se ejecutan:
+
+- con `flask worker` (TRABAJOS_MODO=worker): un proceso aparte con un pool
+  de hilos que reclama trabajos pendientes de la tabla `trabajos`;
+- o, si no hay worker (TRABAJOS_MODO=hilo, por defecto), en un hilo del
+  propio proceso web que arranca tras el commit que los encola; ese hilo
+  también recoge lo que haya quedado pendiente o abandonado.
+
+En ambos casos el trabajo se reclama con un UPDATE condicional (y
+FOR UPDATE SKIP LOCKED en PostgreSQL), así que nunca lo ejecutan dos hilos a
+la vez. Si una tarea lanza una excepción se reintenta con espera exponencial
+hasta `max_intentos`; un trabajo cuyo worker deja de dar latidos vuelve a la
+cola pasado TRABAJOS_TIMEOUT.
+"""
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+import click
+from flask import current_app, has_request_context
+from flask.cli import with_appcontext
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from .models import (
+    Trabajo,
+    ESTADO_TRABAJO_PENDIENTE, ESTADO_TRABAJO_EN_CURSO, ESTADO_TRABAJO_COMPLETADO, ESTADO_TRABAJO_FALLIDO,
+)
+
+MODO_WORKER = "worker"
+MODO_HILO = "hilo"
+
+TAREAS: Dict[str, Callable] = {}
+
+_INFO_ENCOLADOS = "trabajos_encolados"
+
+
+# ----------------- Registro de tareas -----------------
+def tarea(nombre: str):
+    """Registra una función como tarea ejecutable por la cola."""
+    def decorador(funcion):
+        if nombre in TAREAS and TAREAS[nombre] is not funcion:
+            raise ValueError(f"Tarea duplicada: {nombre}")
+        TAREAS[nombre] = funcion
+        return funcion
+    return decorador
+
+
+def encolar(nombre: str, max_intentos: Optional[int] = None, retraso: int = 0,
+            creado_por_id: Optional[int] = None, **args) -> Trabajo:
+    """
+    Añade un trabajo a la sesión actual. No hace commit: el trabajo se encola
+    junto con los cambios que lo provocan (si hay rollback, no se encola).
+    """
+    if nombre not in TAREAS:
+        raise ValueError(f"Tarea desconocida: {nombre}")
+    trabajo = Trabajo(
+        tarea=nombre,
+        args=args,
+        estado=ESTADO_TRABAJO_PENDIENTE,
+        max_intentos=max_intentos or current_app.config["TRABAJOS_MAX_INTENTOS"],
+        ejecutar_despues=datetime.utcnow() + timedelta(seconds=retraso),
+        creado_por_id=creado_por_id,
+    )
+    db.session.add(trabajo)
+    db.session.flush()
+    db.session.info.setdefault(_INFO_ENCOLADOS, []).append(trabajo.id)
+    return trabajo
+
+
+# ----------------- Reclamar y ejecutar -----------------
+def _id_worker() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"[:100]
+
+
+def reclamar(trabajo_id: Optional[int] = None) -> Optional[Trabajo]:
+    """
+    Marca como EN_CURSO el siguiente trabajo listo (o el indicado) y lo devuelve.
+    Devuelve None si no hay ninguno o si otro hilo se lo ha llevado antes.
+    """
+    ahora = datetime.utcnow()
+    candidatos = (
+        select(Trabajo.id)
+        .where(Trabajo.estado == ESTADO_TRABAJO_PENDIENTE, Trabajo.ejecutar_despues <= ahora)
+        .order_by(Trabajo.ejecutar_despues, Trabajo.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)  # PostgreSQL; en SQLite se ignora
+    )
+    if trabajo_id is not None:
+        candidatos = candidatos.where(Trabajo.id == trabajo_id)
+    elegido = db.session.execute(candidatos).scalar()
+    if elegido is None:
+        db.session.rollback()
+        return None
+
+    # UPDATE condicional: si otro hilo lo reclamó entre medias, no afecta a ninguna fila
+    res = db.session.execute(
+        update(Trabajo)
+        .where(Trabajo.id == elegido, Trabajo.estado == ESTADO_TRABAJO_PENDIENTE)
+        .values(
+            estado=ESTADO_TRABAJO_EN_CURSO,
+            intentos=Trabajo.intentos + 1,
+            bloqueado_por=_id_worker(),
+            bloqueado_en=ahora,
+            iniciado_en=ahora,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if res.rowcount != 1:
+        return None
+    return db.session.get(Trabajo, elegido)
+
+
+def _latir(trabajo_id: int, parar: threading.Event, intervalo: float):
+    """Actualiza bloqueado_en mientras la tarea corre (conexión propia, fuera de la sesión)."""
+    while not parar.wait(intervalo):
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    update(Trabajo.__table__)
+                    .where(Trabajo.__table__.c.id == trabajo_id)
+                    .values(bloqueado_en=datetime.utcnow())
+                )
+        except Exception:
+            current_app.logger.warning("No se pudo registrar el latido del trabajo %s", trabajo_id)
+
+
+def ejecutar(trabajo: Trabajo) -> Trabajo:
+    """Ejecuta un trabajo ya reclamado y guarda el resultado o programa el reintento."""
+    trabajo_id, nombre, args = trabajo.id, trabajo.tarea, dict(trabajo.args or {})
+    app = current_app._get_current_object()
+
+    parar = threading.Event()
+
+    def _latidos():
+        with app.app_context():
+            _latir(trabajo_id, parar, app.config["TRABAJOS_LATIDO"])
+
+    latido = threading.Thread(target=_latidos, name=f"latido-{trabajo_id}", daemon=True)
+    latido.start()
+    try:
+        funcion = TAREAS.get(nombre)
+        if funcion is None:
+            raise LookupError(f"Tarea desconocida: {nombre}")
+        resultado = funcion(**args)
+        error = None
+    except Exception as e:
+        db.session.rollback()
+        resultado, error = None, f"{type(e).__name__}: {e}"
+        current_app.logger.error("Trabajo %s (%s) fallido:\n%s", trabajo_id, nombre, traceback.format_exc())
+    finally:
+        parar.set()
+        latido.join()
+
+    trabajo = db.session.get(Trabajo, trabajo_id, populate_existing=True)
+    ahora = datetime.utcnow()
+    trabajo.bloqueado_por = None
+    trabajo.bloqueado_en = None
+    if error is None:
+        trabajo.estado = ESTADO_TRABAJO_COMPLETADO
+        trabajo.resultado = resultado if isinstance(resultado, (dict, list, str, int, float, bool)) else None
+        trabajo.error = None
+        trabajo.finalizado_en = ahora
+    elif trabajo.intentos < trabajo.max_intentos:
+        espera = current_app.config["TRABAJOS_REINTENTO_BASE"] * 2 ** (trabajo.intentos - 1)
+        trabajo.estado = ESTADO_TRABAJO_PENDIENTE
+        trabajo.error = error
+        trabajo.ejecutar_despues = ahora + timedelta(seconds=espera)
+    else:
+        trabajo.estado = ESTADO_TRABAJO_FALLIDO
+        trabajo.error = error
+        trabajo.finalizado_en = ahora
+    db.session.commit()
+    return trabajo
+
+
+def recuperar_abandonados() -> int:
+    """Devuelve a la cola los trabajos EN_CURSO sin latido desde hace TRABAJOS_TIMEOUT."""
+    limite = datetime.utcnow() - timedelta(seconds=current_app.config["TRABAJOS_TIMEOUT"])
+    res = db.session.execute(
+        update(Trabajo)
+        .where(Trabajo.estado == ESTADO_TRABAJO_EN_CURSO, Trabajo.bloqueado_en < limite)
+        .values(estado=ESTADO_TRABAJO_PENDIENTE, bloqueado_por=None, bloqueado_en=None,
+                error="Recuperado: el worker dejó de responder")
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return res.rowcount
+
+
+def procesar_listos() -> int:
+    """Ejecuta en el hilo actual los trabajos listos ahora mismo. Devuelve cuántos."""
+    n = 0
+    while (trabajo := reclamar()) is not None:
+        ejecutar(trabajo)
+        n += 1
+    return n
+
+
+# ----------------- Ejecución en hilo (sin worker) -----------------
+def _lanzar_en_hilo(app, trabajo_id: int):
+    """Ejecuta un trabajo en un hilo del proceso actual, reintentos incluidos."""
+    def _hilo():
+        with app.app_context():
+            try:
+                while True:
+                    trabajo = reclamar(trabajo_id)
+                    if trabajo is None:
+                        siguiente = db.session.get(Trabajo, trabajo_id)
+                        if siguiente is None or siguiente.estado != ESTADO_TRABAJO_PENDIENTE:
+                            return  # terminado, o se lo llevó otro hilo/worker
+                        espera = (siguiente.ejecutar_despues - datetime.utcnow()).total_seconds()
+                        db.session.rollback()
+                        time.sleep(min(max(espera, 0.1), 300))
+                        continue
+                    if ejecutar(trabajo).estado != ESTADO_TRABAJO_PENDIENTE:
+                        break
+                # Sin worker nadie más recoge lo que quedó atrás (reinicios, encolados desde la CLI)
+                recuperar_abandonados()
+                procesar_listos()
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=_hilo, name=f"trabajo-{trabajo_id}", daemon=True).start()
+
+
+@event.listens_for(Session, "after_commit")
+def _despachar(session):
+    ids = session.info.pop(_INFO_ENCOLADOS, None)
+    if not ids:
+        return
+    # Solo desde peticiones: en la CLI el proceso termina enseguida y mataría el hilo
+    if not has_request_context() or current_app.config.get("TRABAJOS_MODO") != MODO_HILO:
+        return
+    app = current_app._get_current_object()
+    for trabajo_id in ids:
+        _lanzar_en_hilo(app, trabajo_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar(session):
+    session.info.pop(_INFO_ENCOLADOS, None)
+
+
+# ----------------- Worker -----------------
+class Worker:
+    """Pool de hilos que consume la tabla `trabajos` hasta recibir SIGTERM/SIGINT."""
+
+    def __init__(self, app, hilos: int = 2, intervalo: float = 1.0):
+        self.app = app
+        self.hilos = hilos
+        self.intervalo = intervalo
+        self.parar = threading.Event()
+
+    def _bucle(self):
+        with self.app.app_context():
+            while not self.parar.is_set():
+                try:
+                    trabajo = reclamar()
+                    if trabajo is None:
+                        self.parar.wait(self.intervalo)
+                        continue
+                    ejecutar(trabajo)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Error en el bucle del worker")
+                    self.parar.wait(self.intervalo)
+                finally:
+                    db.session.remove()
+
+    def procesar_pendientes(self) -> int:
+        """Ejecuta, en el hilo actual, los trabajos listos ahora mismo. Devuelve cuántos."""
+        with self.app.app_context():
+            recuperar_abandonados()
+            return procesar_listos()
+
+    def ejecutar_para_siempre(self):
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: self.parar.set())
+
+        hilos = [
+            threading.Thread(target=self._bucle, name=f"worker-{i}") for i in range(self.hilos)
+        ]
+        for h in hilos:
+            h.start()
+
+        # El hilo principal solo recupera trabajos abandonados por workers caídos
+        while not self.parar.wait(self.app.config["TRABAJOS_TIMEOUT"] / 2):
+            with self.app.app_context():
+                try:
+                    n = recuperar_abandonados()
+                    if n:
+                        self.app.logger.warning("%s trabajos abandonados devueltos a la cola", n)
+                finally:
+                    db.session.remove()
+
+        for h in hilos:
+            h.join()
+
+
+@click.command("worker")
+@click.option("--hilos", default=2, show_default=True, help="Trabajos en paralelo.")
+@click.option("--intervalo", default=1.0, show_default=True, help="Segundos entre consultas cuando no hay trabajo.")
+@click.option("--una-vez", is_flag=True, help="Procesa lo pendiente y termina (útil en cron).")
+@with_appcontext
+def worker(hilos, intervalo, una_vez):
+    """Ejecuta los trabajos en segundo plano de la tabla `trabajos`"""
+    w = Worker(current_app._get_current_object(), hilos=hilos, intervalo=intervalo)
+    if una_vez:
+        click.echo(f"✅ {w.procesar_pendientes()} trabajos procesados.")
+        return
+    click.echo(f"⏳ Worker en marcha con {hilos} hilos ({len(TAREAS)} tareas registradas). Ctrl+C para parar.")
+    w.ejecutar_para_siempre()
+    click.echo("✅ Worker detenido.")
+
+
+@click.command("trabajo-encolar")
+@click.argument("nombre")
+@click.option("--arg", "args", multiple=True, metavar="CLAVE=VALOR", help="Argumento de la tarea (repetible).")
+@with_appcontext
+def trabajo_encolar(nombre, args):
+    """Encola una tarea registrada (p.ej. pagos.recalcular_saldos)"""
+    if nombre not in TAREAS:
+        raise click.BadParameter(f"tareas disponibles: {', '.join(sorted(TAREAS))}", param_hint="NOMBRE")
+    kwargs = {}
+    for par in args:
+        clave, _, valor = par.partition("=")
+        kwargs[clave] = int(valor) if valor.lstrip("-").isdigit() else valor
+    trabajo = encolar(nombre, **kwargs)
+    db.session.commit()
+    if current_app.config.get("TRABAJOS_MODO") == MODO_HILO:
+        # Sin worker: lo recoge el hilo de la próxima petición web que encole un trabajo
+        quien = ("el proceso web cuando otra petición lance un trabajo "
+                 "(TRABAJOS_MODO=hilo), o `flask worker --una-vez`")
+    else:
+        quien = "`flask worker`"
+    click.echo(f"✅ Trabajo {trabajo.id} encolado ({nombre}). Lo ejecutará {quien}.")
@@ -0,0 +1,54 @@
+# app/trabajos/models.py
+from datetime import datetime
+from app.extensions import db
+
+ESTADO_TRABAJO_PENDIENTE = "PENDIENTE"
+ESTADO_TRABAJO_EN_CURSO = "EN_CURSO"
+ESTADO_TRABAJO_COMPLETADO = "COMPLETADO"
+ESTADO_TRABAJO_FALLIDO = "FALLIDO"
+
+
+class Trabajo(db.Model):
+    """Tarea lenta encolada para ejecutarse fuera de la petición (ver app/trabajos/cola.py)."""
+    __tablename__ = "trabajos"
+    __table_args__ = (
+        db.Index("ix_trabajos_estado_ejecutar_despues", "estado", "ejecutar_despues"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tarea = db.Column(db.String(100), nullable=False, index=True)
+    args = db.Column(db.JSON, nullable=False, default=dict)
+
+    estado = db.Column(db.String(20), nullable=False, default=ESTADO_TRABAJO_PENDIENTE)
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    max_intentos = db.Column(db.Integer, nullable=False, default=3)
+    ejecutar_despues = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Quién lo está ejecutando y último latido (para recuperar trabajos de workers caídos)
+    bloqueado_por = db.Column(db.String(100), nullable=True)
+    bloqueado_en = db.Column(db.DateTime, nullable=True)
+
+    resultado = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    creado_por_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=True)
+    creado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    iniciado_en = db.Column(db.DateTime, nullable=True)
+    finalizado_en = db.Column(db.DateTime, nullable=True)
+
+    def como_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "tarea": self.tarea,
+            "estado": self.estado,
+            "intentos": self.intentos,
+            "max_intentos": self.max_intentos,
+            "resultado": self.resultado,
+            "error": self.error,
+            "creado_en": self.creado_en.isoformat() if self.creado_en else None,
+            "iniciado_en": self.iniciado_en.isoformat() if self.iniciado_en else None,
+            "finalizado_en": self.finalizado_en.isoformat() if self.finalizado_en else None,
+        }
+
+    def __repr__(self):
+        return f"<Trabajo {self.id} {self.tarea} {self.estado}>"
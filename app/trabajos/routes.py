@@ -0,0 +1,17 @@
+# app/trabajos/routes.py
+from flask import jsonify, abort
+from flask_login import login_required, current_user
+from app.extensions import db
+from . import bp
+from app.autorizacion import puede
+from .models import Trabajo
+
+
+@bp.route("/<int:trabajo_id>")
+@login_required
+def estado(trabajo_id):
+    """Estado de un trabajo en segundo plano (JSON). Solo su autor o un administrador."""
+    trabajo = db.session.get(Trabajo, trabajo_id) or abort(404)
+    if trabajo.creado_por_id != current_user.id and not puede("administrar"):
+        abort(403)
+    return jsonify(trabajo.como_dict())
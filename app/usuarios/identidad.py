@@ -0,0 +1,151 @@
+"""
+Identidad del usuario en cada petición, sin ir a la base de datos.
+
+`load_user` hacía `db.session.get(Usuario, id)` (con el JOIN de roles) en
+todas las peticiones. Ahora lo que casi todas las páginas necesitan (id,
+nombre de usuario, activo, nombres de rol y versión de la contraseña) se
+guarda en la caché unos minutos (`IDENTIDAD_TTL`). El loader devuelve una
+`Identidad` con esos datos. El `Usuario` real solo se carga si se toca otro
+atributo (email, ultimo_login, set_password...).
+
+- Invalidación: cualquier commit que modifique o borre un Usuario (editar,
+  bloquear, cambiar contraseña, cambiar roles) borra su entrada de la caché.
+- Versión de la contraseña: `get_id()` devuelve `"<id>:<versión>"`, y eso
+  es lo que Flask-Login guarda en la sesión y en la cookie "recordarme". Si
+  la contraseña cambia, las demás sesiones de ese usuario dejan de valer,
+  también al restaurarlas desde la cookie. Un identificador sin versión no
+  se acepta.
+- Un usuario bloqueado (activo = False) deja de estar autenticado en su
+  siguiente petición.
+"""
+from collections import namedtuple
+
+from flask import current_app, request
+from flask_login import COOKIE_NAME, UserMixin, login_user, user_logged_in
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.extensions import db, cache
+from .models import Usuario
+
+_INFO_USUARIOS = "identidad_usuarios_modificados"
+
+Rol = namedtuple("Rol", "nombre")
+
+
+def _clave(usuario_id) -> str:
+    return f"identidad:{int(usuario_id)}"
+
+
+def _datos(usuario: Usuario) -> dict:
+    return {
+        "id": usuario.id,
+        "username": usuario.username,
+        "full_name": usuario.full_name,
+        "activo": bool(usuario.activo),
+        "roles": tuple(sorted(r.nombre for r in usuario.roles)),
+        "version": usuario.version_credenciales(),
+    }
+
+
+class Identidad(UserMixin):
+    """
+    Usuario de la petición, construido desde la caché. Lee id, username,
+    full_name (y su alias nombre_completo), activo y roles sin consultas.
+    Cualquier otro atributo, y toda escritura, van al `Usuario` real (se
+    carga una vez, en la primera).
+    """
+
+    def __init__(self, datos: dict, usuario: Usuario = None):
+        propios = dict(datos, roles=[Rol(n) for n in datos["roles"]], nombre_completo=datos["full_name"])
+        object.__setattr__(self, "_propios", propios)
+        object.__setattr__(self, "_usuario", usuario)
+
+    @property
+    def usuario(self) -> Usuario:
+        if self._usuario is None:
+            object.__setattr__(self, "_usuario", db.session.get(Usuario, self._propios["id"]))
+        return self._usuario
+
+    def __getattr__(self, nombre):
+        propios = object.__getattribute__(self, "_propios")
+        if nombre in propios:
+            return propios[nombre]
+        return getattr(self.usuario, nombre)
+
+    def __setattr__(self, nombre, valor):
+        setattr(self.usuario, nombre, valor)
+        if nombre in self._propios:
+            self._propios[nombre] = valor
+        if nombre in ("full_name", "nombre_completo"):
+            self._propios["full_name"] = self._propios["nombre_completo"] = valor
+
+    def get_id(self):
+        return f"{self._propios['id']}:{self._propios['version']}"
+
+    def __repr__(self):
+        return f"<Identidad {self._propios['username']}>"
+
+
+def _guardar(usuario: Usuario) -> dict:
+    datos = _datos(usuario)
+    cache.set(_clave(usuario.id), datos, ttl=current_app.config.get("IDENTIDAD_TTL", 300))
+    return datos
+
+
+def cargar_usuario(identificador):
+    """
+    user_loader: `"<id>:<versión>"` (ver `Usuario.get_id`). Identidad desde
+    la caché o, si no está, desde la base de datos.
+    """
+    usuario_id, _, version = str(identificador).partition(":")
+    if not usuario_id.isdigit() or not version:
+        return None  # sesión o cookie sin versión: hay que volver a iniciar sesión
+    datos = cache.get(_clave(usuario_id))
+    usuario = None
+    if datos is None:
+        usuario = db.session.get(Usuario, int(usuario_id))
+        if usuario is None:
+            return None
+        datos = _guardar(usuario)
+
+    if not datos["activo"] or version != datos["version"]:
+        return None  # bloqueado, o contraseña cambiada desde otra sesión
+    return Identidad(datos, usuario)
+
+
+def renovar_sesion(usuario):
+    """
+    Tras cambiar la propia contraseña: la sesión actual (y su cookie
+    "recordarme", si la tiene) pasa a la nueva versión y sigue valiendo.
+    """
+    real = usuario.usuario if isinstance(usuario, Identidad) else usuario
+    recordar = current_app.config.get("REMEMBER_COOKIE_NAME", COOKIE_NAME) in request.cookies
+    login_user(real, remember=recordar)
+
+
+@user_logged_in.connect
+def _al_iniciar_sesion(sender, user, **extra):
+    # El usuario ya está cargado: la siguiente petición no tendrá que leerlo
+    if not isinstance(user, Identidad):
+        _guardar(user)
+
+
+# ----------------- Invalidación -----------------
+@event.listens_for(Usuario, "after_update")
+@event.listens_for(Usuario, "after_delete")
+def _anotar(mapper, connection, target):
+    sesion = Session.object_session(target)
+    if sesion is not None:
+        sesion.info.setdefault(_INFO_USUARIOS, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar(sesion):
+    for usuario_id in sesion.info.pop(_INFO_USUARIOS, ()):
+        cache.delete(_clave(usuario_id))
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar(sesion):
+    sesion.info.pop(_INFO_USUARIOS, None)
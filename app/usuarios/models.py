@@ -1,9 +1,50 @@
-from datetime import datetime
+import hashlib
+from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app
 from flask_login import UserMixin
+from sqlalchemy import func
 from app import db
 from app.models_shared import user_roles, ActividadUsuario
 
+
+class SesionUsuario(db.Model):
+    """
+    Una fila por inicio de sesión (ver app/usuarios/sesiones.py). Sustituye a
+    las columnas `ultimo_login` y `sesion_activa` de usuarios: iniciar o
+    cerrar sesión ya no escribe en la fila del usuario. Es solo un registro:
+    no decide si una sesión sigue valiendo.
+    """
+    __tablename__ = "sesiones_usuario"
+    __table_args__ = (
+        # Último acceso y sesiones abiertas de un usuario
+        db.Index("ix_sesiones_usuario_usuario_inicio", "usuario_id", "inicio"),
+        {"extend_existing": True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    token = db.Column(db.String(64), unique=True, nullable=False)  # se guarda en la sesión de Flask
+    inicio = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    fin = db.Column(db.DateTime, nullable=True)  # None: abierta
+    ip = db.Column(db.String(100))
+    agente = db.Column(db.String(255))
+
+    @classmethod
+    def abiertas(cls):
+        """
+        Sin cerrar y dentro de la duración de la cookie "recordarme" (quien
+        no cierra sesión sigue dentro hasta que caduca).
+        """
+        duracion = current_app.config.get("REMEMBER_COOKIE_DURATION", timedelta(days=365))
+        if not isinstance(duracion, timedelta):
+            duracion = timedelta(seconds=duracion)
+        return cls.query.filter(cls.fin.is_(None), cls.inicio >= datetime.utcnow() - duracion)
+
+    def __repr__(self):
+        return f"<SesionUsuario {self.usuario_id} {self.inicio}>"
+
+
 class Usuario(UserMixin, db.Model):
     __tablename__ = "usuarios"
     __table_args__ = {"extend_existing": True}
@@ -14,8 +55,6 @@ class Usuario(UserMixin, db.Model):
     email = db.Column(db.String(120), nullable=True)  # sin validación por ahora
     password_hash = db.Column(db.String(255), nullable=False)
     activo = db.Column(db.Boolean, default=True)
-    sesion_activa = db.Column(db.Boolean, default=False)
-    ultimo_login = db.Column(db.DateTime, nullable=True)
     creado_en = db.Column(db.DateTime, default=datetime.utcnow)
 
     roles = db.relationship(
@@ -26,7 +65,41 @@ class Usuario(UserMixin, db.Model):
     )
 
     # Relación con actividades (coherente con back_populates en ActividadUsuario)
-    actividades = db.relationship("ActividadUsuario", back_populates="usuario", lazy="dynamic")
+    # (más reciente primero: lo resuelve el índice usuario_id + fecha_hora)
+    actividades = db.relationship(
+        "ActividadUsuario", back_populates="usuario", lazy="dynamic",
+        order_by="(ActividadUsuario.fecha_hora.desc(), ActividadUsuario.id.desc())",
+    )
+
+    # Inicio de la sesión más reciente (diferido: el listado de usuarios lo pide con undefer)
+    ultimo_login = db.column_property(
+        db.select(func.max(SesionUsuario.inicio))
+        .where(SesionUsuario.usuario_id == id)
+        .correlate_except(SesionUsuario)
+        .scalar_subquery(),
+        deferred=True,
+    )
+
+    @property
+    def sesion_activa(self) -> bool:
+        return SesionUsuario.abiertas().filter_by(usuario_id=self.id).first() is not None
+
+    # Nombre que usan las plantillas y el formulario de perfil
+    @property
+    def nombre_completo(self):
+        return self.full_name
+
+    @nombre_completo.setter
+    def nombre_completo(self, valor):
+        self.full_name = valor
+
+    def version_credenciales(self) -> str:
+        """Cambia cuando cambia la contraseña (no revela la contraseña ni su hash)."""
+        return hashlib.sha256((self.password_hash or "").encode()).hexdigest()[:16]
+
+    def get_id(self):
+        # Flask-Login lo guarda en la sesión y en la cookie "recordarme" (ver identidad.py)
+        return f"{self.id}:{self.version_credenciales()}"
 
     def set_password(self, password: str):
         self.password_hash = generate_password_hash(password)
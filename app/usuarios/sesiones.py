@@ -0,0 +1,87 @@
+"""
+Inicio y cierre de sesión: una sola transacción cada uno.
+
+Antes el login hacía tres commits (comprobar credenciales, actualizar
+`ultimo_login`/`sesion_activa` en usuarios y registrar la actividad) y el
+logout otros dos. Todos escribían en la fila del usuario, que al empezar
+la jornada era un punto caliente.
+
+Ahora:
+- Login: inserta una fila en `sesiones_usuario` y hace un commit. El token
+  de esa fila queda en la sesión de Flask.
+- Logout: marca `fin` en esa fila y hace un commit.
+- La actividad ("Inicio de sesión", "Cierre de sesión") va a la cola de
+  auditoría, que se escribe por lotes (app/auditoria.py).
+- `Usuario.ultimo_login` y `Usuario.sesion_activa` se calculan a partir de
+  `sesiones_usuario`.
+
+Como la fila del usuario no cambia, iniciar sesión tampoco invalida su
+identidad cacheada (app/usuarios/identidad.py).
+
+La tabla es solo un registro: ninguna petición la consulta. Quién sigue
+dentro lo deciden la versión de la contraseña (en la sesión y en la cookie
+"recordarme") y `activo` (ver app/usuarios/identidad.py). Al cambiar la
+contraseña se marcan como cerradas las demás filas del usuario, y al
+bloquearlo todas. Así la tabla refleja lo que el loader ya aplica.
+"""
+import secrets
+from datetime import datetime
+
+from flask import has_request_context, request, session
+from flask_login import login_user, logout_user
+from sqlalchemy import event, inspect, update
+
+from app.extensions import db
+from app.models_shared import registrar_actividad
+from .models import Usuario, SesionUsuario
+
+# Clave de la sesión de Flask con el token de la fila de sesiones_usuario
+CLAVE_TOKEN = "_sesion_token"
+
+
+def iniciar_sesion(usuario: Usuario, recordar: bool = True):
+    """Abre la sesión del usuario (ya autenticado) con un solo commit."""
+    token = secrets.token_urlsafe(32)
+    # Antes del commit: después el usuario queda expirado y se volvería a leer
+    login_user(usuario, remember=recordar)
+    session[CLAVE_TOKEN] = token
+    registrar_actividad(usuario, "Inicio de sesión")
+    db.session.add(SesionUsuario(
+        usuario_id=usuario.id,
+        token=token,
+        ip=request.remote_addr,
+        agente=(request.user_agent.string or "")[:255] or None,
+    ))
+    db.session.commit()
+
+
+def terminar_sesion(usuario):
+    """Cierra la sesión actual con un solo commit."""
+    token = session.pop(CLAVE_TOKEN, None)
+    if token:
+        db.session.execute(
+            update(SesionUsuario)
+            .where(SesionUsuario.token == token, SesionUsuario.fin.is_(None))
+            .values(fin=datetime.utcnow())
+        )
+        db.session.commit()
+    registrar_actividad(usuario, "Cierre de sesión")
+    logout_user()
+
+
+# ----------------- Cambio de contraseña / bloqueo -----------------
+@event.listens_for(Usuario, "after_update")
+def _cerrar_sesiones(mapper, connection, target):
+    # Solo registro: el acceso ya lo cortan la versión de la contraseña y `activo`
+    estado = inspect(target)
+    bloqueado = estado.attrs.activo.history.has_changes() and not target.activo
+    if not bloqueado and not estado.attrs.password_hash.history.has_changes():
+        return
+    condicion = [SesionUsuario.usuario_id == target.id, SesionUsuario.fin.is_(None)]
+    # Quien cambia su propia contraseña conserva la sesión actual
+    actual = session.get(CLAVE_TOKEN) if has_request_context() else None
+    if actual and not bloqueado:
+        condicion.append(SesionUsuario.token != actual)
+    connection.execute(
+        update(SesionUsuario.__table__).where(*condicion).values(fin=datetime.utcnow())
+    )
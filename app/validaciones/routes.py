@@ -6,13 +6,14 @@ from flask import (
     url_for,
     flash,
     request,
-    abort
 )
-from flask_login import login_required, current_user
+from flask_login import login_required
 from datetime import date
 from app.extensions import db
+from app.paginacion import paginar_keyset_request
+from app.autorizacion import puede, requiere_permiso
 from . import bp
-from app.pagos.routes import redistribuir_cuotas_pendientes
+from app.pagos.ledger import redistribuir_cuotas_pendientes
 
 # --- MODELOS Y CONSTANTES ---
 from app.cursos.models import (
@@ -23,26 +24,13 @@ from app.cursos.models import (
     PROG_PENDIENTE,
 )
 from app.matriculas.models import Matricula
+from app.matriculas.perfiles import opciones
 from app.pagos.models import Pago, ESTADO_PAGO_PENDIENTE, ESTADO_PAGO_VALIDADO, ESTADO_PAGO_RECHAZADO, ESTADO_PAGO_PENDIENTE_VALIDACION
 
 # Importar estados adicionales
 from app.cursos.models import ESTADO_PENDIENTE_VALIDACION, ESTADO_RECHAZADO
 
 
-# -------------------------------------------------------------
-# 🔐 Funciones de permiso
-# -------------------------------------------------------------
-def tiene_permiso_validacion():
-    """Verifica si el usuario tiene permisos para validar pagos/cursos (Administrador o Administrativo)."""
-    return any(role.nombre in ['Administrador', 'Administrativo'] for role in current_user.roles)
-
-def es_admin():
-    return any(r.nombre == "Administrador" for r in current_user.roles)
-
-def es_supervisor():
-    return any(r.nombre == "Supervisor" for r in current_user.roles)
-
-
 # -------------------------------------------------------------
 # 🧭 PANEL CENTRAL DE VALIDACIONES
 # -------------------------------------------------------------
@@ -53,7 +41,7 @@ def index():
     Panel central de validaciones del sistema.
     Muestra cursos pendientes y pagos pendientes de validación.
     """
-    if not (es_admin() or es_supervisor()):
+    if not puede("supervisar"):
         flash("No tienes permisos para acceder a esta sección.", "danger")
         return redirect(url_for("core.dashboard"))
 
@@ -83,15 +71,26 @@ def index():
     cursos_rechazados = Curso.query.filter_by(estado=ESTADO_RECHAZADO).all()
 
     # --- PAGOS PENDIENTES DE VALIDACIÓN ---
-    if tiene_permiso_validacion():
-        pagos_pendientes = Pago.query.filter_by(estado=ESTADO_PAGO_PENDIENTE_VALIDACION).all()
+    hoy = date.today()
+    pagina_vencidos = None
+    if puede("gestionar"):
+        # Matrícula, curso y documentos se cargan junto a los pagos (los usa la plantilla por fila)
+        con_matricula = opciones("validacion", via=Pago.matricula)
+
+        pagos_pendientes = (
+            Pago.query.options(*con_matricula)
+            .filter_by(estado=ESTADO_PAGO_PENDIENTE_VALIDACION)
+            .all()
+        )
 
-        # Filtrar pagos vencidos que no están procesados
-        pagos_vencidos = []
-        all_pagos = Pago.query.all()
-        for pago in all_pagos:
-            if pago.esta_vencido() and pago.estado not in [ESTADO_PAGO_VALIDADO, ESTADO_PAGO_RECHAZADO, ESTADO_PAGO_PENDIENTE_VALIDACION]:
-                pagos_vencidos.append(pago)
+        # Pagos vencidos aún sin procesar: predicado SQL sobre ix_pagos_estado_fecha_vencimiento,
+        # paginado por (fecha_vencimiento, id)
+        vencidos = Pago.query.options(*con_matricula).filter(
+            Pago.esta_vencido(hoy),
+            Pago.estado == ESTADO_PAGO_PENDIENTE,
+        )
+        pagina_vencidos = paginar_keyset_request(vencidos, Pago.fecha_vencimiento, Pago.id)
+        pagos_vencidos = pagina_vencidos.items
     else:
         pagos_pendientes = []
         pagos_vencidos = []
@@ -106,7 +105,8 @@ def index():
         total_cursos_rechazados=len(cursos_rechazados),
         pagos_pendientes=pagos_pendientes,
         pagos_vencidos=pagos_vencidos,
-        hoy=date.today(),
+        pagina_vencidos=pagina_vencidos,
+        hoy=hoy,
         cursos_pendientes=cursos_pendientes,
         cursos_rechazados=cursos_rechazados
     )
@@ -118,7 +118,7 @@ def index():
 @bp.route("/validar_pago/<int:pago_id>", methods=["POST"], endpoint="validar_pago")
 @login_required
 def validar_pago(pago_id):
-    if not tiene_permiso_validacion():
+    if not puede("gestionar"):
         flash("No tiene permisos para validar pagos.", "danger")
         return redirect(url_for("core.dashboard"))
     
@@ -129,10 +129,10 @@ def validar_pago(pago_id):
         return redirect(url_for("validaciones.index"))
     
     pago.estado = ESTADO_PAGO_VALIDADO
-    db.session.commit()
     
-    # 🔄 REDISTRIBUIR CUOTAS PENDIENTES DESPUÉS DE VALIDAR
+    # 🔄 REDISTRIBUIR CUOTAS PENDIENTES DESPUÉS DE VALIDAR (misma transacción)
     redistribuir_cuotas_pendientes(pago.matricula)
+    db.session.commit()
     
     flash("Pago validado correctamente y cuotas redistribuidas.", "success")
     return redirect(url_for("validaciones.index"))
@@ -144,7 +144,7 @@ def validar_pago(pago_id):
 @bp.route("/rechazar_pago/<int:pago_id>", methods=["POST"], endpoint="rechazar_pago")
 @login_required
 def rechazar_pago(pago_id):
-    if not tiene_permiso_validacion():
+    if not puede("gestionar"):
         flash("No tiene permisos para rechazar pagos.", "danger")
         return redirect(url_for("core.dashboard"))
     
@@ -174,7 +174,7 @@ def rechazar_pago(pago_id):
 @login_required
 def validar_curso(curso_id):
     """Valida un curso (cambia su estado a VALIDADO)."""
-    if not (es_admin() or es_supervisor()):
+    if not puede("supervisar"):
         flash("No tienes permisos para validar cursos.", "danger")
         return redirect(url_for("core.dashboard"))
 
@@ -200,7 +200,7 @@ def validar_curso(curso_id):
 @login_required
 def rechazar_curso(curso_id):
     """Rechaza un curso y guarda una observación si se proporciona."""
-    if not (es_admin() or es_supervisor()):
+    if not puede("supervisar"):
         flash("No tienes permisos para rechazar cursos.", "danger")
         return redirect(url_for("core.dashboard"))
 
@@ -235,11 +235,9 @@ def rechazar_curso(curso_id):
 # -------------------------------------------------------------
 @bp.route("/pagos/<int:matricula_id>", methods=["GET", "POST"], endpoint="validaciones_pagos_detalle")
 @login_required
+@requiere_permiso("supervisar")
 def validaciones_pagos_detalle(matricula_id):
     """Vista de detalle para validar o rechazar pagos de un estudiante"""
-    if not (es_admin() or es_supervisor()):
-        abort(403)
-
     matricula = Matricula.query.get_or_404(matricula_id)
     pagos = Pago.query.filter_by(matricula_id=matricula.id).order_by(Pago.numero_cuota).all()
 
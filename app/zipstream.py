@@ -0,0 +1,250 @@
+"""
+zipstream.py
+Generación de ficheros ZIP en streaming, con memoria constante.
+
+Cada entrada se lee del disco y se escribe en bloques directamente en la
+respuesta: nunca se tiene el ZIP completo (ni un fichero completo) en RAM.
+Los formatos que ya vienen comprimidos (PDF, JPEG, PNG, Office...) se
+guardan sin comprimir (STORED); el resto se comprime con deflate.
+
+Si todas las entradas son STORED, el tamaño final del ZIP se conoce antes de
+empezar (`ZipStream.tamano`) y la respuesta puede llevar Content-Length.
+
+Limitación: no genera ZIP64, así que cada fichero y el ZIP completo deben
+ocupar menos de 4 GiB (muy por encima del límite de subida de la aplicación).
+"""
+import os
+import struct
+import time
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional
+from urllib.parse import quote
+
+from flask import Response
+
+TAM_BLOQUE = 64 * 1024
+
+# Extensiones cuyo contenido ya está comprimido: deflate apenas lo reduce
+YA_COMPRIMIDOS = {
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".zip", ".gz", ".bz2", ".xz", ".7z", ".rar",
+    ".docx", ".xlsx", ".pptx", ".odt", ".ods",
+    ".mp3", ".mp4", ".m4a", ".mov",
+}
+
+STORED = 0
+DEFLATED = 8
+
+_LIMITE_ZIP32 = 0xFFFFFFFF
+_FLAG_DESCRIPTOR = 0x08   # CRC y tamaños van detrás de los datos
+_FLAG_UTF8 = 0x800
+
+_CABECERA_LOCAL = struct.Struct("<4s5H3L2H")
+_DESCRIPTOR = struct.Struct("<4s3L")
+_CABECERA_CENTRAL = struct.Struct("<4s6H3L5H2L")
+_FIN_DIRECTORIO = struct.Struct("<4s4H2LH")
+
+
+def nombre_adjunto(nombre: str) -> dict:
+    """Parámetros de Content-Disposition (filename* RFC 5987 si no es ASCII), como send_file."""
+    try:
+        nombre.encode("ascii")
+        return {"filename": nombre}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", nombre).encode("ascii", "ignore").decode("ascii")
+        return {"filename": simple, "filename*": f"UTF-8''{quote(nombre, safe='!#$&+^`|~')}"}
+
+
+def metodo_para(nombre: str) -> int:
+    return STORED if os.path.splitext(nombre)[1].lower() in YA_COMPRIMIDOS else DEFLATED
+
+
+def _fecha_dos(timestamp: float):
+    t = time.localtime(timestamp)
+    anio = max(t.tm_year, 1980)
+    fecha = ((anio - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    hora = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    return hora, fecha
+
+
+@dataclass
+class Entrada:
+    ruta: str
+    nombre: str
+    tamano: int
+    mtime: float
+    metodo: int
+    # Se rellenan al escribir
+    crc: int = 0
+    tamano_comprimido: int = 0
+    offset: int = 0
+
+    @property
+    def nombre_bytes(self) -> bytes:
+        return self.nombre.encode("utf-8")
+
+    @property
+    def flags(self) -> int:
+        utf8 = 0 if self.nombre.isascii() else _FLAG_UTF8
+        return _FLAG_DESCRIPTOR | utf8
+
+
+class ZipStream:
+    """
+    Construye un ZIP a partir de ficheros del disco y lo emite por bloques.
+
+        z = ZipStream()
+        z.agregar("/ruta/a/expediente.pdf", "expediente.pdf")
+        return z.respuesta("documentos.zip")
+    """
+
+    def __init__(self):
+        self.entradas: List[Entrada] = []
+        self._nombres = set()
+
+    def _nombre_unico(self, nombre: str) -> str:
+        base, ext = os.path.splitext(nombre)
+        candidato, n = nombre, 1
+        while candidato in self._nombres:
+            n += 1
+            candidato = f"{base} ({n}){ext}"
+        self._nombres.add(candidato)
+        return candidato
+
+    def agregar(self, ruta: str, nombre: Optional[str] = None, metodo: Optional[int] = None) -> bool:
+        """Añade un fichero. Devuelve False (y no lo añade) si no existe."""
+        try:
+            st = os.stat(ruta)
+        except OSError:
+            return False
+        nombre = (nombre or os.path.basename(ruta)).replace("\\", "/").lstrip("/")
+        if st.st_size > _LIMITE_ZIP32:
+            raise ValueError(f"{nombre}: los ficheros de más de 4 GiB no están soportados")
+        self.entradas.append(Entrada(
+            ruta=ruta,
+            nombre=self._nombre_unico(nombre),
+            tamano=st.st_size,
+            mtime=st.st_mtime,
+            metodo=metodo_para(nombre) if metodo is None else metodo,
+        ))
+        return True
+
+    # --- Tamaño previsto ---
+    @property
+    def tamano(self) -> Optional[int]:
+        """Tamaño exacto del ZIP si todas las entradas son STORED; si no, None."""
+        if any(e.metodo != STORED for e in self.entradas):
+            return None
+        total = 0
+        for e in self.entradas:
+            n = len(e.nombre_bytes)
+            total += _CABECERA_LOCAL.size + n + e.tamano + _DESCRIPTOR.size
+            total += _CABECERA_CENTRAL.size + n
+        return total + _FIN_DIRECTORIO.size
+
+    # --- Generación ---
+    def _cabecera_local(self, e: Entrada) -> bytes:
+        hora, fecha = _fecha_dos(e.mtime)
+        nombre = e.nombre_bytes
+        return _CABECERA_LOCAL.pack(
+            b"PK\x03\x04", 20, e.flags, e.metodo, hora, fecha,
+            0, 0, 0,  # CRC y tamaños: en el descriptor
+            len(nombre), 0,
+        ) + nombre
+
+    def _cabecera_central(self, e: Entrada) -> bytes:
+        hora, fecha = _fecha_dos(e.mtime)
+        nombre = e.nombre_bytes
+        return _CABECERA_CENTRAL.pack(
+            b"PK\x01\x02", 20, 20, e.flags, e.metodo, hora, fecha,
+            e.crc, e.tamano_comprimido, e.tamano,
+            len(nombre), 0, 0, 0, 0,
+            0o100644 << 16,  # permisos unix: fichero normal rw-r--r--
+            e.offset,
+        ) + nombre
+
+    def _datos(self, e: Entrada) -> Iterator[bytes]:
+        crc, leidos, escritos = 0, 0, 0
+        compresor = zlib.compressobj(6, zlib.DEFLATED, -15) if e.metodo == DEFLATED else None
+        with open(e.ruta, "rb") as f:
+            while True:
+                bloque = f.read(TAM_BLOQUE)
+                if not bloque:
+                    break
+                crc = zlib.crc32(bloque, crc)
+                leidos += len(bloque)
+                if compresor is not None:
+                    bloque = compresor.compress(bloque)
+                if bloque:
+                    escritos += len(bloque)
+                    yield bloque
+        if compresor is not None:
+            cola = compresor.flush()
+            escritos += len(cola)
+            yield cola
+        if leidos != e.tamano and e.metodo == STORED:
+            # El fichero ha cambiado desde agregar(): el Content-Length ya enviado no cuadraría
+            raise IOError(f"{e.nombre}: el tamaño cambió durante la descarga")
+        if escritos > _LIMITE_ZIP32 or leidos > _LIMITE_ZIP32:
+            raise ValueError(f"{e.nombre}: entrada demasiado grande para ZIP sin ZIP64")
+        e.crc, e.tamano, e.tamano_comprimido = crc & 0xFFFFFFFF, leidos, escritos
+
+    def _bloques_entrada(self, e: Entrada) -> Iterator[bytes]:
+        yield self._cabecera_local(e)
+        yield from self._datos(e)
+        # El descriptor se empaqueta después de los datos: ya hay CRC y tamaños
+        yield _DESCRIPTOR.pack(b"PK\x07\x08", e.crc, e.tamano_comprimido, e.tamano)
+
+    def _bloques_fin(self, inicio_directorio: int) -> Iterator[bytes]:
+        directorio = b"".join(self._cabecera_central(e) for e in self.entradas)
+        if inicio_directorio + len(directorio) > _LIMITE_ZIP32:
+            raise ValueError("ZIP demasiado grande sin ZIP64")
+        yield directorio
+        yield _FIN_DIRECTORIO.pack(
+            b"PK\x05\x06", 0, 0, len(self.entradas), len(self.entradas),
+            len(directorio), inicio_directorio, 0,
+        )
+
+    def generar(self) -> Iterator[bytes]:
+        offset = 0
+        for e in self.entradas:
+            e.offset = offset
+            for bloque in self._bloques_entrada(e):
+                offset += len(bloque)
+                yield bloque
+        yield from self._bloques_fin(offset)
+
+    def escribir(self, f, desde: int = 0, offset: int = 0,
+                 al_completar: Optional[Callable[[int, Entrada, int], None]] = None) -> int:
+        """
+        Escribe el ZIP en el fichero binario `f`, ya posicionado en `offset`.
+
+        Para reanudar un ZIP a medias, las entradas [:desde] deben estar ya en
+        el fichero y tener rellenos crc, tamaños y offset (p.ej. desde un punto
+        de control). `al_completar(i, entrada, offset)` se llama al terminar
+        cada entrada. Devuelve el tamaño final del fichero.
+        """
+        for i in range(desde, len(self.entradas)):
+            e = self.entradas[i]
+            e.offset = offset
+            for bloque in self._bloques_entrada(e):
+                f.write(bloque)
+                offset += len(bloque)
+            if al_completar is not None:
+                al_completar(i, e, offset)
+        for bloque in self._bloques_fin(offset):
+            f.write(bloque)
+            offset += len(bloque)
+        return offset
+
+    def respuesta(self, nombre_descarga: str) -> Response:
+        """Respuesta Flask que emite el ZIP en streaming como adjunto."""
+        resp = Response(self.generar(), mimetype="application/zip", direct_passthrough=True)
+        tamano = self.tamano
+        if tamano is not None:
+            resp.content_length = tamano
+        resp.headers.set("Content-Disposition", "attachment", **nombre_adjunto(nombre_descarga))
+        resp.headers["X-Accel-Buffering"] = "no"  # que un proxy no acumule la respuesta
+        return resp
@@ -0,0 +1,13 @@
+"""
+Banco de pruebas de rendimiento.
+
+- datos.py:    generador determinista de datos escolares sintéticos.
+- run.py:      lanza los endpoints más usados con el test client de Flask y
+               guarda latencias (p50/p95) y consultas por petición en JSON.
+- comparar.py: compara dos ficheros de resultados (p.ej. de dos commits).
+
+Uso:
+    python -m benchmarks.run --cursos 20 --matriculas 100 --salida resultados.json
+    python -m benchmarks.run --db postgres --url postgresql+psycopg2://bench@localhost/bench
+    python -m benchmarks.comparar antes.json despues.json
+"""
@@ -0,0 +1,52 @@
+"""
+Compara dos ficheros de resultados de benchmarks.run.
+
+    python -m benchmarks.comparar antes.json despues.json
+"""
+import json
+import sys
+
+METRICAS = ("p50_ms", "p95_ms", "consultas_media")
+
+
+def _delta(antes, despues) -> str:
+    if not antes:
+        return "   —  "
+    return f"{(despues - antes) / antes * 100:+6.1f}%"
+
+
+def comparar(antes: dict, despues: dict) -> str:
+    lineas = [
+        f"{antes.get('commit') or '?'} → {despues.get('commit') or '?'}  "
+        f"({despues.get('db')}, escala {despues.get('escala')})",
+        "",
+        f"{'endpoint':28}" + "".join(f"{m:>29}" for m in METRICAS),
+    ]
+    for nombre, d in despues["endpoints"].items():
+        a = antes["endpoints"].get(nombre)
+        if a is None:
+            lineas.append(f"{nombre:28}  (nuevo)")
+            continue
+        celdas = "".join(
+            f"{a[m]:>10} → {d[m]:<8} {_delta(a[m], d[m])}" for m in METRICAS
+        )
+        lineas.append(f"{nombre:28}{celdas}")
+    if antes.get("escala") != despues.get("escala"):
+        lineas += ["", "⚠️ Las escalas no coinciden: la comparación no es directa."]
+    return "\n".join(lineas)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(__doc__.strip(), file=sys.stderr)
+        sys.exit(2)
+    with open(argv[0], encoding="utf-8") as f:
+        antes = json.load(f)
+    with open(argv[1], encoding="utf-8") as f:
+        despues = json.load(f)
+    print(comparar(antes, despues))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Generador determinista de datos escolares sintéticos.
+
+Con la misma `Escala` (incluida la semilla) genera siempre las mismas filas,
+con los mismos ids, para poder comparar resultados entre commits. Las filas
+se insertan en bloque (INSERT ... VALUES masivo), así que los listeners del
+ORM no se disparan: al final se recalculan los contadores de estadísticas y
+los saldos de matrícula tal y como lo harían en producción.
+"""
+import os
+import random
+from dataclasses import dataclass, asdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert, text
+
+from app.extensions import db
+from app.usuarios.models import Usuario, Role
+from app.cursos.models import (
+    Curso, Modulo, CURSO_TIPO_FP, CURSO_TIPO_INTENSIVO, ESTADO_VALIDADO, ESTADO_PROGRAMADO, ESTADO_BORRADOR,
+)
+from app.matriculas.models import (
+    Matricula, MatriculaAsignatura, MatriculaDocumento, Calificacion,
+    ESTADO_MAT_VALIDADA, ESTADO_MAT_PENDIENTE, ESTADO_MAT_RECHAZADA, CAMPUS_BATA, CAMPUS_MALABO,
+    TIPO_CALIF_ORDINARIO, TIPO_CALIF_PARCIAL, TIPO_CALIF_FINAL,
+)
+from app.pagos.models import (
+    Pago, ESTADO_PAGO_PENDIENTE, ESTADO_PAGO_VALIDADO, ESTADO_PAGO_PENDIENTE_VALIDACION,
+    ESTADO_PAGO_RECHAZADO, ESTADO_PAGO_INICIAL,
+)
+from app.documentos.models import Documento
+
+# Fecha de referencia fija: las fechas generadas no dependen del día en que se ejecuta
+FECHA_BASE = date(2025, 9, 1)
+
+USUARIO_BENCH = "bench"
+PASSWORD_BENCH = "bench123"
+
+NOMBRES = ("Ana", "Benito", "Carmen", "Diosdado", "Elena", "Fausto", "Gloria", "Hilario", "Irene", "Jacinto")
+APELLIDOS = ("Obiang", "Nguema", "Esono", "Mba", "Ondo", "Nsue", "Eyang", "Bacale", "Mangue", "Ela")
+
+
+@dataclass
+class Escala:
+    cursos: int = 10
+    modulos_por_curso: int = 6
+    matriculas_por_curso: int = 50
+    cuotas: int = 10
+    calificaciones_por_asignatura: int = 4
+    documentos: int = 200
+    semilla: int = 42
+
+    def como_dict(self) -> dict:
+        return asdict(self)
+
+
+def _insertar(modelo, filas, lote=5000):
+    for i in range(0, len(filas), lote):
+        db.session.execute(insert(modelo), filas[i:i + lote])
+
+
+def _archivo(directorio, nombre, rng, kb=4) -> str:
+    """Crea (si no existe) un fichero de contenido pseudoaleatorio reproducible."""
+    ruta = os.path.join(directorio, nombre)
+    contenido = rng.randbytes(kb * 1024)  # siempre, para no desviar la secuencia aleatoria
+    if not os.path.exists(ruta):
+        with open(ruta, "wb") as f:
+            f.write(contenido)
+    return ruta
+
+
+def _ajustar_secuencias(tablas):
+    """En PostgreSQL, tras insertar ids explícitos, las secuencias deben avanzar."""
+    if db.engine.dialect.name != "postgresql":
+        return
+    for tabla in tablas:
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), COALESCE(MAX(id), 1)) FROM {tabla}"
+        ))
+
+
+def generar(escala: Escala, directorio_archivos: str) -> dict:
+    """
+    Borra y recrea el esquema y lo llena según `escala`.
+    Devuelve el nº de filas generadas por tabla.
+    """
+    from app.estadisticas.contadores import reconstruir_contadores
+    from app.pagos.ledger import actualizar_saldos
+
+    rng = random.Random(escala.semilla)
+    os.makedirs(directorio_archivos, exist_ok=True)
+
+    db.drop_all()
+    db.create_all()
+
+    # --- Usuarios ---
+    roles = {n: Role(nombre=n) for n in ("Administrador", "Administrativo", "Supervisor")}
+    db.session.add_all(roles.values())
+    admin = Usuario(username=USUARIO_BENCH, full_name="Usuario de benchmarks", activo=True)
+    admin.set_password(PASSWORD_BENCH)
+    admin.roles.append(roles["Administrador"])
+    db.session.add(admin)
+    db.session.flush()
+
+    cursos, modulos, matriculas, asignaturas, calificaciones, pagos, docs_mat = [], [], [], [], [], [], []
+    mid = aid = cid = pid = did = modid = 0
+
+    for c in range(1, escala.cursos + 1):
+        tipo = CURSO_TIPO_FP if c % 3 else CURSO_TIPO_INTENSIVO
+        estado_curso = rng.choices((ESTADO_VALIDADO, ESTADO_PROGRAMADO, ESTADO_BORRADOR), (6, 3, 1))[0]
+        cursos.append(dict(
+            id=c, nombre=f"Curso {c:03d} {tipo}", tipo=tipo, horas_totales=600, horas_semanales=20,
+            estado=estado_curso, es_plantilla=False, created_by_id=admin.id,
+            created_at=datetime.combine(FECHA_BASE, datetime.min.time()) - timedelta(days=c),
+        ))
+
+        modulos_curso = []
+        for _ in range(escala.modulos_por_curso):
+            modid += 1
+            modulos_curso.append(modid)
+            modulos.append(dict(
+                id=modid, curso_id=c, nombre=f"Módulo {modid}", horas_modulo=100,
+                anio_fp=1 if tipo == CURSO_TIPO_FP else None,
+            ))
+
+        for _ in range(escala.matriculas_por_curso):
+            mid += 1
+            creada = datetime.combine(FECHA_BASE, datetime.min.time()) + timedelta(
+                days=rng.randint(0, 120), minutes=rng.randint(0, 1439))
+            coste = float(rng.choice((300000, 450000, 600000)))
+            inicial = round(coste * 0.2, 2)
+            cuota = round((coste - inicial) / escala.cuotas, 2)
+            matriculas.append(dict(
+                id=mid, curso_id=c,
+                estudiante_nombre=f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}",
+                doc_identidad=f"GE{rng.randint(0, 10**7):07d}",
+                telefono=f"+240 222 {rng.randint(0, 999999):06d}",
+                email=f"alumno{mid}@example.org",
+                campus=rng.choice((CAMPUS_BATA, CAMPUS_MALABO)),
+                estado=rng.choices((ESTADO_MAT_VALIDADA, ESTADO_MAT_PENDIENTE, ESTADO_MAT_RECHAZADA), (8, 1, 1))[0],
+                coste_total=coste, numero_plazos=escala.cuotas, monto_inicial=inicial,
+                created_by_id=admin.id, created_at=creada,
+            ))
+
+            for modulo_id in modulos_curso:
+                aid += 1
+                nota = round(rng.uniform(2, 10), 2)
+                asignaturas.append(dict(
+                    id=aid, matricula_id=mid, modulo_id=modulo_id, nota=nota,
+                    estado="APROBADO" if nota >= 5 else "SUSPENSO",
+                ))
+                tipos = (TIPO_CALIF_ORDINARIO, TIPO_CALIF_PARCIAL, TIPO_CALIF_FINAL)
+                for k in range(escala.calificaciones_por_asignatura):
+                    cid += 1
+                    calificaciones.append(dict(
+                        id=cid, matricula_asignatura_id=aid, tipo=tipos[min(k, len(tipos) - 1)],
+                        valor=round(rng.uniform(0, 10), 2), fecha=creada + timedelta(days=30 * (k + 1)),
+                    ))
+
+            pid += 1
+            pagos.append(dict(
+                id=pid, matricula_id=mid, numero_cuota=0, monto=inicial, estado=ESTADO_PAGO_INICIAL,
+                es_pago_inicial=True, monto_inicial=inicial, fecha_pago=creada.date(),
+            ))
+            for n in range(1, escala.cuotas + 1):
+                pid += 1
+                vence = date(creada.year + (creada.month + n - 1) // 12, (creada.month + n - 1) % 12 + 1, 10)
+                estado = rng.choices(
+                    (ESTADO_PAGO_PENDIENTE, ESTADO_PAGO_VALIDADO, ESTADO_PAGO_PENDIENTE_VALIDACION, ESTADO_PAGO_RECHAZADO),
+                    (5, 4, 1, 0.5),
+                )[0]
+                pagos.append(dict(
+                    id=pid, matricula_id=mid, numero_cuota=n, monto=cuota, estado=estado,
+                    es_pago_inicial=False, fecha_vencimiento=vence,
+                    fecha_pago=vence - timedelta(days=rng.randint(0, 9)) if estado != ESTADO_PAGO_PENDIENTE else None,
+                ))
+
+            did += 1
+            ruta = _archivo(directorio_archivos, f"matricula_{mid}.pdf", rng)
+            docs_mat.append(dict(
+                id=did, matricula_id=mid, tipo="EXPEDIENTE_ACADEMICO", filename=f"matricula_{mid}.pdf", path=ruta,
+            ))
+
+    documentos = []
+    for d in range(1, escala.documentos + 1):
+        tipo = "entrada" if d % 2 else "salida"
+        fecha = FECHA_BASE + timedelta(days=rng.randint(0, 120))
+        ref = f"{'ENT' if tipo == 'entrada' else 'SAL'}-{fecha:%Y%m%d}-{d:04d}"
+        _archivo(directorio_archivos, f"{ref}_v1.pdf", rng, kb=8)
+        documentos.append(dict(
+            id=d, numero_referencia=ref, tipo=tipo, fecha=fecha,
+            remitente="Ministerio de Educación" if tipo == "entrada" else None,
+            destinatario="Delegación regional" if tipo == "salida" else None,
+            descripcion=f"Documento sintético {d} sobre matrícula, pagos y expedientes",
+            filename=f"{ref}.pdf", version=1, created_by_id=admin.id,
+        ))
+
+    for modelo, filas in (
+        (Curso, cursos), (Modulo, modulos), (Matricula, matriculas), (MatriculaAsignatura, asignaturas),
+        (Calificacion, calificaciones), (Pago, pagos), (MatriculaDocumento, docs_mat), (Documento, documentos),
+    ):
+        _insertar(modelo, filas)
+
+    _ajustar_secuencias([
+        "cursos", "cursos_modulos", "matriculas", "matricula_asignaturas", "calificaciones",
+        "pagos", "matricula_documentos", "documentos_registros",
+    ])
+    actualizar_saldos(db.session.connection())
+    db.session.commit()
+    reconstruir_contadores()
+
+    return {
+        "cursos": len(cursos), "modulos": len(modulos), "matriculas": len(matriculas),
+        "asignaturas": len(asignaturas), "calificaciones": len(calificaciones),
+        "pagos": len(pagos), "documentos_matricula": len(docs_mat), "documentos": len(documentos),
+    }
@@ -0,0 +1,164 @@
+"""
+Lanza los endpoints más usados con el test client de Flask y guarda los
+resultados en JSON.
+
+    python -m benchmarks.run [--db sqlite|postgres] [--url URL]
+                             [--cursos N] [--matriculas M] [--repeticiones R]
+                             [--cache null|memory] [--salida resultados.json]
+
+Por cada endpoint se hacen unas peticiones de calentamiento y luego
+`--repeticiones` medidas. Se guardan p50/p95/media de latencia y las
+consultas SQL por petición (tomadas de la instrumentación de app/perf.py).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from app import create_app
+from app.config import Config
+from app.extensions import db, perf
+from .datos import Escala, generar, USUARIO_BENCH, PASSWORD_BENCH
+
+# (nombre del endpoint, argumentos de url_for)
+ENDPOINTS = (
+    ("estadisticas.index", {}),
+    ("matriculas.index", {}),
+    ("pagos.index", {}),
+    ("validaciones.index", {}),
+    ("actas_expedientes.index", {}),
+)
+
+
+def percentil(valores, p) -> float:
+    """Percentil por rango más cercano (p en 0..100)."""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    k = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[k]
+
+
+def _commit_actual() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _crear_app(url_bd, directorio, cache_backend):
+    class BenchConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = url_bd
+        UPLOAD_FOLDER = directorio
+        CACHE_BACKEND = cache_backend
+        PERF_ENABLED = True
+
+    return create_app(BenchConfig)
+
+
+def medir(app, repeticiones=20, calentamiento=3) -> dict:
+    cliente = app.test_client()
+    rv = cliente.post("/usuarios/login", data={"username": USUARIO_BENCH, "password": PASSWORD_BENCH})
+    if rv.status_code != 302:
+        raise RuntimeError(f"No se pudo iniciar sesión con el usuario de benchmarks ({rv.status_code})")
+
+    with app.test_request_context():
+        from flask import url_for
+        urls = [(nombre, url_for(nombre, **kw)) for nombre, kw in ENDPOINTS]
+
+    resultados = {}
+    for nombre, url in urls:
+        for _ in range(calentamiento):
+            cliente.get(url)
+
+        latencias, consultas, sql_ms = [], [], []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            rv = cliente.get(url)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            if rv.status_code != 200:
+                raise RuntimeError(f"{nombre} ({url}) respondió {rv.status_code}")
+            muestra = perf.recientes(1)[0]
+            consultas.append(muestra.consultas)
+            sql_ms.append(muestra.sql_ms)
+
+        resultados[nombre] = {
+            "url": url,
+            "n": repeticiones,
+            "p50_ms": round(percentil(latencias, 50), 2),
+            "p95_ms": round(percentil(latencias, 95), 2),
+            "media_ms": round(sum(latencias) / len(latencias), 2),
+            "sql_media_ms": round(sum(sql_ms) / len(sql_ms), 2),
+            "consultas_media": round(sum(consultas) / len(consultas), 2),
+            "consultas_max": max(consultas),
+        }
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de los endpoints principales")
+    parser.add_argument("--db", choices=("sqlite", "postgres"), default="sqlite")
+    parser.add_argument("--url", help="URL de la BD (obligatoria con --db postgres; se BORRA su contenido)",
+                        default=os.getenv("BENCH_DATABASE_URL"))
+    parser.add_argument("--cursos", type=int, default=Escala.cursos)
+    parser.add_argument("--matriculas", type=int, default=Escala.matriculas_por_curso, help="matrículas por curso")
+    parser.add_argument("--documentos", type=int, default=Escala.documentos)
+    parser.add_argument("--semilla", type=int, default=Escala.semilla)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--calentamiento", type=int, default=3)
+    parser.add_argument("--cache", choices=("null", "memory"), default="null",
+                        help="backend de caché (null mide el coste real de cada petición)")
+    parser.add_argument("--salida", help="fichero JSON de resultados (por defecto, stdout)")
+    args = parser.parse_args(argv)
+
+    directorio = tempfile.mkdtemp(prefix="bbs_bench_")
+    if args.db == "sqlite":
+        url_bd = args.url or f"sqlite:///{os.path.join(directorio, 'bench.db')}"
+    else:
+        if not args.url:
+            parser.error("--db postgres necesita --url (o BENCH_DATABASE_URL)")
+        url_bd = args.url
+
+    escala = Escala(
+        cursos=args.cursos, matriculas_por_curso=args.matriculas,
+        documentos=args.documentos, semilla=args.semilla,
+    )
+    app = _crear_app(url_bd, os.path.join(directorio, "uploads"), args.cache)
+
+    with app.app_context():
+        inicio = time.perf_counter()
+        filas = generar(escala, os.path.join(directorio, "uploads"))
+        print(f"⏳ Datos generados en {time.perf_counter() - inicio:.1f}s: {filas}", file=sys.stderr)
+        db.session.remove()
+
+    resultados = {
+        "commit": _commit_actual(),
+        "fecha": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "db": args.db,
+        "cache": args.cache,
+        "escala": escala.como_dict(),
+        "filas": filas,
+        "endpoints": medir(app, args.repeticiones, args.calentamiento),
+    }
+
+    salida = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(salida + "\n")
+        print(f"✅ Resultados guardados en {args.salida}", file=sys.stderr)
+    else:
+        print(salida)
+
+
+if __name__ == "__main__":
+    main()
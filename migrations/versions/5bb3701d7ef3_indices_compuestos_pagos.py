@@ -0,0 +1,28 @@
+"""Índices compuestos en pagos para vencimientos y balances
+
+Revision ID: 5bb3701d7ef3
+Revises: 91ebb17673ab
+Create Date: 2026-10-17 10:03:15.274905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5bb3701d7ef3'
+down_revision = '91ebb17673ab'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pagos', schema=None) as batch_op:
+        batch_op.create_index('ix_pagos_estado_fecha_vencimiento', ['estado', 'fecha_vencimiento'], unique=False)
+        batch_op.create_index('ix_pagos_matricula_id_estado', ['matricula_id', 'estado'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pagos', schema=None) as batch_op:
+        batch_op.drop_index('ix_pagos_matricula_id_estado')
+        batch_op.drop_index('ix_pagos_estado_fecha_vencimiento')
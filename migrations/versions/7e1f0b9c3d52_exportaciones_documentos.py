@@ -0,0 +1,43 @@
+"""Exportaciones masivas de documentos de matrícula
+
+Revision ID: 7e1f0b9c3d52
+Revises: c41d2e8a9f60
+Create Date: 2026-10-17 12:05:12.801734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e1f0b9c3d52'
+down_revision = 'c41d2e8a9f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('exportaciones_documentos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('creado_por_id', sa.Integer(), nullable=True),
+    sa.Column('creado_en', sa.DateTime(), nullable=False),
+    sa.Column('finalizado_en', sa.DateTime(), nullable=True),
+    sa.Column('filtros', sa.JSON(), nullable=False),
+    sa.Column('descripcion', sa.String(length=200), nullable=False),
+    sa.Column('estado', sa.String(length=20), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('procesados', sa.Integer(), nullable=False),
+    sa.Column('bytes_escritos', sa.BigInteger(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['creado_por_id'], ['usuarios.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('exportaciones_documentos', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_exportaciones_documentos_estado'), ['estado'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('exportaciones_documentos', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_exportaciones_documentos_estado'))
+
+    op.drop_table('exportaciones_documentos')
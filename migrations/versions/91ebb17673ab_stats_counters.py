@@ -0,0 +1,43 @@
+"""Tabla stats_counters para estadísticas materializadas
+
+Revision ID: 91ebb17673ab
+Revises: 3aa3ee4ad497
+Create Date: 2026-10-17 09:12:41.508331
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '91ebb17673ab'
+down_revision = '3aa3ee4ad497'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'stats_counters',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('metrica', sa.String(length=32), nullable=False),
+        sa.Column('campus', sa.String(length=16), nullable=False),
+        sa.Column('curso_id', sa.Integer(), nullable=False),
+        sa.Column('estado', sa.String(length=24), nullable=False),
+        sa.Column('periodo', sa.String(length=10), nullable=False),
+        sa.Column('valor', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('metrica', 'campus', 'curso_id', 'estado', 'periodo', name='uq_stats_counters_clave')
+    )
+    with op.batch_alter_table('stats_counters', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stats_counters_metrica'), ['metrica'], unique=False)
+
+    # Los contadores se rellenan con `flask stats-rebuild` (ver Procfile / render.yaml)
+
+
+def downgrade():
+    with op.batch_alter_table('stats_counters', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stats_counters_metrica'))
+
+    op.drop_table('stats_counters')
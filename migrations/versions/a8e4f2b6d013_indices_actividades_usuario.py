@@ -0,0 +1,28 @@
+"""Índices de actividades_usuario: (usuario_id, fecha_hora) y fecha_hora
+
+Revision ID: a8e4f2b6d013
+Revises: f3a7c1d9e285
+Create Date: 2026-10-17 23:52:14.907215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8e4f2b6d013'
+down_revision = 'f3a7c1d9e285'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('actividades_usuario', schema=None) as batch_op:
+        batch_op.create_index('ix_actividades_usuario_usuario_fecha', ['usuario_id', 'fecha_hora'], unique=False)
+        batch_op.create_index('ix_actividades_usuario_fecha_hora', ['fecha_hora'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('actividades_usuario', schema=None) as batch_op:
+        batch_op.drop_index('ix_actividades_usuario_fecha_hora')
+        batch_op.drop_index('ix_actividades_usuario_usuario_fecha')
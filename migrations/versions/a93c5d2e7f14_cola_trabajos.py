@@ -0,0 +1,57 @@
+"""Cola de trabajos en segundo plano
+
+Revision ID: a93c5d2e7f14
+Revises: 7e1f0b9c3d52
+Create Date: 2026-10-17 19:20:41.337105
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a93c5d2e7f14'
+down_revision = '7e1f0b9c3d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('trabajos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tarea', sa.String(length=100), nullable=False),
+    sa.Column('args', sa.JSON(), nullable=False),
+    sa.Column('estado', sa.String(length=20), nullable=False),
+    sa.Column('intentos', sa.Integer(), nullable=False),
+    sa.Column('max_intentos', sa.Integer(), nullable=False),
+    sa.Column('ejecutar_despues', sa.DateTime(), nullable=False),
+    sa.Column('bloqueado_por', sa.String(length=100), nullable=True),
+    sa.Column('bloqueado_en', sa.DateTime(), nullable=True),
+    sa.Column('resultado', sa.JSON(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('creado_por_id', sa.Integer(), nullable=True),
+    sa.Column('creado_en', sa.DateTime(), nullable=False),
+    sa.Column('iniciado_en', sa.DateTime(), nullable=True),
+    sa.Column('finalizado_en', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['creado_por_id'], ['usuarios.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('trabajos', schema=None) as batch_op:
+        batch_op.create_index('ix_trabajos_estado_ejecutar_despues', ['estado', 'ejecutar_despues'], unique=False)
+        batch_op.create_index(batch_op.f('ix_trabajos_tarea'), ['tarea'], unique=False)
+
+    with op.batch_alter_table('exportaciones_documentos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('trabajo_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_exportaciones_documentos_trabajo_id', 'trabajos', ['trabajo_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('exportaciones_documentos', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_exportaciones_documentos_trabajo_id', type_='foreignkey')
+        batch_op.drop_column('trabajo_id')
+
+    with op.batch_alter_table('trabajos', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_trabajos_tarea'))
+        batch_op.drop_index('ix_trabajos_estado_ejecutar_despues')
+
+    op.drop_table('trabajos')
@@ -0,0 +1,73 @@
+"""Tabla sesiones_usuario; ultimo_login y sesion_activa dejan de ser columnas de usuarios
+
+Revision ID: b2f6d8e4a517
+Revises: a8e4f2b6d013
+Create Date: 2026-10-18 00:37:52.164093
+
+"""
+import secrets
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2f6d8e4a517'
+down_revision = 'a8e4f2b6d013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    sesiones = op.create_table(
+        'sesiones_usuario',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('token', sa.String(length=64), nullable=False),
+        sa.Column('inicio', sa.DateTime(), nullable=False),
+        sa.Column('fin', sa.DateTime(), nullable=True),
+        sa.Column('ip', sa.String(length=100), nullable=True),
+        sa.Column('agente', sa.String(length=255), nullable=True),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('token'),
+    )
+    with op.batch_alter_table('sesiones_usuario', schema=None) as batch_op:
+        batch_op.create_index('ix_sesiones_usuario_usuario_inicio', ['usuario_id', 'inicio'], unique=False)
+
+    # El último acceso conocido pasa a ser una sesión ya cerrada
+    conn = op.get_bind()
+    usuarios = sa.table('usuarios', sa.column('id'), sa.column('ultimo_login', sa.DateTime()))
+    filas = conn.execute(
+        sa.select(usuarios.c.id, usuarios.c.ultimo_login).where(usuarios.c.ultimo_login.isnot(None))
+    ).all()
+    if filas:
+        conn.execute(sesiones.insert(), [
+            {"usuario_id": id_, "token": secrets.token_urlsafe(32), "inicio": ultimo, "fin": ultimo}
+            for id_, ultimo in filas
+        ])
+
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.drop_column('ultimo_login')
+        batch_op.drop_column('sesion_activa')
+
+
+def downgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sesion_activa', sa.Boolean(), nullable=True))
+        batch_op.add_column(sa.Column('ultimo_login', sa.DateTime(), nullable=True))
+
+    conn = op.get_bind()
+    usuarios = sa.table('usuarios', sa.column('id'), sa.column('ultimo_login', sa.DateTime()),
+                        sa.column('sesion_activa', sa.Boolean()))
+    sesiones = sa.table('sesiones_usuario', sa.column('usuario_id'), sa.column('inicio', sa.DateTime()),
+                        sa.column('fin', sa.DateTime()))
+    conn.execute(usuarios.update().values(
+        ultimo_login=sa.select(sa.func.max(sesiones.c.inicio))
+        .where(sesiones.c.usuario_id == usuarios.c.id).scalar_subquery(),
+        sesion_activa=sa.exists().where(sesiones.c.usuario_id == usuarios.c.id, sesiones.c.fin.is_(None)),
+    ))
+
+    with op.batch_alter_table('sesiones_usuario', schema=None) as batch_op:
+        batch_op.drop_index('ix_sesiones_usuario_usuario_inicio')
+    op.drop_table('sesiones_usuario')
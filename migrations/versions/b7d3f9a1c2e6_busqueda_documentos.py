@@ -0,0 +1,66 @@
+"""Índice de texto completo del registro de documentos (FTS5 / tsvector + GIN)
+
+Revision ID: b7d3f9a1c2e6
+Revises: d5e8a1f04b7c
+Create Date: 2026-10-17 20:41:36.218904
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3f9a1c2e6'
+down_revision = 'd5e8a1f04b7c'
+branch_labels = None
+depends_on = None
+
+CAMPOS = "numero_referencia, remitente, destinatario, remitente_interno, descripcion, observaciones"
+NUEVOS = ", ".join(f"new.{c.strip()}" for c in CAMPOS.split(","))
+VIEJOS = ", ".join(f"old.{c.strip()}" for c in CAMPOS.split(","))
+
+
+def upgrade():
+    dialecto = op.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        # Columna generada: PostgreSQL la recalcula en cada insert/update
+        op.execute(
+            "ALTER TABLE documentos_registros ADD COLUMN IF NOT EXISTS busqueda tsvector GENERATED ALWAYS AS ("
+            " setweight(to_tsvector('spanish', coalesce(numero_referencia, '')), 'A')"
+            " || setweight(to_tsvector('spanish', coalesce(remitente, '') || ' ' || coalesce(destinatario, '')"
+            " || ' ' || coalesce(remitente_interno, '')), 'B')"
+            " || setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'B')"
+            " || setweight(to_tsvector('spanish', coalesce(observaciones, '')), 'C')) STORED"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_documentos_registros_busqueda ON documentos_registros USING gin (busqueda)")
+    elif dialecto == 'sqlite':
+        op.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS documentos_fts USING fts5({CAMPOS}, "
+            "content='documentos_registros', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS documentos_fts_ai AFTER INSERT ON documentos_registros BEGIN "
+            f"INSERT INTO documentos_fts(rowid, {CAMPOS}) VALUES (new.id, {NUEVOS}); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS documentos_fts_ad AFTER DELETE ON documentos_registros BEGIN "
+            f"INSERT INTO documentos_fts(documentos_fts, rowid, {CAMPOS}) VALUES ('delete', old.id, {VIEJOS}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS documentos_fts_au AFTER UPDATE OF {CAMPOS} ON documentos_registros BEGIN "
+            f"INSERT INTO documentos_fts(documentos_fts, rowid, {CAMPOS}) VALUES ('delete', old.id, {VIEJOS}); "
+            f"INSERT INTO documentos_fts(rowid, {CAMPOS}) VALUES (new.id, {NUEVOS}); END"
+        )
+        # Indexa los registros que ya existían
+        op.execute("INSERT INTO documentos_fts(documentos_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialecto = op.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_documentos_registros_busqueda")
+        op.execute("ALTER TABLE documentos_registros DROP COLUMN IF EXISTS busqueda")
+    elif dialecto == 'sqlite':
+        for trigger in ('documentos_fts_ai', 'documentos_fts_ad', 'documentos_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS documentos_fts")
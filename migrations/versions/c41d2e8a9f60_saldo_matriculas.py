@@ -0,0 +1,46 @@
+"""Saldo desnormalizado en matriculas (total_pagado, deuda_actual, cuotas_pendientes)
+
+Revision ID: c41d2e8a9f60
+Revises: 5bb3701d7ef3
+Create Date: 2026-10-17 11:20:41.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d2e8a9f60'
+down_revision = '5bb3701d7ef3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('matriculas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_pagado', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('deuda_actual', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('cuotas_pendientes', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.create_index(batch_op.f('ix_matriculas_deuda_actual'), ['deuda_actual'], unique=False)
+
+    # Rellenar el saldo de las matrículas existentes a partir de sus pagos
+    op.execute("""
+        UPDATE matriculas SET
+            total_pagado = (
+                SELECT COALESCE(SUM(CASE WHEN p.estado = 'VALIDADO' OR p.es_pago_inicial THEN p.monto ELSE 0 END), 0)
+                FROM pagos p WHERE p.matricula_id = matriculas.id
+            ),
+            cuotas_pendientes = (
+                SELECT COUNT(p.id) - COALESCE(SUM(CASE WHEN p.estado = 'VALIDADO' OR p.es_pago_inicial THEN 1 ELSE 0 END), 0)
+                FROM pagos p WHERE p.matricula_id = matriculas.id
+            )
+    """)
+    op.execute("UPDATE matriculas SET deuda_actual = coste_total - total_pagado")
+
+
+def downgrade():
+    with op.batch_alter_table('matriculas', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_matriculas_deuda_actual'))
+        batch_op.drop_column('cuotas_pendientes')
+        batch_op.drop_column('deuda_actual')
+        batch_op.drop_column('total_pagado')
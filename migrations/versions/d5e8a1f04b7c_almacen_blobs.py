@@ -0,0 +1,62 @@
+"""Almacén de ficheros por contenido (blobs con refcount)
+
+Revision ID: d5e8a1f04b7c
+Revises: a93c5d2e7f14
+Create Date: 2026-10-17 20:02:17.449023
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5e8a1f04b7c'
+down_revision = 'a93c5d2e7f14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('tamano', sa.BigInteger(), nullable=False),
+    sa.Column('refcount', sa.Integer(), nullable=False),
+    sa.Column('creado_en', sa.DateTime(), nullable=False),
+    sa.Column('actualizado_en', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    with op.batch_alter_table('blobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_blobs_actualizado_en'), ['actualizado_en'], unique=False)
+
+    with op.batch_alter_table('matricula_documentos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sha256', sa.String(length=64), nullable=True))
+        batch_op.alter_column('path', existing_type=sa.String(length=300), nullable=True)
+        batch_op.create_index(batch_op.f('ix_matricula_documentos_sha256'), ['sha256'], unique=False)
+
+    with op.batch_alter_table('pagos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('comprobante_sha256', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_pagos_comprobante_sha256'), ['comprobante_sha256'], unique=False)
+
+    with op.batch_alter_table('documentos_registros', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sha256', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_documentos_registros_sha256'), ['sha256'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('documentos_registros', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_documentos_registros_sha256'))
+        batch_op.drop_column('sha256')
+
+    with op.batch_alter_table('pagos', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_pagos_comprobante_sha256'))
+        batch_op.drop_column('comprobante_sha256')
+
+    with op.batch_alter_table('matricula_documentos', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_matricula_documentos_sha256'))
+        batch_op.alter_column('path', existing_type=sa.String(length=300), nullable=False)
+        batch_op.drop_column('sha256')
+
+    with op.batch_alter_table('blobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_blobs_actualizado_en'))
+
+    op.drop_table('blobs')
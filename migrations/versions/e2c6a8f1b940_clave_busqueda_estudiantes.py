@@ -0,0 +1,28 @@
+"""Extensión pg_trgm para la búsqueda difusa de estudiantes (PostgreSQL)
+
+La clave de búsqueda y su índice GIN se crean en la tabla `estudiantes`
+(f3a7c1d9e285), no en `matriculas`.
+
+Revision ID: e2c6a8f1b940
+Revises: b7d3f9a1c2e6
+Create Date: 2026-10-17 21:18:52.660127
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c6a8f1b940'
+down_revision = 'b7d3f9a1c2e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+
+def downgrade():
+    # La extensión se deja: otros índices o consultas pueden usarla
+    pass
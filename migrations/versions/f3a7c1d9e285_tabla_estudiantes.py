@@ -0,0 +1,120 @@
+"""Tabla estudiantes (expedientes) con contadores, enlazada desde matrículas
+
+Revision ID: f3a7c1d9e285
+Revises: e2c6a8f1b940
+Create Date: 2026-10-17 22:41:07.318452
+
+"""
+import re
+import unicodedata
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a7c1d9e285'
+down_revision = 'e2c6a8f1b940'
+branch_labels = None
+depends_on = None
+
+
+def _normalizar(texto):
+    # Igual que app.busqueda_difusa.normalizar (copiada: la migración no depende del código de la app)
+    if not texto:
+        return ""
+    sin_tildes = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9]+", sin_tildes.lower()))
+
+
+def _clave(nombre, doc):
+    # Igual que app.actas_expedientes.models.clave_estudiante
+    doc = _normalizar(doc).replace(" ", "")
+    return f"doc:{doc}" if doc else f"nombre:{_normalizar(nombre)}"
+
+
+def upgrade():
+    conn = op.get_bind()
+    # Bases creadas con la primera versión de e2c6a8f1b940, que ponía la clave en matrículas
+    clave_en_matriculas = any(c['name'] == 'clave_busqueda' for c in sa.inspect(conn).get_columns('matriculas'))
+    if clave_en_matriculas and conn.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_matriculas_clave_busqueda_trgm")
+
+    estudiantes = op.create_table(
+        'estudiantes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('clave', sa.String(length=230), nullable=False),
+        sa.Column('nombre', sa.String(length=150), nullable=False),
+        sa.Column('doc_identidad', sa.String(length=64), nullable=True),
+        sa.Column('clave_busqueda', sa.String(length=220), nullable=True),
+        sa.Column('num_matriculas', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('ultimo_registro', sa.DateTime(), nullable=True),
+        sa.Column('creado_en', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('clave'),
+    )
+    with op.batch_alter_table('estudiantes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_estudiantes_ultimo_registro'), ['ultimo_registro'], unique=False)
+
+    with op.batch_alter_table('matriculas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('estudiante_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_matriculas_estudiante_id'), ['estudiante_id'], unique=False)
+        batch_op.create_foreign_key('fk_matriculas_estudiante_id', 'estudiantes', ['estudiante_id'], ['id'],
+                                    ondelete='SET NULL')
+        if clave_en_matriculas:
+            batch_op.drop_column('clave_busqueda')
+
+    # Un estudiante por documento normalizado (o nombre, sin documento).
+    # Nombre y documento: los de su matrícula más reciente.
+    matriculas = sa.table('matriculas', sa.column('id'), sa.column('estudiante_nombre'),
+                          sa.column('doc_identidad'), sa.column('created_at', sa.DateTime()),
+                          sa.column('estudiante_id'))
+    filas = conn.execute(
+        sa.select(matriculas.c.id, matriculas.c.estudiante_nombre, matriculas.c.doc_identidad, matriculas.c.created_at)
+        .order_by(matriculas.c.created_at, matriculas.c.id)
+    ).all()
+    grupos = {}
+    for id_, nombre, doc, creada in filas:
+        grupo = grupos.setdefault(_clave(nombre, doc), {"ids": [], "ultimo": None})
+        grupo["ids"].append(id_)
+        grupo["nombre"], grupo["doc"] = nombre, doc
+        if creada is not None:
+            grupo["ultimo"] = creada
+
+    ahora = datetime.utcnow()
+    for clave, grupo in grupos.items():
+        nombre, doc = grupo["nombre"], grupo["doc"]
+        estudiante_id = conn.execute(
+            estudiantes.insert().values(
+                clave=clave,
+                nombre=(nombre or "").strip() or "—",
+                doc_identidad=(doc or "").strip() or None,
+                clave_busqueda=_normalizar(f"{nombre or ''} {doc or ''}"),
+                num_matriculas=len(grupo["ids"]),
+                ultimo_registro=grupo["ultimo"],
+                creado_en=ahora,
+            ).returning(estudiantes.c.id)
+        ).scalar_one()
+        conn.execute(
+            matriculas.update().where(matriculas.c.id.in_(grupo["ids"])).values(estudiante_id=estudiante_id)
+        )
+
+    if conn.dialect.name == 'postgresql':
+        op.execute("CREATE INDEX IF NOT EXISTS ix_estudiantes_clave_busqueda_trgm "
+                   "ON estudiantes USING gin (clave_busqueda gin_trgm_ops)")
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_estudiantes_clave_busqueda_trgm")
+
+    with op.batch_alter_table('matriculas', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_matriculas_estudiante_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_matriculas_estudiante_id'))
+        batch_op.drop_column('estudiante_id')
+
+    with op.batch_alter_table('estudiantes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_estudiantes_ultimo_registro'))
+    op.drop_table('estudiantes')
@@ -194,8 +194,6 @@ def seed_data():
         full_name="Administrador del Sistema",
         email="admin@bbs.edu",
         activo=True,
-        ultimo_login=datetime.now(),
-        sesion_activa=False
     )
     
     if hasattr(admin, "set_password"):
@@ -0,0 +1,50 @@
+"""
+Fixtures comunes: aplicación con SQLite en memoria y directorios temporales
+(almacén de ficheros, auditoría), un usuario y un curso.
+
+`app` deja su contexto activo durante el test (para usar `db.session`
+directamente). Las peticiones del cliente de pruebas reutilizan ese
+contexto y su `g`, así que los tests de sesión con varios clientes
+(test_identidad.py) usan su propia aplicación sin contexto activo.
+"""
+import pytest
+
+from app import create_app, db
+from app.config import TestingConfig
+from app.cursos.models import Curso, CURSO_TIPO_FP
+from app.usuarios.models import Usuario
+
+
+@pytest.fixture
+def app(tmp_path):
+    class Cfg(TestingConfig):
+        WTF_CSRF_ENABLED = False
+        UPLOAD_FOLDER = str(tmp_path / "uploads")
+        AUDITORIA_SPOOL_DIR = str(tmp_path / "auditoria")
+        AUDITORIA_ARCHIVO_DIR = str(tmp_path / "auditoria" / "archivo")
+        MINIATURAS_DIR = str(tmp_path / "miniaturas")
+
+    app = create_app(Cfg)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def usuario(app):
+    usuario = Usuario(username="admin", full_name="Admin", activo=True)
+    usuario.set_password("clave123")
+    db.session.add(usuario)
+    db.session.commit()
+    return usuario
+
+
+@pytest.fixture
+def curso(usuario):
+    curso = Curso(nombre="Informática", tipo=CURSO_TIPO_FP, horas_totales=100, horas_semanales=10,
+                  created_by_id=usuario.id)
+    db.session.add(curso)
+    db.session.commit()
+    return curso
@@ -0,0 +1,93 @@
+"""
+Retención de la actividad de usuarios (app/auditoria.py): `flask
+audit-archive` pasa cada mes fuera de la retención a su fichero y lo borra
+de la tabla, sin perder ni duplicar filas al repetirse.
+"""
+import os
+from datetime import datetime
+from unittest import mock
+
+import pytest
+
+from app.extensions import db
+from app.auditoria import archivar_mes, leer_archivo, meses_a_archivar, ruta_archivo, _mes, _sumar_meses
+from app.models_shared import ActividadUsuario
+
+
+def _actividad(usuario, accion, fecha, **extra):
+    fila = ActividadUsuario(usuario_id=usuario.id, accion=accion, fecha_hora=fecha, **extra)
+    db.session.add(fila)
+    db.session.commit()
+    return fila
+
+
+def _archivadas(mes):
+    ruta = ruta_archivo(mes)
+    return [f["accion"] for f in leer_archivo(ruta)] if os.path.exists(ruta) else []
+
+
+@pytest.fixture
+def este_mes():
+    return _mes(datetime.utcnow())
+
+
+def test_meses_fuera_de_la_retencion(usuario, este_mes):
+    for atras in (0, 2, 3, 5, 14):
+        _actividad(usuario, f"hace {atras}", _sumar_meses(este_mes, -atras))
+    # Con 3 meses de retención se conservan este mes y los dos anteriores
+    assert meses_a_archivar(3) == [_sumar_meses(este_mes, -n) for n in (14, 5, 3)]
+    assert meses_a_archivar(24) == []
+
+
+def test_audit_archive(app, usuario, este_mes):
+    viejo, reciente = _sumar_meses(este_mes, -13), _sumar_meses(este_mes, -1)
+    _actividad(usuario, "antigua 1", viejo.replace(day=3), ip="10.0.0.1", detalles="x")
+    _actividad(usuario, "antigua 2", viejo.replace(day=20))
+    _actividad(usuario, "reciente", reciente)
+
+    salida = app.test_cli_runner().invoke(args=["audit-archive", "--meses", "12"])
+    assert salida.exception is None, salida.output
+    assert [a.accion for a in ActividadUsuario.query] == ["reciente"]
+    filas = list(leer_archivo(ruta_archivo(viejo)))
+    assert [f["accion"] for f in filas] == ["antigua 1", "antigua 2"]
+    assert filas[0]["ip"] == "10.0.0.1" and filas[0]["detalles"] == "x"
+    assert filas[0]["fecha_hora"] == viejo.replace(day=3).isoformat()
+
+    salida = app.test_cli_runner().invoke(args=["audit-archive", "--meses", "12"])
+    assert "Nada que archivar" in salida.output
+    assert ActividadUsuario.query.count() == 1
+
+
+def test_fila_tardia_con_id_reutilizado(usuario, este_mes):
+    # En SQLite los ids de filas borradas se reutilizan
+    for i in range(11):
+        _actividad(usuario, f"reciente {i}", este_mes)
+    mes = datetime(2025, 1, 1)
+    db.session.add_all([
+        ActividadUsuario(id=12, usuario_id=usuario.id, accion="v1", fecha_hora=datetime(2025, 1, 5)),
+        ActividadUsuario(id=13, usuario_id=usuario.id, accion="v2", fecha_hora=datetime(2025, 1, 6)),
+    ])
+    db.session.commit()
+    assert archivar_mes(mes) == 2
+
+    tardia = _actividad(usuario, "tardía", datetime(2025, 1, 20))
+    assert tardia.id == 12
+    assert archivar_mes(mes) == 1
+    assert _archivadas(mes) == ["v1", "v2", "tardía"]
+    assert ActividadUsuario.query.filter(ActividadUsuario.fecha_hora < este_mes).count() == 0
+
+
+def test_ejecucion_interrumpida_no_pierde_ni_duplica(usuario):
+    mes = datetime(2025, 2, 1)
+    _actividad(usuario, "a", datetime(2025, 2, 1))
+    _actividad(usuario, "b", datetime(2025, 2, 2))
+    # Se escribe el fichero pero falla el borrado
+    with mock.patch("app.auditoria.delete", side_effect=RuntimeError("corte")):
+        with pytest.raises(RuntimeError):
+            archivar_mes(mes)
+    db.session.rollback()
+    assert ActividadUsuario.query.count() == 2
+
+    assert archivar_mes(mes) == 2
+    assert ActividadUsuario.query.count() == 0
+    assert _archivadas(mes) == ["a", "b"]
@@ -0,0 +1,103 @@
+"""
+Cuenta de referencias de los blobs (app/storage/referencias.py): cada fila
+que guarda un hash suma una referencia al crearse y la resta al borrarse o
+cambiar de fichero, en la misma transacción.
+"""
+import io
+import os
+from datetime import date, datetime, timedelta
+
+from app.extensions import db, storage
+from app.documentos.models import Documento
+from app.matriculas.models import Matricula, MatriculaDocumento, CAMPUS_BATA
+from app.pagos.models import Pago
+from app.storage.models import Blob
+from app.storage.referencias import recontar, recolectar
+
+
+def _guardar(contenido: bytes) -> str:
+    return storage.guardar(io.BytesIO(contenido))
+
+
+def _refs(clave):
+    db.session.expire_all()
+    return db.session.get(Blob, clave).refcount
+
+
+def _documento(usuario, referencia, clave):
+    return Documento(numero_referencia=referencia, tipo="entrada", fecha=date(2026, 5, 1), descripcion="Oficio",
+                     filename="oficio.pdf", sha256=clave, created_by_id=usuario.id)
+
+
+def test_mismo_contenido_un_solo_blob(curso):
+    a, b = _guardar(b"expediente"), _guardar(b"expediente")
+    assert a == b
+    m = Matricula(curso_id=curso.id, estudiante_nombre="Ana", campus=CAMPUS_BATA)
+    m.documentos = [MatriculaDocumento(tipo="EXPEDIENTE_ACADEMICO", filename="e.pdf", sha256=a),
+                    MatriculaDocumento(tipo="FACTURA_PRIMER_PAGO", filename="f.pdf", sha256=b)]
+    db.session.add(m)
+    db.session.commit()
+    assert Blob.query.count() == 1
+    assert _refs(a) == 2
+    assert storage.existe(a)
+
+
+def test_referencias_de_todas_las_tablas(curso, usuario):
+    clave = _guardar(b"comprobante")
+    m = Matricula(curso_id=curso.id, estudiante_nombre="Ana", campus=CAMPUS_BATA)
+    pago = Pago(matricula=m, numero_cuota=1, monto=10, comprobante_sha256=clave)
+    doc = _documento(usuario, "E-1", clave)
+    db.session.add_all([m, pago, doc])
+    db.session.commit()
+    assert _refs(clave) == 2
+
+    db.session.delete(doc)
+    db.session.commit()
+    assert _refs(clave) == 1
+
+    db.session.delete(pago)
+    db.session.commit()
+    assert _refs(clave) == 0
+
+
+def test_cambiar_de_fichero_mueve_la_referencia(usuario):
+    v1, v2 = _guardar(b"version 1"), _guardar(b"version 2")
+    doc = _documento(usuario, "E-2", v1)
+    db.session.add(doc)
+    db.session.commit()
+    assert (_refs(v1), _refs(v2)) == (1, 0)
+
+    doc = db.session.get(Documento, doc.id)
+    doc.sha256, doc.version = v2, 2
+    db.session.commit()
+    assert (_refs(v1), _refs(v2)) == (0, 1)
+
+    doc = db.session.get(Documento, doc.id)
+    doc.sha256 = None
+    db.session.commit()
+    assert _refs(v2) == 0
+
+
+def test_rollback_no_cuenta(usuario):
+    clave = _guardar(b"confirmado")
+    db.session.add(_documento(usuario, "E-3", clave))
+    db.session.commit()
+
+    db.session.add(_documento(usuario, "E-4", clave))
+    db.session.flush()
+    db.session.rollback()
+    assert _refs(clave) == 1
+    assert recontar() == 0
+
+
+def test_recolectar_solo_los_que_no_se_usan(usuario):
+    usado, libre = _guardar(b"usado"), _guardar(b"libre")
+    db.session.add(_documento(usuario, "E-5", usado))
+    db.session.commit()
+    # Fuera del margen de recolección
+    Blob.query.update({Blob.actualizado_en: datetime.utcnow() - timedelta(days=1)})
+    db.session.commit()
+
+    assert recolectar(margen_minutos=60)["blobs"] == 1
+    assert db.session.get(Blob, libre) is None and not os.path.exists(storage.ruta_local(libre))
+    assert _refs(usado) == 1 and storage.existe(usado)
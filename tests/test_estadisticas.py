@@ -0,0 +1,100 @@
+"""
+Contadores de stats_counters (app/estadisticas/contadores.py): los listeners
+los mantienen al crear, modificar y borrar cursos, matrículas y pagos, y
+siempre coinciden con un recálculo desde cero.
+"""
+from datetime import date, datetime
+
+from app.extensions import db
+from app.cursos.models import ESTADO_BORRADOR, ESTADO_VALIDADO
+from app.estadisticas.contadores import reconstruir_contadores
+from app.estadisticas.models import (
+    StatCounter, METRICA_CURSOS, METRICA_MATRICULAS, METRICA_MATRICULAS_COSTE,
+    METRICA_MATRICULAS_DIA, METRICA_PAGOS, METRICA_COBRADO_DIA,
+)
+from app.matriculas.models import Matricula, ESTADO_MAT_PENDIENTE, ESTADO_MAT_VALIDADA, CAMPUS_BATA, CAMPUS_MALABO
+from app.pagos.models import Pago, ESTADO_PAGO_PENDIENTE, ESTADO_PAGO_VALIDADO
+
+ALTA = datetime(2026, 3, 10, 9, 30)
+
+
+def _contadores():
+    """{(metrica, campus, curso_id, estado, periodo): valor} sin los que están a cero."""
+    return {
+        (c.metrica, c.campus, c.curso_id, c.estado, c.periodo): c.valor
+        for c in StatCounter.query.all() if c.valor
+    }
+
+
+def _coincide_con_recalculo():
+    incremental = _contadores()
+    reconstruir_contadores()
+    assert _contadores() == incremental
+
+
+def test_cursos_por_estado(curso):
+    assert _contadores()[(METRICA_CURSOS, "", 0, ESTADO_BORRADOR, "")] == 1
+
+    curso.estado = ESTADO_VALIDADO
+    db.session.commit()
+    contadores = _contadores()
+    assert (METRICA_CURSOS, "", 0, ESTADO_BORRADOR, "") not in contadores
+    assert contadores[(METRICA_CURSOS, "", 0, ESTADO_VALIDADO, "")] == 1
+    _coincide_con_recalculo()
+
+
+def test_matriculas_alta_cambio_y_baja(curso):
+    m = Matricula(curso_id=curso.id, estudiante_nombre="Ana", campus=CAMPUS_BATA,
+                  estado=ESTADO_MAT_PENDIENTE, coste_total=1000, created_at=ALTA)
+    db.session.add(m)
+    db.session.commit()
+    contadores = _contadores()
+    assert contadores[(METRICA_MATRICULAS, CAMPUS_BATA, curso.id, ESTADO_MAT_PENDIENTE, "2026-03")] == 1
+    assert contadores[(METRICA_MATRICULAS_COSTE, CAMPUS_BATA, curso.id, ESTADO_MAT_PENDIENTE, "2026-03")] == 1000
+    assert contadores[(METRICA_MATRICULAS_DIA, "", 0, "", "2026-03-10")] == 1
+
+    # Cambiar estado, campus y coste mueve el aporte a la clave nueva
+    m.estado, m.campus, m.coste_total = ESTADO_MAT_VALIDADA, CAMPUS_MALABO, 1200
+    db.session.commit()
+    contadores = _contadores()
+    assert (METRICA_MATRICULAS, CAMPUS_BATA, curso.id, ESTADO_MAT_PENDIENTE, "2026-03") not in contadores
+    assert contadores[(METRICA_MATRICULAS, CAMPUS_MALABO, curso.id, ESTADO_MAT_VALIDADA, "2026-03")] == 1
+    assert contadores[(METRICA_MATRICULAS_COSTE, CAMPUS_MALABO, curso.id, ESTADO_MAT_VALIDADA, "2026-03")] == 1200
+    _coincide_con_recalculo()
+
+    db.session.delete(m)
+    db.session.commit()
+    assert not [k for k in _contadores() if k[0].startswith("matriculas")]
+
+
+def test_pagos_y_cobrado(curso):
+    m = Matricula(curso_id=curso.id, estudiante_nombre="Ana", campus=CAMPUS_BATA, coste_total=600, created_at=ALTA)
+    pago = Pago(matricula=m, numero_cuota=1, monto=300, estado=ESTADO_PAGO_PENDIENTE, fecha_pago=date(2026, 4, 2))
+    db.session.add_all([m, pago])
+    db.session.commit()
+    contadores = _contadores()
+    assert contadores[(METRICA_PAGOS, "", 0, ESTADO_PAGO_PENDIENTE, "2026-04")] == 1
+    assert (METRICA_COBRADO_DIA, "", 0, "", "2026-04-02") not in contadores
+
+    pago.estado = ESTADO_PAGO_VALIDADO
+    db.session.commit()
+    contadores = _contadores()
+    assert contadores[(METRICA_PAGOS, "", 0, ESTADO_PAGO_VALIDADO, "2026-04")] == 1
+    assert contadores[(METRICA_COBRADO_DIA, "", 0, "", "2026-04-02")] == 300
+
+    pago.monto = 250
+    db.session.commit()
+    assert _contadores()[(METRICA_COBRADO_DIA, "", 0, "", "2026-04-02")] == 250
+    _coincide_con_recalculo()
+
+    db.session.delete(pago)
+    db.session.commit()
+    assert not [k for k in _contadores() if k[0] in (METRICA_PAGOS, METRICA_COBRADO_DIA)]
+
+
+def test_rollback_no_deja_aporte(curso):
+    antes = _contadores()
+    db.session.add(Matricula(curso_id=curso.id, estudiante_nombre="Ana", campus=CAMPUS_BATA, coste_total=10))
+    db.session.flush()
+    db.session.rollback()
+    assert _contadores() == antes
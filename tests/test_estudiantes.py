@@ -0,0 +1,89 @@
+"""
+Estudiantes (expedientes) y sus contadores (app/actas_expedientes/models.py):
+al crear, editar o borrar matrículas se agrupan por documento normalizado y
+se recalculan num_matriculas y ultimo_registro en el mismo flush.
+"""
+from datetime import datetime
+
+from app.extensions import db
+from app.actas_expedientes.models import Estudiante
+from app.matriculas.models import Matricula, CAMPUS_BATA
+
+
+def _matricula(curso, nombre, doc, creada):
+    m = Matricula(curso_id=curso.id, estudiante_nombre=nombre, doc_identidad=doc, campus=CAMPUS_BATA, created_at=creada)
+    db.session.add(m)
+    db.session.commit()
+    return m
+
+
+def _estudiante(clave):
+    db.session.expire_all()
+    return Estudiante.query.filter_by(clave=clave).one()
+
+
+def test_agrupa_por_documento_normalizado(curso):
+    a = _matricula(curso, "José García", "X-123", datetime(2024, 1, 1))
+    b = _matricula(curso, "Jose Garcia Lopez", "x123 ", datetime(2025, 1, 1))
+    est = _estudiante("doc:x123")
+    assert a.estudiante_id == b.estudiante_id == est.id
+    assert est.num_matriculas == 2
+    assert est.ultimo_registro == datetime(2025, 1, 1)
+    # Nombre y documento de la matrícula más reciente
+    assert (est.nombre, est.doc_identidad) == ("Jose Garcia Lopez", "x123")
+    assert est.clave_busqueda == "jose garcia lopez x123"
+
+
+def test_sin_documento_agrupa_por_nombre(curso):
+    _matricula(curso, "Ana", None, datetime(2024, 5, 5))
+    _matricula(curso, "ana ", "", datetime(2023, 1, 1))
+    assert _estudiante("nombre:ana").num_matriculas == 2
+
+
+def test_editar_matricula_antigua_no_renombra(curso):
+    antigua = _matricula(curso, "José García", "X-123", datetime(2024, 1, 1))
+    _matricula(curso, "José García López", "X-123", datetime(2025, 1, 1))
+    antigua.estudiante_nombre = "Pepe"
+    db.session.commit()
+    assert _estudiante("doc:x123").nombre == "José García López"
+
+
+def test_cambiar_documento_mueve_la_matricula(curso):
+    a = _matricula(curso, "Ana", "A1", datetime(2024, 1, 1))
+    b = _matricula(curso, "Ana", "A1", datetime(2025, 1, 1))
+
+    b = db.session.get(Matricula, b.id)
+    b.doc_identidad = "B2"
+    db.session.commit()
+    viejo, nuevo = _estudiante("doc:a1"), _estudiante("doc:b2")
+    assert (viejo.num_matriculas, viejo.ultimo_registro) == (1, datetime(2024, 1, 1))
+    assert (nuevo.num_matriculas, nuevo.ultimo_registro) == (1, datetime(2025, 1, 1))
+    assert db.session.get(Matricula, b.id).estudiante_id == nuevo.id
+    assert db.session.get(Matricula, a.id).estudiante_id == viejo.id
+
+
+def test_borrar_matriculas_actualiza_contadores(curso):
+    a = _matricula(curso, "Ana", "A1", datetime(2024, 1, 1))
+    b = _matricula(curso, "Ana", "A1", datetime(2025, 1, 1))
+
+    db.session.delete(db.session.get(Matricula, b.id))
+    db.session.commit()
+    est = _estudiante("doc:a1")
+    assert (est.num_matriculas, est.ultimo_registro) == (1, datetime(2024, 1, 1))
+
+    db.session.delete(db.session.get(Matricula, a.id))
+    db.session.commit()
+    est = _estudiante("doc:a1")
+    assert (est.num_matriculas, est.ultimo_registro) == (0, None)
+
+
+def test_contadores_cuadran_con_las_matriculas(curso):
+    for i, (nombre, doc) in enumerate([("Ana", "A1"), ("Luis", None), ("Ana", "a-1"), ("luis", None), ("Eva", "E9")]):
+        _matricula(curso, nombre, doc, datetime(2025, 1, i + 1))
+    db.session.delete(Matricula.query.filter_by(doc_identidad="E9").one())
+    db.session.commit()
+    db.session.expire_all()
+    for est in Estudiante.query.all():
+        fechas = [m.created_at for m in Matricula.query.filter_by(estudiante_id=est.id)]
+        assert est.num_matriculas == len(fechas)
+        assert est.ultimo_registro == (max(fechas) if fechas else None)
@@ -0,0 +1,78 @@
+"""
+Identidad en caché (app/usuarios/identidad.py): la versión de la contraseña
+viaja en la cookie "recordarme", así que cambiarla cierra las demás
+sesiones aunque se restauren desde esa cookie.
+"""
+import pytest
+
+from app import create_app, db
+from app.config import TestingConfig
+from app.usuarios.models import Usuario, Role
+
+
+class Cfg(TestingConfig):
+    WTF_CSRF_ENABLED = False
+
+
+@pytest.fixture
+def app():
+    app = create_app(Cfg)
+    with app.app_context():
+        db.create_all()
+        rol = Role(nombre="Administrativo")
+        usuario = Usuario(username="ana", full_name="Ana", activo=True)
+        usuario.set_password("clave123")
+        usuario.roles.append(rol)
+        db.session.add_all([rol, usuario])
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+def _entrar(app):
+    cliente = app.test_client()
+    rv = cliente.post("/usuarios/login", data={"username": "ana", "password": "clave123"})
+    assert rv.status_code == 302
+    assert cliente.get_cookie("remember_token") is not None
+    return cliente
+
+
+def _reiniciar_navegador(cliente):
+    """Se pierde la cookie de sesión; la de "recordarme" se conserva."""
+    cliente.delete_cookie("session")
+
+
+def test_cookie_recordarme_restaura_la_sesion(app):
+    cliente = _entrar(app)
+    _reiniciar_navegador(cliente)
+    assert cliente.get("/perfil/ver").status_code == 200
+
+
+def test_cambiar_contrasena_cierra_las_demas_sesiones(app):
+    a, b = _entrar(app), _entrar(app)
+    rv = a.post("/perfil/cambiar-contrasena", data={
+        "contrasena_actual": "clave123", "nueva_contrasena": "nueva456", "confirmar_contrasena": "nueva456",
+    })
+    assert rv.status_code == 302
+
+    # La sesión que cambió la contraseña sigue valiendo, también desde su cookie
+    assert a.get("/perfil/ver").status_code == 200
+    _reiniciar_navegador(a)
+    assert a.get("/perfil/ver").status_code == 200
+
+    # La otra no, ni con la cookie de sesión ni restaurada desde "recordarme"
+    rv = b.get("/perfil/ver")
+    assert rv.status_code == 302 and "/usuarios/login" in rv.headers["Location"]
+    _reiniciar_navegador(b)
+    rv = b.get("/perfil/ver")
+    assert rv.status_code == 302 and "/usuarios/login" in rv.headers["Location"]
+
+
+def test_identificador_sin_version_no_se_acepta(app):
+    cliente = _entrar(app)
+    with cliente.session_transaction() as sesion:
+        sesion["_user_id"] = sesion["_user_id"].split(":")[0]
+    cliente.delete_cookie("remember_token")
+    rv = cliente.get("/perfil/ver")
+    assert rv.status_code == 302 and "/usuarios/login" in rv.headers["Location"]
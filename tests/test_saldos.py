@@ -0,0 +1,100 @@
+"""
+Saldo guardado en Matricula (total_pagado, deuda_actual, cuotas_pendientes):
+app/pagos/ledger.py lo recalcula en el mismo flush en que cambia un pago o
+el coste de la matrícula.
+"""
+import pytest
+
+from app.extensions import db
+from app.matriculas.models import Matricula, CAMPUS_BATA
+from app.pagos.ledger import saldos_descuadrados
+from app.pagos.models import (
+    Pago, ESTADO_PAGO_PENDIENTE, ESTADO_PAGO_VALIDADO, ESTADO_PAGO_RECHAZADO, ESTADO_PAGO_INICIAL,
+)
+
+
+@pytest.fixture
+def matricula(curso):
+    m = Matricula(curso_id=curso.id, estudiante_nombre="Ana", campus=CAMPUS_BATA, coste_total=1000)
+    m.pagos = [Pago(numero_cuota=0, monto=100, estado=ESTADO_PAGO_INICIAL, es_pago_inicial=True)]
+    m.pagos += [Pago(numero_cuota=n, monto=300, estado=ESTADO_PAGO_PENDIENTE) for n in (1, 2, 3)]
+    db.session.add(m)
+    db.session.commit()
+    return m
+
+
+def _cuota(m, numero):
+    return Pago.query.filter_by(matricula_id=m.id, numero_cuota=numero).one()
+
+
+def _saldo(m):
+    return m.total_pagado, m.deuda_actual, m.cuotas_pendientes
+
+
+def test_saldo_al_crear(matricula):
+    assert _saldo(matricula) == (100, 900, 3)
+    assert saldos_descuadrados() == []
+
+
+def test_saldo_sigue_al_estado_del_pago(matricula):
+    cuota = _cuota(matricula, 1)
+    cuota.estado = ESTADO_PAGO_VALIDADO
+    db.session.commit()
+    assert _saldo(matricula) == (400, 600, 2)
+
+    cuota.estado = ESTADO_PAGO_RECHAZADO
+    db.session.commit()
+    assert _saldo(matricula) == (100, 900, 3)
+
+    cuota.estado = ESTADO_PAGO_VALIDADO
+    cuota.monto = 350
+    db.session.commit()
+    assert _saldo(matricula) == (450, 550, 2)
+    assert saldos_descuadrados() == []
+
+
+def test_saldo_al_borrar_y_anadir_pagos(matricula):
+    validada = _cuota(matricula, 1)
+    validada.estado = ESTADO_PAGO_VALIDADO
+    db.session.commit()
+
+    db.session.delete(validada)
+    db.session.commit()
+    assert _saldo(matricula) == (100, 900, 2)
+
+    db.session.delete(_cuota(matricula, 3))
+    db.session.commit()
+    assert _saldo(matricula) == (100, 900, 1)
+
+    db.session.add(Pago(matricula_id=matricula.id, numero_cuota=4, monto=200, estado=ESTADO_PAGO_VALIDADO))
+    db.session.commit()
+    assert _saldo(matricula) == (300, 700, 1)
+    assert saldos_descuadrados() == []
+
+
+def test_saldo_al_cambiar_coste(matricula):
+    matricula.coste_total = 1500
+    db.session.commit()
+    assert _saldo(matricula) == (100, 1400, 3)
+
+
+def test_pago_movido_de_matricula(matricula, curso):
+    otra = Matricula(curso_id=curso.id, estudiante_nombre="Luis", campus=CAMPUS_BATA, coste_total=500)
+    db.session.add(otra)
+    db.session.commit()
+    assert _saldo(otra) == (0, 500, 0)
+
+    inicial = _cuota(matricula, 0)
+    inicial.matricula_id = otra.id
+    db.session.commit()
+    db.session.expire_all()
+    assert _saldo(matricula) == (0, 1000, 3)
+    assert _saldo(otra) == (100, 400, 0)
+    assert saldos_descuadrados() == []
+
+
+def test_rollback_deja_el_saldo(matricula):
+    _cuota(matricula, 1).estado = ESTADO_PAGO_VALIDADO
+    db.session.flush()
+    db.session.rollback()
+    assert _saldo(matricula) == (100, 900, 3)